@@ -0,0 +1,10 @@
+"""
+Benchmarks de los hot paths de Music (escaneo, encolado y anuncios).
+
+Uso:
+    python -m bench --tracks 300 --out bench_results.json
+
+Genera una biblioteca sintética en un directorio temporal, ejecuta los
+escenarios cronometrados y escribe los resultados en JSON para poder
+comparar corridas en el tiempo.
+"""
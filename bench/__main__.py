@@ -0,0 +1,151 @@
+# bench/__main__.py
+from __future__ import annotations
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from comandos.Music.library import LocalLibrary
+from .synthlib import SYNTH_FORMATS, generate_library
+from . import scenarios
+
+SCENARIOS = ("cold_scan", "warm_rescan", "warm_load", "read_tags", "enqueue", "cover_extraction", "now_embed", "now_embed_indexed",
+             "queue_ops", "queue_ops_list", "shuffle_lazy", "shuffle_list", "queue_mem", "queue_mem_list")
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _compare(prev: Dict[str, Any], cur: Dict[str, Any]) -> None:
+    """Imprime la variación de la mediana por escenario respecto a una corrida previa."""
+    for name, st in cur["scenarios"].items():
+        old = prev.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        a, b = old["median_s"], st["median_s"]
+        delta = ((b - a) / a * 100.0) if a else 0.0
+        print(f"  {name:<18} {a:10.4f}s -> {b:10.4f}s  ({delta:+.1f}%)")
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m bench", description="Benchmarks de Music.")
+    ap.add_argument("--tracks", type=int, default=300, help="tracks de la biblioteca sintética")
+    ap.add_argument("--enqueue-tracks", type=int, default=10_000, help="tracks para el escenario enqueue")
+    ap.add_argument("--enqueue-latency", type=float, default=0.0, help="latencia simulada de get_tracks (s)")
+    ap.add_argument("--queue-len", type=int, default=50_000, help="largo de cola para queue_ops/queue_mem / tamaño de biblioteca para shuffle_*")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=1234)
+    ap.add_argument("--art-size", type=int, default=256, help="lado en px de las portadas generadas")
+    ap.add_argument("--formats", default=",".join(SYNTH_FORMATS))
+    ap.add_argument("--only", default="", help=f"subconjunto separado por comas de {','.join(SCENARIOS)}")
+    ap.add_argument("--workdir", type=Path, default=None, help="directorio para la biblioteca (por defecto temporal)")
+    ap.add_argument("--out", type=Path, default=None, help="JSON de salida (por defecto bench_results/<fecha>.json)")
+    ap.add_argument("--compare", type=Path, default=None, help="JSON de una corrida previa para comparar")
+    args = ap.parse_args(argv)
+
+    only = {s.strip() for s in args.only.split(",") if s.strip()} or set(SCENARIOS)
+    unknown = only - set(SCENARIOS)
+    if unknown:
+        ap.error(f"escenarios desconocidos: {', '.join(sorted(unknown))}")
+
+    tmp_owned = args.workdir is None
+    work = Path(tempfile.mkdtemp(prefix="kokomi_bench_")) if tmp_owned else args.workdir
+    lib_root = work / "lib"
+    cache_path = work / "index_cache.json"
+    try:
+        t0 = time.perf_counter()
+        if lib_root.exists():
+            shutil.rmtree(lib_root)
+        paths = generate_library(
+            lib_root, args.tracks, seed=args.seed, art_size=args.art_size,
+            formats=tuple(f.strip() for f in args.formats.split(",") if f.strip()),
+        )
+        gen_s = time.perf_counter() - t0
+        print(f"Biblioteca sintética: {len(paths)} tracks en {gen_s:.2f}s ({lib_root})")
+
+        results: Dict[str, Any] = {}
+        r = args.repeat
+        for name in SCENARIOS:
+            if name not in only:
+                continue
+            if name == "cold_scan":
+                results[name] = scenarios.bench_cold_scan(lib_root, cache_path, repeat=r)
+            elif name == "warm_rescan":
+                results[name] = scenarios.bench_warm_rescan(lib_root, cache_path, repeat=r)
+            elif name == "warm_load":
+                results[name] = scenarios.bench_warm_load(lib_root, cache_path, repeat=r)
+            elif name == "read_tags":
+                results[name] = scenarios.bench_read_tags(paths, repeat=r)
+            elif name == "enqueue":
+                results[name] = scenarios.bench_enqueue(args.enqueue_tracks, repeat=r, latency=args.enqueue_latency)
+            elif name == "cover_extraction":
+                results[name] = scenarios.bench_cover_extraction(paths, repeat=r)
+            elif name == "now_embed":
+                results[name] = scenarios.bench_now_embed(paths, repeat=r)
+            elif name == "now_embed_indexed":
+                lib = LocalLibrary(lib_root, cache_path=cache_path)
+                lib.scan()
+                results[name] = scenarios.bench_now_embed(paths, repeat=r, lib=lib)
+            elif name == "queue_ops":
+                results[name] = scenarios.bench_queue_ops(args.queue_len, repeat=r)
+            elif name == "queue_ops_list":
+                results[name] = scenarios.bench_queue_ops(args.queue_len, repeat=r, indexed=False)
+            elif name == "shuffle_lazy":
+                results[name] = scenarios.bench_shuffle_first(args.queue_len, repeat=r)
+            elif name == "shuffle_list":
+                results[name] = scenarios.bench_shuffle_first(args.queue_len, repeat=r, lazy=False)
+            elif name == "queue_mem":
+                results[name] = scenarios.bench_queue_memory(args.queue_len)
+            elif name == "queue_mem_list":
+                results[name] = scenarios.bench_queue_memory(args.queue_len, compact=False)
+            st = results[name]
+            mem = f"  {st['retained_bytes'] / 1e6:.1f} MB, {st['bytes_per_item']:.0f} B/item" if "retained_bytes" in st else ""
+            print(f"  {name:<18} mediana {st['median_s']:.4f}s  ({st.get('per_item_us') or 0:.1f} µs/item){mem}")
+    finally:
+        if tmp_owned:
+            shutil.rmtree(work, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": int(time.time()),
+            "git_rev": _git_rev(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "params": {
+                "tracks": args.tracks, "enqueue_tracks": args.enqueue_tracks,
+                "enqueue_latency": args.enqueue_latency, "queue_len": args.queue_len, "repeat": args.repeat,
+                "seed": args.seed, "art_size": args.art_size, "formats": args.formats,
+            },
+            "generate_s": gen_s,
+        },
+        "scenarios": results,
+    }
+
+    out = args.out or Path("bench_results") / time.strftime("%Y%m%d-%H%M%S.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"Resultados: {out}")
+
+    if args.compare:
+        try:
+            prev = json.loads(args.compare.read_text(encoding="utf-8"))
+            print(f"Comparación con {args.compare}:")
+            _compare(prev, report)
+        except Exception as e:
+            print(f"No se pudo comparar con {args.compare}: {e}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,417 @@
+# bench/fakes.py
+from __future__ import annotations
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+import discord
+import lavalink
+from lavalink.utils import encode_track
+
+
+# Lavalink guarda el formato detectado de los archivos locales tras los campos comunes
+_PROBE_INFO = "mp3"
+_LOCAL_ENCODER = {"local": lambda w, t: w.write_utf(t["probe_info"])}
+
+
+def make_track(identifier: str, *, title: Optional[str] = None, author: str = "bench") -> lavalink.AudioTrack:
+    """
+    AudioTrack con la misma forma que devuelve Lavalink v4 para un archivo local,
+    con un 'encoded' v3 real (decodificable con lavalink.decode_track).
+    """
+    info = {
+        "identifier": identifier,
+        "isSeekable": True,
+        "author": author,
+        "length": 180_000,
+        "isStream": False,
+        "position": 0,
+        "title": title or identifier.rsplit("/", 1)[-1],
+        "uri": identifier,
+        "sourceName": "local",
+        "artworkUrl": None,
+        "isrc": None,
+    }
+    _ver, encoded = encode_track({**info, "probe_info": _PROBE_INFO}, _LOCAL_ENCODER)
+    return lavalink.AudioTrack({"encoded": encoded, "info": info})
+
+
+class FakeNode:
+    """
+    Nodo de Lavalink falso: get_tracks resuelve cualquier identifier a un track.
+    - latency: segundos simulados de ida y vuelta por llamada (0 = solo cede el loop).
+    - fail_every: cada cuántas llamadas devolver resultado vacío (0 = nunca).
+    """
+    def __init__(self, *, latency: float = 0.0, fail_every: int = 0):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.calls = 0
+        self.available = True
+
+    async def get_tracks(self, identifier: str) -> lavalink.LoadResult:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.fail_every and self.calls % self.fail_every == 0:
+            return lavalink.LoadResult(lavalink.LoadType.EMPTY, [])
+        return lavalink.LoadResult(lavalink.LoadType.TRACK, [make_track(identifier)])
+
+
+class FakePlayer:
+    """
+    Player mínimo compatible con lo que usa el Cog (queue/add/play/skip/stop).
+    play() simula el avance de cola de DefaultPlayer sin red.
+    """
+    def __init__(self, guild_id: int, node: Any, *, client: Any = None):
+        self.guild_id = guild_id
+        self.node = node
+        self.client = client
+        self.queue: List[Any] = []
+        self.current: Any = None
+        self.channel_id: Optional[int] = None
+        self.is_connected = False
+        self.paused = False
+        self.volume = 100
+
+    @property
+    def is_playing(self) -> bool:
+        return self.current is not None and not self.paused
+
+    def add(self, track: Any, requester: int = 0, index: Optional[int] = None) -> None:
+        if requester:
+            track.requester = requester
+        if index is None:
+            self.queue.append(track)
+        else:
+            self.queue.insert(index, track)
+
+    async def play(self, track: Any = None, **_kw: Any) -> None:
+        if track is None:
+            if not self.queue:
+                self.current = None
+                if self.client is not None:
+                    self.client._dispatch_event(lavalink.QueueEndEvent(self))
+                return
+            track = self.queue.pop(0)
+        self._end(lavalink.EndReason.REPLACED)
+        self.current = track
+        if self.client is not None:
+            self.client._dispatch_event(lavalink.TrackStartEvent(self, track))
+            secs = getattr(self.client, "track_seconds", 0.0)
+            if secs > 0:
+                asyncio.get_running_loop().call_later(secs, self._natural_end, track)
+
+    def _natural_end(self, track: Any) -> None:
+        """Fin natural del track: como DefaultPlayer ante TrackEndEvent(FINISHED)."""
+        if self.current is track and not self.paused:
+            self._end(lavalink.EndReason.FINISHED)
+            self.current = None
+            asyncio.get_running_loop().create_task(self.play())
+
+    def _end(self, reason: lavalink.EndReason) -> None:
+        """TrackEndEvent del track actual (Lavalink lo emite antes del siguiente TrackStart)."""
+        if self.current is not None and self.client is not None:
+            self.client._dispatch_event(lavalink.TrackEndEvent(self, self.current, reason))
+
+    async def skip(self) -> None:
+        await self.play()
+
+    async def stop(self) -> None:
+        self.current = None
+
+    async def set_pause(self, pause: bool) -> None:
+        self.paused = pause
+
+    async def set_volume(self, vol: int) -> None:
+        self.volume = vol
+
+    async def destroy(self) -> None:
+        self.current = None
+        self.queue.clear()
+
+
+# ---------------------------------------------------------------------------
+# Entorno headless para el Cog: bot, guilds, canales y Lavalink falsos.
+# ---------------------------------------------------------------------------
+
+class FakePlayerManager:
+    def __init__(self, client: "FakeLavalink"):
+        self.client = client
+        self.players: Dict[int, FakePlayer] = {}
+
+    def create(self, guild_id: int, **_kw: Any) -> "FakePlayer":
+        p = self.players.get(guild_id)
+        if p is None:
+            p = self.players[guild_id] = FakePlayer(guild_id, self.client.node, client=self.client)
+        return p
+
+    def get(self, guild_id: int) -> Optional["FakePlayer"]:
+        return self.players.get(guild_id)
+
+    def remove(self, guild_id: int) -> None:
+        self.players.pop(guild_id, None)
+
+
+class FakeNodeManager:
+    def __init__(self, node: FakeNode):
+        self.nodes: List[FakeNode] = [node]
+
+    def get_node(self) -> FakeNode:
+        return self.nodes[0]
+
+
+class FakeLavalink:
+    """
+    Sustituto de lavalink.Client: player_manager, node_manager, hooks de eventos
+    (despachados como tasks, igual que Client._dispatch_event) y voice_update_handler.
+    """
+    def __init__(self, node: Optional[FakeNode] = None, *, track_seconds: float = 0.0):
+        self.node = node or FakeNode()
+        self.track_seconds = track_seconds  # 0 = los tracks nunca terminan solos
+        self.node_manager = FakeNodeManager(self.node)
+        self.player_manager = FakePlayerManager(self)
+        self._hooks: List[Any] = []
+        self._voice: Dict[int, Dict[str, Any]] = {}
+        self.events_dispatched = 0
+
+    def add_event_hook(self, *hooks: Any, event: Any = None) -> None:
+        for h in hooks:
+            if h not in self._hooks:
+                self._hooks.append(h)
+
+    def _dispatch_event(self, event: Any) -> None:
+        self.events_dispatched += 1
+        for h in list(self._hooks):
+            asyncio.get_running_loop().create_task(h(event))
+
+    async def voice_update_handler(self, data: Dict[str, Any]) -> None:
+        d = data.get("d") or {}
+        gid = int(d.get("guild_id", 0))
+        st = self._voice.setdefault(gid, {})
+        if data.get("t") == "VOICE_STATE_UPDATE":
+            st["channel_id"] = d.get("channel_id")
+            st["session_id"] = d.get("session_id")
+        elif data.get("t") == "VOICE_SERVER_UPDATE":
+            st["endpoint"] = d.get("endpoint")
+        player = self.player_manager.get(gid)
+        if player is None:
+            return
+        if st.get("channel_id") is None:
+            player.channel_id = None
+            player.is_connected = False
+        elif st.get("session_id") and st.get("endpoint"):
+            player.channel_id = int(st["channel_id"])
+            player.is_connected = True
+
+
+class FakeWebSocket:
+    """
+    Gateway falso: voice_state() simula el handshake de voz de Discord
+    entregando VOICE_STATE_UPDATE y VOICE_SERVER_UPDATE al VoiceProtocol
+    tras `handshake_latency` segundos.
+    """
+    def __init__(self, bot: "FakeBot", handshake_latency: float):
+        self.bot = bot
+        self.handshake_latency = handshake_latency
+
+    async def voice_state(self, guild_id: int, channel_id: Optional[int], self_mute: bool = False,
+                          self_deaf: bool = False) -> None:
+        guild = self.bot.guilds_by_id.get(guild_id)
+        vc = getattr(guild, "voice_client", None) if guild else None
+
+        async def _handshake() -> None:
+            await asyncio.sleep(self.handshake_latency)
+            if vc is None:
+                return
+            uid = self.bot.user.id
+            await vc.on_voice_state_update({
+                "guild_id": str(guild_id), "channel_id": str(channel_id) if channel_id else None,
+                "user_id": str(uid), "session_id": f"s{guild_id}",
+            })
+            if channel_id is not None:
+                await vc.on_voice_server_update({"guild_id": str(guild_id), "token": "t", "endpoint": "fake:443"})
+
+        asyncio.get_running_loop().create_task(_handshake())
+
+
+class FakeUser:
+    def __init__(self, uid: int, name: str = "user"):
+        self.id = uid
+        self.name = name
+        self.voice: Any = None
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class FakeConnectionState:
+    def __init__(self, bot: "FakeBot"):
+        self.bot = bot
+
+    def remove_voice_client(self, guild_id: int) -> None:
+        g = self.bot.guilds_by_id.get(guild_id)
+        if g is not None:
+            g.voice_client = None
+
+
+class FakeBot:
+    """Lo mínimo de commands.Bot que usa el Cog de música."""
+    def __init__(self, *, loop: asyncio.AbstractEventLoop, handshake_latency: float = 0.08):
+        self.loop = loop
+        self.user = FakeUser(10_000, "kokomi")
+        self.default_prefix = "!"
+        self.guilds_by_id: Dict[int, "FakeGuild"] = {}
+        self.channels: Dict[int, Any] = {}
+        self._connection = FakeConnectionState(self)
+        self._ws = FakeWebSocket(self, handshake_latency)
+
+    async def wait_until_ready(self) -> None:
+        return None
+
+    def get_channel(self, cid: int) -> Any:
+        return self.channels.get(cid)
+
+    def get_guild(self, gid: int) -> Any:
+        return self.guilds_by_id.get(gid)
+
+    def _get_websocket(self, guild_id: Optional[int] = None) -> FakeWebSocket:
+        return self._ws
+
+
+class FakeAttachment:
+    def __init__(self, url: str, filename: str):
+        self.url = url
+        self.filename = filename
+
+
+class FakeMessage:
+    """
+    Mensaje devuelto por send(). Si se adjuntó un archivo, imita la respuesta de
+    Discord: attachments con URL firmada de CDN (?ex=...) y la miniatura del
+    embed reescrita de attachment://... a esa URL.
+    """
+    _ids = 0
+
+    def __init__(self, channel: Any, content: Optional[str] = None, **kw: Any):
+        FakeMessage._ids += 1
+        self.id = FakeMessage._ids
+        self.channel = channel
+        self.content = content
+        self.kwargs = kw
+        self.edits = 0
+        self.attachments: List[FakeAttachment] = []
+        self.embeds: List[discord.Embed] = []
+        file = kw.get("file")
+        embed = kw.get("embed")
+        if file is not None:
+            ex = format(int(time.time()) + 86_400, "x")
+            url = (f"https://cdn.discordapp.com/attachments/{getattr(channel, 'id', 0)}/{self.id}/"
+                   f"{file.filename}?ex={ex}&is=0&hm=fake")
+            self.attachments.append(FakeAttachment(url, file.filename))
+            if embed is not None and (embed.thumbnail.url or "").startswith("attachment://"):
+                embed = embed.copy()
+                embed.set_thumbnail(url=url)
+        if embed is not None:
+            self.embeds.append(embed)
+
+    async def edit(self, content: Optional[str] = None, **kw: Any) -> "FakeMessage":
+        self.edits += 1
+        self.content = content
+        return self
+
+
+class FakePartialMessage:
+    """PartialMessage: edit() con attachments=[...] como en discord.py 2.x."""
+    def __init__(self, channel: "FakeTextChannel", mid: int):
+        self.channel = channel
+        self.id = mid
+
+    async def edit(self, *, content: Optional[str] = None, embed: Any = None,
+                   attachments: Optional[List[Any]] = None) -> FakeMessage:
+        await asyncio.sleep(self.channel.send_latency)
+        self.channel.edits += 1
+        files = [a for a in (attachments or []) if isinstance(a, discord.File)]
+        if files:
+            self.channel.uploads += 1
+        msg = FakeMessage(self.channel, content, embed=embed, file=files[0] if files else None)
+        msg.id = self.id
+        return msg
+
+
+class FakeTextChannel(discord.TextChannel):
+    """TextChannel real (para los isinstance del Cog) sin estado de conexión."""
+    def __init__(self, cid: int, guild: "FakeGuild", *, send_latency: float = 0.0):
+        self.id = cid
+        self.guild = guild  # type: ignore[misc]
+        self.name = f"text-{cid}"
+        self.send_latency = send_latency
+        self.sent: int = 0
+        self.edits: int = 0
+        self.uploads: int = 0
+
+    def get_partial_message(self, mid: int) -> "FakePartialMessage":  # type: ignore[override]
+        return FakePartialMessage(self, mid)
+
+    async def send(self, content: Optional[str] = None, **kw: Any) -> FakeMessage:  # type: ignore[override]
+        await asyncio.sleep(self.send_latency)
+        self.sent += 1
+        if kw.get("file") is not None:
+            self.uploads += 1
+        return FakeMessage(self, content, **kw)
+
+
+class FakeVoiceChannel(discord.VoiceChannel):
+    """VoiceChannel real cuyo connect() registra el VoiceProtocol sin red."""
+    def __init__(self, cid: int, guild: "FakeGuild"):
+        self.id = cid
+        self.guild = guild  # type: ignore[misc]
+        self.name = f"voice-{cid}"
+
+    async def connect(self, *, timeout: float = 60.0, reconnect: bool = True, cls: Any = None,  # type: ignore[override]
+                      self_deaf: bool = False, self_mute: bool = False) -> Any:
+        bot = self.guild.bot
+        voice = cls(bot, self)
+        self.guild.voice_client = voice
+        await voice.connect(timeout=timeout, reconnect=reconnect, self_deaf=self_deaf, self_mute=self_mute)
+        return voice
+
+
+class FakeVoiceState:
+    def __init__(self, channel: Any):
+        self.channel = channel
+        self.suppress = False
+
+
+class FakeGuild:
+    def __init__(self, gid: int, bot: FakeBot, *, send_latency: float = 0.0):
+        self.id = gid
+        self.bot = bot
+        self.name = f"guild-{gid}"
+        self.voice_client: Any = None
+        self.me = FakeUser(bot.user.id, "kokomi")
+        self.text = FakeTextChannel(gid * 10 + 1, self, send_latency=send_latency)
+        self.voice = FakeVoiceChannel(gid * 10 + 2, self)
+        bot.guilds_by_id[gid] = self
+        bot.channels[self.text.id] = self.text
+        bot.channels[self.voice.id] = self.voice
+
+
+class FakeContext:
+    """commands.Context mínimo: guild/author/channel + reply/send/defer."""
+    def __init__(self, guild: FakeGuild, author: FakeUser):
+        self.guild = guild
+        self.author = author
+        self.channel = guild.text
+        self.bot = guild.bot
+        self.clean_prefix = "!"
+        self.interaction = None  # invocación por prefijo
+        self.replies = 0
+
+    async def defer(self, **_kw: Any) -> None:
+        return None
+
+    async def reply(self, content: Optional[str] = None, **kw: Any) -> FakeMessage:
+        self.replies += 1
+        return await self.channel.send(content, **kw)
+
+    async def send(self, content: Optional[str] = None, **kw: Any) -> FakeMessage:
+        return await self.channel.send(content, **kw)
@@ -0,0 +1,302 @@
+# bench/loadtest.py
+"""
+Carga multi-guild sobre el Cog combinado `comandos.Music.Music`, sin Discord ni Lavalink.
+
+Uso:
+    python -m bench.loadtest --guilds 50 --rate 0.5 --duration 20
+
+Cada guild emite comandos (play, play_local, skip, queue, stop) como un proceso
+de Poisson con la tasa indicada. Se reportan percentiles de latencia por comando,
+lag del event loop y memoria pico.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from comandos.Music import Music
+from comandos.Music import commands_core
+from comandos.Music.constants import MUSIC_BASE_ENV, STATE_DIR_ENV
+from .fakes import FakeBot, FakeContext, FakeGuild, FakeLavalink, FakeNode, FakeUser, FakeVoiceState
+from .synthlib import generate_library
+
+COMMANDS: Tuple[str, ...] = ("play", "play_local", "skip", "queue", "stop")
+DEFAULT_MIX = "play=4,play_local=1,skip=3,queue=2,stop=1"
+
+
+def _percentiles(samples: List[float]) -> Dict[str, Any]:
+    if not samples:
+        return {"count": 0}
+    s = sorted(samples)
+
+    def _q(p: float) -> float:
+        return s[min(len(s) - 1, int(round(p * (len(s) - 1))))]
+
+    return {
+        "count": len(s),
+        "p50_ms": _q(0.50) * 1e3, "p90_ms": _q(0.90) * 1e3,
+        "p99_ms": _q(0.99) * 1e3, "max_ms": s[-1] * 1e3,
+        "mean_ms": statistics.fmean(s) * 1e3,
+    }
+
+
+def _parse_mix(spec: str) -> List[Tuple[str, float]]:
+    out: List[Tuple[str, float]] = []
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, w = part.partition("=")
+        name = name.strip()
+        if name not in COMMANDS:
+            raise ValueError(f"comando desconocido en --mix: {name}")
+        out.append((name, float(w or 1)))
+    return out
+
+
+async def _loop_lag_probe(interval: float, out: List[float], stop: asyncio.Event) -> None:
+    """Mide cuánto se retrasa el loop respecto a un sleep(interval)."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        out.append(max(0.0, loop.time() - t0 - interval))
+
+
+async def _invoke(cog: Any, name: str, ctx: FakeContext, rng: random.Random) -> None:
+    cmd = getattr(cog, name)
+    if name == "play":
+        await cmd.callback(cog, ctx, query=f"tema {rng.randrange(10_000)}")
+    elif name == "play_local":
+        await cmd.callback(cog, ctx, bool(rng.randrange(2)))
+    elif name == "skip":
+        await cmd.callback(cog, ctx, None)
+    else:
+        await cmd.callback(cog, ctx)
+
+
+async def run_load(*, lib_root: Optional[Path], **kwargs: Any) -> Dict[str, Any]:
+    """
+    Corre la carga (argumentos de _drive_load) con MUSIC_BASE apuntando a la
+    biblioteca sintética y el estado persistente (miniaturas, mensaje fijo,
+    journal de colas) en un directorio temporal; al terminar restaura el
+    entorno y borra ese directorio.
+    """
+    state = Path(tempfile.mkdtemp(prefix="kokomi_state_"))
+    saved_env = {k: os.environ.get(k) for k in (STATE_DIR_ENV, MUSIC_BASE_ENV)}
+    os.environ[STATE_DIR_ENV] = state.as_posix()
+    if lib_root is not None:
+        os.environ[MUSIC_BASE_ENV] = lib_root.as_posix()
+    try:
+        return await _drive_load(**kwargs)
+    finally:
+        for k, v in saved_env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        shutil.rmtree(state, ignore_errors=True)
+
+
+async def _drive_load(
+    *,
+    guilds: int,
+    rate: float,
+    duration: float,
+    mix: List[Tuple[str, float]],
+    seed: int,
+    get_tracks_latency: float,
+    handshake_latency: float,
+    send_latency: float,
+    track_seconds: float = 0.0,
+    nowmsg: bool = False,
+    idle_seconds: Optional[float] = None,
+    lag_interval: float = 0.05,
+) -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    bot = FakeBot(loop=loop, handshake_latency=handshake_latency)
+    fake_ll = FakeLavalink(FakeNode(latency=get_tracks_latency), track_seconds=track_seconds)
+
+    async def _fake_init(b: Any) -> Any:
+        setattr(b, "_ll_voice_update", fake_ll.voice_update_handler)
+        return fake_ll
+
+    orig_init = commands_core.init_lavalink
+    commands_core.init_lavalink = _fake_init  # type: ignore[assignment]
+    cog = Music(bot)  # type: ignore[arg-type]
+    try:
+        await cog.cog_load()
+    finally:
+        commands_core.init_lavalink = orig_init  # type: ignore[assignment]
+    if idle_seconds is not None:
+        cog._idle.idle_seconds = idle_seconds
+    if cog.lib is not None:
+        await loop.run_in_executor(None, cog.lib.scan)
+    if nowmsg:
+        for i in range(guilds):
+            await cog._nowboard.set_enabled(1000 + i, True)
+
+    names = [n for n, _ in mix]
+    weights = [w for _, w in mix]
+    latencies: Dict[str, List[float]] = {n: [] for n in COMMANDS}
+    errors: Dict[str, int] = {n: 0 for n in COMMANDS}
+    lag: List[float] = []
+    stop = asyncio.Event()
+    inflight: set[asyncio.Task] = set()
+
+    async def _one(name: str, ctx: FakeContext, rng: random.Random) -> None:
+        t0 = time.perf_counter()
+        try:
+            await _invoke(cog, name, ctx, rng)
+        except Exception:
+            errors[name] += 1
+        latencies[name].append(time.perf_counter() - t0)
+
+    async def _guild_driver(gid: int) -> None:
+        rng = random.Random(seed * 1_000_003 + gid)
+        g = FakeGuild(gid, bot, send_latency=send_latency)
+        author = FakeUser(gid * 100 + 7, f"user-{gid}")
+        author.voice = FakeVoiceState(g.voice)
+        deadline = loop.time() + duration
+        while True:
+            await asyncio.sleep(rng.expovariate(rate) if rate > 0 else duration)
+            if loop.time() >= deadline:
+                return
+            name = rng.choices(names, weights)[0]
+            t = loop.create_task(_one(name, FakeContext(g, author), rng))
+            inflight.add(t)
+            t.add_done_callback(inflight.discard)
+
+    probe = loop.create_task(_loop_lag_probe(lag_interval, lag, stop))
+    t_start = time.perf_counter()
+    await asyncio.gather(*(_guild_driver(1000 + i) for i in range(guilds)))
+    if inflight:
+        await asyncio.wait(list(inflight))
+    wall = time.perf_counter() - t_start
+    stop.set()
+    await probe
+    await cog.cog_unload()
+
+    return {
+        "wall_s": wall,
+        "commands": {n: _percentiles(v) for n, v in latencies.items() if v},
+        "errors": {n: c for n, c in errors.items() if c},
+        "total_commands": sum(len(v) for v in latencies.values()),
+        "events_dispatched": fake_ll.events_dispatched,
+        "messages_sent": sum(g.text.sent for g in bot.guilds_by_id.values()),
+        "messages_edited": sum(g.text.edits for g in bot.guilds_by_id.values()),
+        "cover_uploads": sum(g.text.uploads for g in bot.guilds_by_id.values()),
+        "cover_url_hits": cog._cover_urls.hits,
+        "prefetch_hits": cog._prefetch.hits,
+        "prefetch_misses": cog._prefetch.misses,
+        "outbox": cog._outbox.stats(),
+        "announce": cog._announcer.stats(),
+        "events": cog._events.stats(),
+        "auto_disconnects": cog._idle.fired,
+        "journal": cog._journal.stats(),
+        "guilds": cog._guilds.stats(),
+        "ttfa": cog._ttfa.stats(),
+        "loop_lag": _percentiles(lag),
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m bench.loadtest", description="Carga multi-guild del Cog Music.")
+    ap.add_argument("--guilds", type=int, default=20)
+    ap.add_argument("--rate", type=float, default=0.5, help="comandos por segundo por guild")
+    ap.add_argument("--duration", type=float, default=10.0, help="segundos de carga")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="pesos por comando, p.ej. play=4,skip=3")
+    ap.add_argument("--seed", type=int, default=1234)
+    ap.add_argument("--tracks", type=int, default=60, help="tracks de la biblioteca sintética (0 = sin biblioteca)")
+    ap.add_argument("--get-tracks-latency", type=float, default=0.005, help="latencia simulada de Lavalink (s)")
+    ap.add_argument("--handshake-latency", type=float, default=0.08, help="latencia simulada del handshake de voz (s)")
+    ap.add_argument("--send-latency", type=float, default=0.02, help="latencia simulada de la API de Discord (s)")
+    ap.add_argument("--track-seconds", type=float, default=0.0, help="duración simulada de cada track (0 = infinita)")
+    ap.add_argument("--idle-seconds", type=float, default=None, help="plazo de auto-desconexión (por defecto el del bot)")
+    ap.add_argument("--nowmsg", action="store_true", help="activar el mensaje 'now playing' fijo en todos los guilds")
+    ap.add_argument("--tracemalloc", action="store_true", help="medir memoria pico con tracemalloc (más lento)")
+    ap.add_argument("--out", type=Path, default=None, help="JSON de salida (opcional)")
+    args = ap.parse_args(argv)
+
+    work: Optional[Path] = None
+    lib_root: Optional[Path] = None
+    if args.tracks > 0:
+        work = Path(tempfile.mkdtemp(prefix="kokomi_load_"))
+        lib_root = work / "lib"
+        generate_library(lib_root, args.tracks, seed=args.seed, art_size=64)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    try:
+        report = asyncio.run(run_load(
+            guilds=args.guilds, rate=args.rate, duration=args.duration,
+            mix=_parse_mix(args.mix), seed=args.seed, lib_root=lib_root,
+            get_tracks_latency=args.get_tracks_latency,
+            handshake_latency=args.handshake_latency,
+            send_latency=args.send_latency,
+            track_seconds=args.track_seconds,
+            nowmsg=args.nowmsg,
+            idle_seconds=args.idle_seconds,
+        ))
+    finally:
+        if work is not None:
+            shutil.rmtree(work, ignore_errors=True)
+
+    report["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    if args.tracemalloc:
+        report["tracemalloc_peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024.0 * 1024.0)
+        tracemalloc.stop()
+    report["params"] = {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()}
+
+    print(f"{report['total_commands']} comandos en {report['wall_s']:.1f}s "
+          f"({args.guilds} guilds, {args.rate}/s por guild)")
+    for name, st in report["commands"].items():
+        print(f"  {name:<11} n={st['count']:<6} p50={st['p50_ms']:8.1f}ms  p90={st['p90_ms']:8.1f}ms  "
+              f"p99={st['p99_ms']:8.1f}ms  max={st['max_ms']:8.1f}ms")
+    if report["errors"]:
+        print(f"  errores: {report['errors']}")
+    print(f"  mensajes={report['messages_sent']}  ediciones={report['messages_edited']}  portadas subidas={report['cover_uploads']}  "
+          f"reusadas por URL={report['cover_url_hits']}  "
+          f"prefetch={report['prefetch_hits']}/{report['prefetch_hits'] + report['prefetch_misses']}")
+    ob = report["outbox"]
+    print(f"  outbox: cola pico={ob['peak_depth']}  coalescidos={ob['coalesced']}  descartados={ob['dropped']}  "
+          f"fallidos={ob['failed']}  429={ob['rate_limited']}")
+    an = report["announce"]
+    print(f"  anuncios: procesados={an['processed']}  cola pico={an['peak_depth']}  obsoletos={an['dropped_stale']}  "
+          f"desbordados={an['dropped_overflow']}  fallidos={an['failed']}")
+    print(f"  auto-desconexiones={report['auto_disconnects']}")
+    jn = report["journal"]
+    print(f"  journal: escrituras={jn['flushes']}  líneas={jn['lines']}  snapshots={jn['snapshots']}")
+    gs = report["guilds"]
+    print(f"  estado por guild: activos={gs['guilds']}  rutas locales={gs['paths']}  liberados={gs['released']}")
+    for cmd, st in report["ttfa"].items():
+        print(f"  TTFA {cmd:<11} n={st['count']:<5} avg={st['avg_ms']:.0f}ms  p50≤{st['p50_ms']:.0f}ms  "
+              f"p90≤{st['p90_ms']:.0f}ms  max={st['max_ms']:.0f}ms")
+    for name, st in report["events"].items():
+        print(f"  evento {name:<22} n={st['count']:<6} handlers avg={st['avg_ms']:.3f}ms  max={st['max_ms']:.3f}ms  "
+              f"errores={st['errors']}")
+    ll = report["loop_lag"]
+    if ll.get("count"):
+        print(f"  loop lag    p50={ll['p50_ms']:.2f}ms  p99={ll['p99_ms']:.2f}ms  max={ll['max_ms']:.2f}ms")
+    print(f"  memoria pico (RSS): {report['peak_rss_mb']:.1f} MB")
+    if "tracemalloc_peak_mb" in report:
+        print(f"  memoria pico (tracemalloc): {report['tracemalloc_peak_mb']:.1f} MB")
+
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Resultados: {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,209 @@
+# bench/scenarios.py
+from __future__ import annotations
+import asyncio
+import gc
+import random
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from comandos.Music.covers import _extract_embedded_cover_bytes, _find_cover_in_dir, build_local_now_embed
+from comandos.Music.enqueue import enqueue_tracks_from_paths
+from comandos.Music.guildstate import LocalPaths
+from comandos.Music.library import LocalLibrary
+from comandos.Music.permute import LazyShuffle
+from comandos.Music.playqueue import IndexedQueue, TrackQueue
+from comandos.Music.tags import read_tags_worker
+from .fakes import FakeNode, FakePlayer, make_track
+
+
+def timed(fn: Callable[[], Any], *, repeat: int, setup: Callable[[], Any] | None = None) -> Dict[str, Any]:
+    """
+    Ejecuta fn() `repeat` veces (setup() antes de cada una, fuera del cronómetro)
+    y devuelve estadísticas en segundos.
+    """
+    samples: List[float] = []
+    for _ in range(max(1, repeat)):
+        if setup is not None:
+            setup()
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return {
+        "repeat": len(samples),
+        "min_s": min(samples),
+        "median_s": statistics.median(samples),
+        "mean_s": statistics.fmean(samples),
+        "max_s": max(samples),
+        "samples_s": samples,
+    }
+
+
+def _per_item(stats: Dict[str, Any], n: int) -> Dict[str, Any]:
+    stats["items"] = n
+    stats["per_item_us"] = (stats["median_s"] / n * 1e6) if n else None
+    return stats
+
+
+def bench_cold_scan(base: Path, cache_path: Path, *, repeat: int) -> Dict[str, Any]:
+    """Escaneo completo sin caché de índice en disco."""
+    lib = LocalLibrary(base, cache_path=cache_path)
+    stats = timed(lambda: lib.scan(), repeat=repeat, setup=lambda: cache_path.unlink(missing_ok=True))
+    return _per_item(stats, lib.last_stats["total"])
+
+
+def bench_warm_rescan(base: Path, cache_path: Path, *, repeat: int) -> Dict[str, Any]:
+    """Re-escaneo con la caché vigente (ningún archivo cambió)."""
+    lib = LocalLibrary(base, cache_path=cache_path)
+    lib.scan()
+    stats = timed(lambda: lib.scan(), repeat=repeat)
+    return _per_item(stats, lib.last_stats["total"])
+
+
+def bench_warm_load(base: Path, cache_path: Path, *, repeat: int) -> Dict[str, Any]:
+    """Arranque en caliente: índice desde la caché, sin recorrer el disco."""
+    LocalLibrary(base, cache_path=cache_path).scan()
+    n = 0
+
+    def _run() -> None:
+        nonlocal n
+        n = LocalLibrary(base, cache_path=cache_path).load_cached()
+
+    stats = timed(_run, repeat=repeat)
+    return _per_item(stats, n)
+
+
+def bench_read_tags(paths: List[Path], *, repeat: int) -> Dict[str, Any]:
+    """read_tags_worker en serie sobre todos los archivos."""
+    items = [p.as_posix() for p in paths]
+    stats = timed(lambda: [read_tags_worker(s) for s in items], repeat=repeat)
+    return _per_item(stats, len(items))
+
+
+def bench_enqueue(n_tracks: int, *, repeat: int, latency: float = 0.0) -> Dict[str, Any]:
+    """enqueue_tracks_from_paths de n_tracks rutas contra un nodo falso."""
+    paths = [Path(f"/bench/lib/Artista/Álbum/{i:06d}.flac") for i in range(n_tracks)]
+
+    async def _noop_ensure(player: Any, guild_id: int, first: Any) -> None:
+        await player.play()
+
+    def _run() -> None:
+        node = FakeNode(latency=latency)
+        player = FakePlayer(1, node)
+        added, failed, _skipped = asyncio.run(enqueue_tracks_from_paths(
+            node=node, player=player, guild_id=1, requester_id=1,
+            paths=paths, local_paths=LocalPaths(), ensure_playing=_noop_ensure,
+        ))
+        assert added == n_tracks and failed == 0, (added, failed)
+
+    stats = timed(_run, repeat=repeat)
+    stats["latency_s"] = latency
+    return _per_item(stats, n_tracks)
+
+
+def bench_queue_ops(n_queue: int, *, repeat: int, ops: int = 200, indexed: bool = True) -> Dict[str, Any]:
+    """
+    Operaciones de los comandos de cola sobre una cola de n_queue entradas:
+    vista (primeras 20), leer el destino a mitad de cola, skip de 10
+    (borrar el prefijo), mover una entrada y re-llenar lo borrado. indexed=False usa la list de lavalink
+    con el patrón anterior (copia completa para leer un elemento).
+    """
+    items = list(range(n_queue))
+    q: Any = None
+
+    def _setup() -> None:
+        nonlocal q
+        q = IndexedQueue(items) if indexed else list(items)
+
+    def _run() -> None:
+        half = n_queue // 2
+        for i in range(ops):
+            if indexed:
+                _ = q[:20]
+                _ = q[half]
+            else:
+                _ = [t for t in q][:20]
+                _ = list(q)[half]
+            del q[:10]
+            q.insert(len(q) // 3, q.pop(len(q) // 2))
+            q.extend(range(10))
+
+    stats = timed(_run, repeat=repeat, setup=_setup)
+    stats["queue_len"] = n_queue
+    return _per_item(stats, ops)
+
+
+def bench_shuffle_first(n_items: int, *, repeat: int, first: int = 8, lazy: bool = True) -> Dict[str, Any]:
+    """
+    Costo de barajar una biblioteca de n_items y obtener los primeros 'first'
+    (lo que necesita el camino rápido de play_local shuffle). lazy=False usa
+    el patrón anterior (copia + random.shuffle completo).
+    """
+    items = list(range(n_items))
+
+    def _run() -> None:
+        if lazy:
+            order = LazyShuffle(items)
+            _ = [order[i] for i in range(first)]
+        else:
+            order = list(items)
+            random.shuffle(order)
+            _ = order[:first]
+
+    stats = timed(_run, repeat=repeat)
+    stats["n_items"] = n_items
+    return _per_item(stats, n_items)
+
+
+def bench_queue_memory(n_queue: int, *, compact: bool = True) -> Dict[str, Any]:
+    """
+    Memoria retenida por una cola de n_queue tracks locales resueltos (como los
+    deja play_local): TrackQueue con entradas compactas vs. la list de
+    AudioTrack de lavalink. El tiempo es el de construir la cola.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        q: Any = TrackQueue() if compact else []
+        for i in range(n_queue):
+            t = make_track(f"/music/Artista {i % 97}/Álbum {i % 13}/{i:06d} - Tema {i}.flac")
+            t.requester = 123456789012345678
+            q.append(t)
+        elapsed = time.perf_counter() - t0
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - base
+    finally:
+        tracemalloc.stop()
+    stats: Dict[str, Any] = {"repeat": 1, "min_s": elapsed, "median_s": elapsed, "mean_s": elapsed,
+                             "max_s": elapsed, "samples_s": [elapsed]}
+    stats["queue_len"] = n_queue
+    stats["retained_bytes"] = retained
+    stats["bytes_per_item"] = retained / n_queue if n_queue else 0
+    del q
+    return _per_item(stats, n_queue)
+
+
+def bench_cover_extraction(paths: List[Path], *, repeat: int) -> Dict[str, Any]:
+    """Búsqueda de portada en carpeta + extracción de portada incrustada por track."""
+    def _run() -> None:
+        for p in paths:
+            _find_cover_in_dir(p)
+            _extract_embedded_cover_bytes(p)
+
+    return _per_item(timed(_run, repeat=repeat), len(paths))
+
+
+def bench_now_embed(paths: List[Path], *, repeat: int, lib: Optional[LocalLibrary] = None) -> Dict[str, Any]:
+    """build_local_now_embed completo (tags + portada) por track; con `lib`, usando su índice."""
+    items = [p.resolve() for p in paths]
+
+    async def _all() -> None:
+        for p in items:
+            await build_local_now_embed(p, lib)
+
+    return _per_item(timed(lambda: asyncio.run(_all()), repeat=repeat), len(paths))
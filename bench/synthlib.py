@@ -0,0 +1,162 @@
+# bench/synthlib.py
+from __future__ import annotations
+import base64
+import random
+import struct
+import zlib
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+from mutagen.flac import FLAC, Picture
+from mutagen.id3 import ID3, APIC, TALB, TDRC, TIT2, TPE1, TRCK
+from mutagen.ogg import OggPage
+from mutagen.oggvorbis import OggVorbis
+
+SYNTH_FORMATS: tuple[str, ...] = ("mp3", "flac", "ogg")
+
+# Frame MPEG-1 Layer III, 128 kbps, 44.1 kHz, joint stereo (payload en silencio)
+_MP3_FRAME_HEADER = b"\xff\xfb\x90\x64"
+_MP3_FRAME_LEN = 417
+_MP3_FRAMES = 40  # ~1s de audio
+
+
+def make_png(size: int, seed: int) -> bytes:
+    """
+    PNG RGB válido (degradado + ruido determinista) de size x size.
+    El ruido evita que la imagen comprima a casi nada, como una portada real.
+    """
+    rng = random.Random(seed)
+    r0, g0, b0 = rng.randrange(256), rng.randrange(256), rng.randrange(256)
+    rows = bytearray()
+    for y in range(size):
+        rows.append(0)  # filtro None
+        for x in range(size):
+            n = rng.randrange(32)
+            rows += bytes(((r0 + x + n) & 0xFF, (g0 + y + n) & 0xFF, (b0 + x + y) & 0xFF))
+
+    def _chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    ihdr = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + _chunk(b"IHDR", ihdr)
+            + _chunk(b"IDAT", zlib.compress(bytes(rows), 6)) + _chunk(b"IEND", b""))
+
+
+def _picture(art: bytes, size: int) -> Picture:
+    pic = Picture()
+    pic.type = 3  # portada frontal
+    pic.mime = "image/png"
+    pic.width = pic.height = size
+    pic.depth = 24
+    pic.data = art
+    return pic
+
+
+def _write_mp3(path: Path, tags: Dict[str, str], art: bytes) -> None:
+    frame = _MP3_FRAME_HEADER + bytes(_MP3_FRAME_LEN - len(_MP3_FRAME_HEADER))
+    path.write_bytes(frame * _MP3_FRAMES)
+    id3 = ID3()
+    id3.add(TIT2(encoding=3, text=tags["title"]))
+    id3.add(TPE1(encoding=3, text=tags["artist"]))
+    id3.add(TALB(encoding=3, text=tags["album"]))
+    id3.add(TRCK(encoding=3, text=tags["tracknumber"]))
+    id3.add(TDRC(encoding=3, text=tags["date"]))
+    id3.add(APIC(encoding=3, mime="image/png", type=3, desc="cover", data=art))
+    id3.save(path.as_posix())
+
+
+def _write_flac(path: Path, tags: Dict[str, str], art: bytes, art_size: int) -> None:
+    # STREAMINFO mínimo (44.1 kHz, 2 canales, 16 bits, 1s) + bloque PADDING final
+    rate, channels, bps, samples = 44100, 2, 16, 44100
+    packed = (rate << 44) | ((channels - 1) << 41) | ((bps - 1) << 36) | samples
+    info = struct.pack(">HH", 4096, 4096) + bytes(6) + packed.to_bytes(8, "big") + bytes(16)
+    blob = b"fLaC" + bytes((0x00,)) + len(info).to_bytes(3, "big") + info
+    blob += bytes((0x81,)) + (16).to_bytes(3, "big") + bytes(16)
+    path.write_bytes(blob)
+    f = FLAC(path.as_posix())
+    for k, v in tags.items():
+        f[k] = v
+    f.add_picture(_picture(art, art_size))
+    f.save()
+
+
+def _write_ogg(path: Path, tags: Dict[str, str], art: bytes, art_size: int) -> None:
+    # Cabeceras Vorbis mínimas: identificación, comentarios vacíos y setup falso
+    serial = 0x4B4B
+    ident = (b"\x01vorbis" + struct.pack("<IBIiii", 0, 2, 44100, 0, 128000, 0) + b"\xb8\x01")
+    comment = b"\x03vorbis" + struct.pack("<I", 0) + struct.pack("<I", 0) + b"\x01"
+    setup = b"\x05vorbis" + bytes(32)
+    pages: List[OggPage] = []
+    for seq, (packets, pos) in enumerate((([ident], 0), ([comment, setup], 0), ([bytes(64)], 44100))):
+        page = OggPage()
+        page.serial = serial
+        page.sequence = seq
+        page.packets = packets
+        page.position = pos
+        page.first = seq == 0
+        page.last = seq == 2
+        pages.append(page)
+    path.write_bytes(b"".join(p.write() for p in pages))
+    o = OggVorbis(path.as_posix())
+    for k, v in tags.items():
+        o[k] = v
+    o["metadata_block_picture"] = base64.b64encode(_picture(art, art_size).write()).decode("ascii")
+    o.save()
+
+
+def generate_library(
+    root: Path,
+    n_tracks: int,
+    *,
+    seed: int = 1234,
+    formats: Sequence[str] = SYNTH_FORMATS,
+    tracks_per_album: int = 12,
+    albums_per_artist: int = 3,
+    art_size: int = 256,
+    folder_cover_every: int = 2,
+) -> List[Path]:
+    """
+    Escribe n_tracks archivos etiquetados en root/Artista/Álbum/NN - Título.ext.
+    - Cada álbum comparte una portada incrustada (PNG determinista por álbum).
+    - Uno de cada `folder_cover_every` álbumes lleva además folder.png
+      (0 = nunca), para cubrir ambos caminos de portada.
+    Con el mismo seed el árbol generado es idéntico byte a byte.
+    """
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    out: List[Path] = []
+    art_cache: Dict[int, bytes] = {}
+    for i in range(n_tracks):
+        album_idx = i // max(1, tracks_per_album)
+        artist_idx = album_idx // max(1, albums_per_artist)
+        trackno = (i % max(1, tracks_per_album)) + 1
+        fmt = formats[rng.randrange(len(formats))]
+
+        artist = f"Artista {artist_idx:04d}"
+        album = f"Álbum {album_idx:05d}"
+        title = f"Tema {i:06d}"
+        d = root / artist / album
+        d.mkdir(parents=True, exist_ok=True)
+
+        art = art_cache.get(album_idx)
+        if art is None:
+            art_cache.clear()
+            art = art_cache[album_idx] = make_png(art_size, seed ^ album_idx)
+            if folder_cover_every and album_idx % folder_cover_every == 0:
+                (d / "folder.png").write_bytes(art)
+
+        tags = {
+            "title": title, "artist": artist, "album": album,
+            "tracknumber": f"{trackno}/{tracks_per_album}", "date": str(1990 + album_idx % 30),
+        }
+        path = d / f"{trackno:02d} - {title}.{fmt}"
+        if fmt == "mp3":
+            _write_mp3(path, tags, art)
+        elif fmt == "flac":
+            _write_flac(path, tags, art, art_size)
+        elif fmt == "ogg":
+            _write_ogg(path, tags, art, art_size)
+        else:
+            raise ValueError(f"formato no soportado: {fmt}")
+        out.append(path)
+    return out
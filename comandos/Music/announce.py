@@ -0,0 +1,129 @@
+# comandos/Music/announce.py
+from __future__ import annotations
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+from .constants import ANNOUNCE_QUEUE_MAX, ANNOUNCE_MAX_AGE, ANNOUNCE_OVERFLOW
+from .utils import dprint
+
+# work() -> Awaitable[None]  (el anuncio en sí: tags, portada y envío)
+WorkFactory = Callable[[], Awaitable[Any]]
+
+
+class _Item:
+    __slots__ = ("kind", "work", "ts")
+
+    def __init__(self, kind: str, work: WorkFactory) -> None:
+        self.kind = kind
+        self.work = work
+        self.ts = time.monotonic()
+
+
+class _GuildLane:
+    __slots__ = ("items", "task")
+
+    def __init__(self) -> None:
+        self.items: Deque[_Item] = deque()
+        self.task: Optional[asyncio.Task] = None
+
+
+class AnnounceQueues:
+    """
+    Colas de anuncios por guild, cada una con su propio worker.
+    - submit() es O(1) y no bloquea: el hook de eventos de Lavalink solo
+      encola; lecturas de tags, portadas y envíos corren en el worker del guild.
+    - Orden FIFO por guild; un guild lento no demora a los demás.
+    - Cola acotada (max_queue). Al desbordar: 'drop_oldest' descarta el
+      anuncio más viejo, 'drop_new' descarta el entrante.
+    - supersede=True: un TrackStart nuevo vuelve obsoletos los TrackStart
+      aún pendientes del mismo guild (ya no suenan). Lo que espera más de
+      max_age segundos también se descarta al llegar su turno.
+    """
+    def __init__(self, *, max_queue: int = ANNOUNCE_QUEUE_MAX, max_age: float = ANNOUNCE_MAX_AGE,
+                 overflow: str = ANNOUNCE_OVERFLOW, debug_enabled: bool = False):
+        self.max_queue = max(1, int(max_queue))
+        self.max_age = float(max_age)
+        self.overflow = overflow if overflow in ("drop_oldest", "drop_new") else "drop_oldest"
+        self.debug_enabled = debug_enabled
+        self._lanes: Dict[int, _GuildLane] = {}
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped_overflow = 0
+        self.dropped_stale = 0
+        self.peak_depth = 0
+
+    # --------------- API ---------------
+    def submit(self, guild_id: int, kind: str, work: WorkFactory, *, supersede: bool = False) -> None:
+        lane = self._lanes.get(guild_id)
+        if lane is None:
+            lane = self._lanes[guild_id] = _GuildLane()
+
+        if supersede and lane.items:
+            kept = deque(it for it in lane.items if it.kind != kind)
+            self.dropped_stale += len(lane.items) - len(kept)
+            lane.items = kept
+
+        if len(lane.items) >= self.max_queue:
+            self.dropped_overflow += 1
+            if self.overflow == "drop_new":
+                return
+            lane.items.popleft()
+
+        lane.items.append(_Item(kind, work))
+        self.enqueued += 1
+        if len(lane.items) > self.peak_depth:
+            self.peak_depth = len(lane.items)
+        if lane.task is None or lane.task.done():
+            lane.task = asyncio.get_running_loop().create_task(self._drain(guild_id, lane))
+
+    def forget(self, guild_id: int) -> None:
+        """Descarta lo pendiente del guild (el anuncio en curso termina)."""
+        lane = self._lanes.get(guild_id)
+        if lane is not None:
+            self.dropped_stale += len(lane.items)
+            lane.items.clear()
+
+    def depth(self) -> int:
+        return sum(len(lane.items) for lane in self._lanes.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "depth": self.depth(),
+            "peak_depth": self.peak_depth,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped_overflow": self.dropped_overflow,
+            "dropped_stale": self.dropped_stale,
+        }
+
+    def close(self) -> None:
+        for lane in self._lanes.values():
+            lane.items.clear()
+            if lane.task is not None and not lane.task.done():
+                lane.task.cancel()
+        self._lanes.clear()
+
+    # --------------- Internos ---------------
+    async def _drain(self, guild_id: int, lane: _GuildLane) -> None:
+        try:
+            while lane.items:
+                item = lane.items.popleft()
+                if time.monotonic() - item.ts > self.max_age:
+                    self.dropped_stale += 1
+                    continue
+                try:
+                    await item.work()
+                    self.processed += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.failed += 1
+                    dprint(f"[announce] fallo en anuncio '{item.kind}' (guild={guild_id}): {e}",
+                           _enabled=self.debug_enabled)
+        finally:
+            lane.task = None
+            if not lane.items and self._lanes.get(guild_id) is lane:
+                del self._lanes[guild_id]
@@ -1,8 +1,9 @@
 from __future__ import annotations
+import asyncio
 import time
 import os
 from pathlib import Path
-from typing import Any, Dict, Optional, cast, Union
+from typing import Any, Dict, List, Optional, Tuple, cast, Union
 import discord
 from discord.ext import commands
 import lavalink
@@ -12,15 +13,28 @@ from .constants import (
     EMBED_COLOR_PRIMARY,
     VOL_MIN,
     VOL_MAX,
-    MUSIC_BASE_ENV
+    MUSIC_BASE_ENV,
+    NOWMSG_STATE_FILENAME,
+    JOURNAL_DIRNAME,
+    VOICE_READY_TIMEOUT,
+    LIBRARY_VERIFY_DELAY,
 )
-from .utils import dprint
-from .covers import build_local_now_embed
+from .utils import dprint, is_subpath, state_dir
+from .covers import CoverUrlCache, PreparedNow, prepare_local_now, send_prepared_now
+from .prefetch import AnnouncePrefetcher
+from .nowmsg import NowPlayingBoard
+from .outbox import Outbox
+from .announce import AnnounceQueues
+from .journal import QueueJournal, SavedQueue
+from .guildstate import GuildStates
 from .library import LocalLibrary
-from .lavaclient import init_lavalink, add_event_hooks
-from .monitor import start_monitor
+from .thumbs import CoverStore, cover_store_dir
+from .lavaclient import init_lavalink, EventRouter, on_lavalink_event
+from .monitor import IdleDisconnector
+from .metrics import FirstAudioTracker
+from .playqueue import QueueAdmission, TrackQueue, materialize
+from .queueview import QueuePageCache
 from .voice import LavalinkVoiceClient
-import asyncio
 
 class Music(commands.Cog):
     """Cog base"""
@@ -32,22 +46,64 @@ class Music(commands.Cog):
 
         # Librería local (se setea cuando esté music_base_path)
         self.lib: Optional[LocalLibrary] = None
+        # Arranque en caliente: carga de la caché (ms) y verificación de fondo
+        self._lib_load_task: Optional[asyncio.Task] = None
+        self._lib_verify_task: Optional[asyncio.Task] = None
+
+        # Miniaturas de portada (store en la carpeta de estado del bot)
+        self.cover_store: Optional[CoverStore] = None
+
+        # URLs de CDN de portadas ya subidas (evita re-subir la misma portada)
+        self._cover_urls = CoverUrlCache()
+
+        # Pre-render del anuncio del próximo track local, por guild
+        self._prefetch = AnnouncePrefetcher(self._prepare_now, debug_enabled=MUSIC_DEBUG)
+
+        # Scheduler de mensajes salientes (cola y ritmo por canal)
+        self._outbox = Outbox(debug_enabled=MUSIC_DEBUG)
+
+        # Colas de anuncios por guild (el hook de Lavalink solo encola)
+        self._announcer = AnnounceQueues(debug_enabled=MUSIC_DEBUG)
+
+        # Despacho de eventos de Lavalink por clase (con métricas por tipo)
+        self._events = EventRouter(debug_enabled=MUSIC_DEBUG)
+
+        # Modo opcional de mensaje "now playing" fijo (editado en cada tema)
+        self._nowboard = NowPlayingBoard(
+            state_dir() / NOWMSG_STATE_FILENAME, url_cache=self._cover_urls,
+            outbox=self._outbox, debug_enabled=MUSIC_DEBUG,
+        )
+
+        # Journal de colas por guild (restauración tras reinicio / reload)
+        self._journal = QueueJournal(
+            state_dir() / JOURNAL_DIRNAME, describe=self._journal_state, debug_enabled=MUSIC_DEBUG,
+        )
+        self._restore_task: Optional[asyncio.Task] = None
 
         # Lavalink client
         self._ll: Optional[lavalink.Client] = None
 
-        # Estado de anuncios por guild
-        self._announce_ch: Dict[int, int] = {}  # guild_id -> channel_id
+        # Estado por guild: canal de anuncios, dedupe de “now playing” y rutas
+        # de los tracks locales en cola (se libera en stop / desconexión / salida)
+        self._guilds = GuildStates()
 
-        # Dedupe de “now playing”
-        self._last_announced: Dict[int, str] = {}
-        self._last_announced_ts: Dict[int, float] = {}
+        # Admisión de la cola: tope por guild + presupuesto de memoria global
+        self._admission = QueueAdmission(self._players)
 
-        # Mapa de tracks locales: identifier/uri/pathposix -> Path
-        self._local_map: Dict[str, Path] = {}
+        # Páginas de /queue ya renderizadas (por guild, según versión de la cola)
+        self._queue_pages = QueuePageCache()
 
-        # Handle del monitor
-        self._monitor_task = None
+        # Tiempo hasta el primer audio por comando (histogramas)
+        self._ttfa = FirstAudioTracker(debug_enabled=MUSIC_DEBUG)
+
+        # Auto-desconexión por inactividad (timers por guild, dirigidos por eventos)
+        self._idle = IdleDisconnector(
+            is_idle=self._is_idle,
+            disconnect=self._auto_disconnect,
+            get_announce_channel=self._get_announce_channel,
+            send_message=self._post,
+            debug_enabled=MUSIC_DEBUG,
+        )
 
     # --------------- Ciclo de vida del Cog ---------------
     async def cog_load(self) -> None:
@@ -57,70 +113,12 @@ class Music(commands.Cog):
         # Inicializa cliente de Lavalink y expone voice_update handler
         self._ll = await init_lavalink(self.bot)
 
-        # Callbacks de eventos
-        async def _on_track_start(gid: int, track: Any) -> None:
-            ident = str(
-                self._track_attr(track, "identifier", "")
-                or self._track_attr(track, "uri", "")
-                or ""
-            )
-            now = time.monotonic()
-            last_id = self._last_announced.get(gid)
-            last_ts = self._last_announced_ts.get(gid, 0.0)
-            if ident and (ident == last_id) and (now - last_ts < ANNOUNCE_DEDUP_SECONDS):
-                dprint("dedup TrackStartEvent", _enabled=MUSIC_DEBUG)
-                return
-            if ident:
-                self._last_announced[gid] = ident
-                self._last_announced_ts[gid] = now
-
-            ch = self._get_announce_channel(gid)
-            if not ch:
-                return
-
-            # Resolver si el track es local (mapeado)
-            p = self._resolve_local_path(track)
-            if p is not None and p.exists():
-                try:
-                    embed, cover_file = await build_local_now_embed(p)
-                    if cover_file:
-                        await ch.send(embed=embed, file=cover_file)
-                    else:
-                        await ch.send(embed=embed)
-                except Exception:
-                    # Si algo falla con portada/embeds, al menos anuncia el título
-                    title = self._track_attr(track, "title", "(sin título)") or "(sin título)"
-                    await ch.send(f"▶ **{title}**")
-                return
-
-            # No es local: anuncia con texto mínimo
-            title = self._track_attr(track, "title", "(sin título)") or "(sin título)"
-            await ch.send(f"▶ **{title}**")
-
-        async def _on_queue_end(gid: int) -> None:
-            ch = self._get_announce_channel(gid)
-            if ch:
-                try:
-                    await ch.send("✅ **Cola terminada.**")
-                except Exception:
-                    pass
-
-        add_event_hooks(self.ll, _on_track_start, _on_queue_end)
-
-        # Iniciar monitor de auto-desconexión
-        def _get_players():
-            pm = getattr(self.ll, "player_manager", None)
-            return list(getattr(pm, "players", []) or []) if pm else []
+        # Guilds con mensaje fijo y sus IDs de mensaje
+        self._nowboard.load()
 
-        def _get_ann(gid: int):
-            return self._get_announce_channel(gid)
-
-        self._monitor_task = start_monitor(
-            loop=self.bot.loop,
-            get_all_players=_get_players,
-            get_announce_channel=_get_ann,
-            debug_enabled=MUSIC_DEBUG,
-        )
+        # Handlers de eventos (@on_lavalink_event) y hook único en el cliente
+        self._events.subscribe_cog(self)
+        self._events.attach(self.ll)
 
         env_base = os.getenv(MUSIC_BASE_ENV, "")
         if env_base:
@@ -130,6 +128,8 @@ class Music(commands.Cog):
                     self.music_base_path = p
                     self.base_path = p.parent
                     self.lib = LocalLibrary(p)
+                    self.cover_store = CoverStore(cover_store_dir(p))
+                    self._start_library_warmup()
                     dprint(f"[music] MUSIC_BASE autoload: {p}", _enabled=MUSIC_DEBUG)
                 else:
                     dprint(f"[music] MUSIC_BASE inválida: {p}", _enabled=MUSIC_DEBUG)
@@ -137,15 +137,25 @@ class Music(commands.Cog):
                 dprint(f"[music] fallo leyendo MUSIC_BASE: {e}", _enabled=MUSIC_DEBUG)
 
     async def cog_unload(self) -> None:
-        # 1) Cancelar monitor
-        try:
-            if self._monitor_task:
-                self._monitor_task.cancel()
-                await self._monitor_task
-        except Exception:
-            pass
-
-        # 2) Limpiar el hook de voice_update si es el nuestro
+        # 0) Guardar colas y posiciones (la próxima carga las restaura)
+        if self._restore_task is not None and not self._restore_task.done():
+            self._restore_task.cancel()
+        await self._journal.close()
+        self._cancel_library_warmup()
+
+        # 1) Cancelar timers de auto-desconexión
+        self._idle.close()
+
+        # 2) Descartar anuncios pendientes/pre-renderizados y liberar el pool de miniaturas
+        self._announcer.close()
+        self._prefetch.clear()
+        self._nowboard.close()
+        self._outbox.close()
+        if self.cover_store is not None:
+            self.cover_store.close()
+
+        # 3) Soltar el hook de eventos y el de voice_update si es el nuestro
+        self._events.detach()
         try:
             h_bot = getattr(self.bot, "_ll_voice_update", None)
             h_ours = getattr(self.ll, "voice_update_handler", None) if self._ll else None
@@ -154,6 +164,202 @@ class Music(commands.Cog):
         except Exception:
             pass
 
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        # Expulsado / guild borrado: soltar todo lo que se guardaba de él
+        gid = guild.id
+        self._idle.forget(gid)
+        self._prefetch.invalidate(gid)
+        self._announcer.forget(gid)
+        self._ttfa.cancel(gid)
+        self._queue_pages.forget(gid)
+        self._journal.forget(gid)
+        self._guilds.release(gid)
+        if self._ll is not None:
+            try:
+                await self._ll.player_manager.destroy(gid)
+            except Exception as e:
+                dprint(f"[music] destroy fallo (guild={gid}): {e}", _enabled=MUSIC_DEBUG)
+
+    # --------------- Biblioteca local: arranque en caliente ---------------
+    def _start_library_warmup(self) -> None:
+        """
+        Carga la caché de la biblioteca en segundo plano (los comandos quedan
+        disponibles en milisegundos) y después la verifica contra el disco
+        con un escaneo incremental de baja prioridad.
+        """
+        lib = self.lib
+        if lib is None:
+            return
+        self._cancel_library_warmup()
+        loop = asyncio.get_running_loop()
+        self._lib_load_task = loop.create_task(self._load_library_cache(lib))
+        self._lib_verify_task = loop.create_task(self._verify_library(lib, self._lib_load_task))
+
+    def _cancel_library_warmup(self) -> None:
+        # Un escaneo ya en su hilo termina solo; cancelar evita el siguiente paso
+        for t in (self._lib_load_task, self._lib_verify_task):
+            if t is not None and not t.done():
+                t.cancel()
+        self._lib_load_task = self._lib_verify_task = None
+
+    async def _load_library_cache(self, lib: LocalLibrary) -> int:
+        t0 = time.perf_counter()
+        n = await asyncio.to_thread(lib.load_cached)
+        dprint(f"[library] caché cargada: {n} temas en {(time.perf_counter() - t0) * 1000:.0f} ms",
+               _enabled=MUSIC_DEBUG)
+        return n
+
+    async def _verify_library(self, lib: LocalLibrary, loaded: asyncio.Task) -> None:
+        try:
+            await asyncio.shield(loaded)
+        except Exception:
+            pass
+        # Deja pasar el resto del arranque (READY, restauración de colas)
+        await asyncio.sleep(LIBRARY_VERIFY_DELAY)
+        if self.lib is not lib:
+            return
+        t0 = time.perf_counter()
+        try:
+            await asyncio.to_thread(lib.scan, False, True)
+        except Exception as e:
+            dprint(f"[library] verificación fallo: {e}", _enabled=MUSIC_DEBUG)
+            return
+        s = lib.last_stats
+        dprint(
+            f"[library] verificada en {time.perf_counter() - t0:.1f}s: total={s['total']} "
+            f"reusados={s['cached']} actualizados={s['updated']} añadidos={s['added']} eliminados={s['removed']}",
+            _enabled=MUSIC_DEBUG,
+        )
+
+    async def _library_loaded(self) -> None:
+        """Espera la carga de la caché si aún está en curso (no la verificación)."""
+        t = self._lib_load_task
+        if t is not None and not t.done():
+            try:
+                await asyncio.shield(t)
+            except Exception:
+                pass
+
+    # --------------- Eventos de Lavalink ---------------
+    # Los handlers solo encolan: cada guild tiene su worker de anuncios.
+    @on_lavalink_event(lavalink.TrackStartEvent)
+    async def _ev_track_start(self, event: Any, guild_id: Optional[int]) -> None:
+        if guild_id is None:
+            return
+        self._idle.mark_active(guild_id)
+        self._ttfa.track_started(guild_id)
+        track = getattr(event, "track", None)
+        self._journal.record_current(
+            guild_id, track, voice_id=self._voice_channel_id(guild_id),
+            text_id=self._guilds.announce_channel_id(guild_id),
+        )
+        # La ruta se resuelve ya: el TrackEnd de un tema corto la suelta
+        path = self._resolve_local_path(guild_id, track)
+        # Un TrackStart nuevo deja obsoletos los anuncios de tracks anteriores
+        self._announcer.submit(
+            guild_id, "track_start", lambda: self._announce_track_start(guild_id, track, path), supersede=True
+        )
+
+    @on_lavalink_event(lavalink.TrackEndEvent)
+    async def _ev_track_end(self, event: Any, guild_id: Optional[int]) -> None:
+        # El track dejó de sonar: suelta su referencia a la ruta local
+        track = getattr(event, "track", None)
+        if guild_id is not None and track is not None:
+            self._guilds.release_tracks(guild_id, (track,))
+
+    @on_lavalink_event(lavalink.QueueEndEvent)
+    async def _ev_queue_end(self, event: Any, guild_id: Optional[int]) -> None:
+        if guild_id is None:
+            return
+        self._idle.mark_idle(guild_id)
+        self._journal.record_current(guild_id, None)
+        self._announcer.submit(guild_id, "queue_end", lambda: self._announce_queue_end(guild_id))
+
+    @on_lavalink_event(lavalink.TrackExceptionEvent, lavalink.TrackStuckEvent)
+    async def _ev_track_failed(self, event: Any, guild_id: Optional[int]) -> None:
+        if guild_id is None:
+            return
+        # La ruta local no se suelta aquí: tras un Stuck/Exception el player
+        # pasa al siguiente y Lavalink manda el TrackEnd de este track
+        track = getattr(event, "track", None)
+        title = self._track_attr(track, "title", "(sin título)") or "(sin título)"
+        reason = getattr(event, "message", None) or (
+            f"atascado {getattr(event, 'threshold', '?')}ms" if isinstance(event, lavalink.TrackStuckEvent) else "error"
+        )
+        dprint(f"[events] {type(event).__name__} (guild={guild_id}): {title} — {reason}", _enabled=MUSIC_DEBUG)
+        self._announcer.submit(guild_id, "track_failed", lambda: self._announce_failed(guild_id, title, str(reason)))
+
+    @on_lavalink_event(lavalink.NodeReadyEvent)
+    async def _ev_node_ready(self, event: Any, guild_id: Optional[int]) -> None:
+        # Primer nodo listo tras cargar el Cog: restaurar las colas guardadas
+        if self._restore_task is None:
+            self._restore_task = asyncio.get_running_loop().create_task(self._restore_queues())
+
+    @on_lavalink_event(lavalink.WebSocketClosedEvent)
+    async def _ev_voice_ws_closed(self, event: Any, guild_id: Optional[int]) -> None:
+        dprint(
+            f"[events] voice WS cerrado (guild={guild_id}): code={getattr(event, 'code', None)} "
+            f"reason={getattr(event, 'reason', None)} by_remote={getattr(event, 'by_remote', None)}",
+            _enabled=MUSIC_DEBUG,
+        )
+
+    async def _announce_track_start(self, gid: int, track: Any, p: Optional[Path]) -> None:
+        """
+        Anuncio de TrackStart (corre en el worker de anuncios del guild):
+        dedupe, embed local con portada (pre-renderizado si se pudo) o texto.
+        """
+        ident = self._announce_key(track)
+        now = time.monotonic()
+        st = self._guilds.get(gid)
+        if ident and (ident == st.last_announced) and (now - st.last_announced_ts < ANNOUNCE_DEDUP_SECONDS):
+            dprint("dedup TrackStartEvent", _enabled=MUSIC_DEBUG)
+            return
+        if ident:
+            st.last_announced = ident
+            st.last_announced_ts = now
+
+        ch = self._get_announce_channel(gid)
+        if not ch:
+            return
+
+        # Lo pre-renderizado en el TrackStart anterior (si era este track)
+        prepared = await self._prefetch.take(gid, ident) if ident else None
+        # Preparar ya el siguiente, en segundo plano mientras se envía este
+        self._prefetch_next(gid)
+
+        # Track local (ruta resuelta en el TrackStart)
+        if p is not None and (prepared is not None or p.exists()):
+            try:
+                if prepared is None:
+                    prepared = await self._prepare_now(p)
+                if self._nowboard.enabled(gid):
+                    self._nowboard.update(gid, ch, prepared=prepared)
+                else:
+                    await send_prepared_now(self._sender(ch), prepared, self._cover_urls)
+            except Exception:
+                # Si algo falla con portada/embeds, al menos anuncia el título
+                title = self._track_attr(track, "title", "(sin título)") or "(sin título)"
+                await self._announce_text(gid, ch, f"▶ **{title}**")
+            return
+
+        # No es local: anuncia con texto mínimo
+        title = self._track_attr(track, "title", "(sin título)") or "(sin título)"
+        await self._announce_text(gid, ch, f"▶ **{title}**")
+
+    async def _announce_queue_end(self, gid: int) -> None:
+        ch = self._get_announce_channel(gid)
+        if ch:
+            try:
+                await self._announce_text(gid, ch, "✅ **Cola terminada.**")
+            except Exception:
+                pass
+
+    async def _announce_failed(self, gid: int, title: str, reason: str) -> None:
+        ch = self._get_announce_channel(gid)
+        if ch:
+            await self._send(ch, f"⚠️ No se pudo reproducir **{title}** ({reason}).")
+
     # --------------- Propiedad/Accesores básicos ---------------
     @property
     def ll(self) -> lavalink.Client:
@@ -165,10 +371,13 @@ class Music(commands.Cog):
     def _track_attr(self, track: Any, attr: str, default: Optional[str] = None) -> Optional[str]:
         """
         Helper interno: obtiene un atributo conocido de un 'track' de Lavalink
-        tolerando diferencias de versión (v3/v4) y posibles dicts.
+        tolerando diferencias de versión (v3/v4) y posibles dicts. Las entradas
+        compactas de la cola se decodifican aquí; para leer varios campos,
+        pasar el resultado de materialize().
         """
         if track is None:
             return default
+        track = materialize(track)
         # objeto con atributos
         val = getattr(track, attr, None)
         if isinstance(val, str) and val.strip():
@@ -180,11 +389,79 @@ class Music(commands.Cog):
                 return v
         return default
 
+    async def _announce_text(self, guild_id: int, ch: Any, text: str) -> None:
+        """
+        Anuncio de texto: edita el mensaje fijo si el guild lo usa, si no envía uno nuevo.
+        """
+        if self._nowboard.enabled(guild_id):
+            self._nowboard.update(guild_id, ch, content=text)
+        else:
+            await self._send(ch, text)
+
+    # --------------- Mensajes salientes (vía outbox) ---------------
+    async def _reply(self, ctx: commands.Context, *args: Any, **kwargs: Any) -> Any:
+        """
+        ctx.reply encolado en el outbox del canal, por delante de anuncios y
+        progreso (priority). Las respuestas a slash no pasan por la cola: van
+        por el webhook de la interacción (otro bucket) y deben salir antes de
+        que venza.
+        """
+        if ctx.interaction is not None:
+            return await ctx.reply(*args, **kwargs)
+        return await self._outbox.submit(ctx.channel.id, lambda: ctx.reply(*args, **kwargs), priority=True)
+
+    async def _send(self, channel: Any, *args: Any, **kwargs: Any) -> Any:
+        """channel.send encolado en el outbox del canal."""
+        return await self._outbox.submit(channel.id, lambda: channel.send(*args, **kwargs))
+
+    def _post(self, channel: Any, *args: Any, **kwargs: Any) -> None:
+        """channel.send encolado sin esperar el resultado."""
+        self._outbox.post(channel.id, lambda: channel.send(*args, **kwargs))
+
+    def _sender(self, channel: Any):
+        """Callable send(**kwargs) -> Awaitable[Message] que pasa por el outbox."""
+        return lambda **kwargs: self._send(channel, **kwargs)
+
+    def _announce_key(self, track: Any) -> str:
+        """
+        Clave de un track para dedupe/pre-render de anuncios (identifier o uri).
+        """
+        track = materialize(track)  # una sola decodificación para ambos campos
+        return str(
+            self._track_attr(track, "identifier", "")
+            or self._track_attr(track, "uri", "")
+            or ""
+        )
+
+    async def _prepare_now(self, path: Path) -> PreparedNow:
+        """
+        Prepara el embed "now playing" (y portada) de un track local.
+        """
+        return await prepare_local_now(path, self.lib, self.cover_store, self._cover_urls)
+
+    def _prefetch_next(self, guild_id: int) -> None:
+        """
+        Agenda el pre-render del anuncio de player.queue[0] si es local;
+        si no hay siguiente (o no es local), descarta lo preparado.
+        """
+        try:
+            player = self.ll.player_manager.get(guild_id)
+            queue = getattr(player, "queue", None) if player else None
+            nxt = materialize(queue[0]) if queue else None
+            p = self._resolve_local_path(guild_id, nxt) if nxt is not None else None
+            key = self._announce_key(nxt) if nxt is not None else ""
+            if p is None or not key:
+                self._prefetch.invalidate(guild_id)
+                return
+            self._prefetch.schedule(guild_id, key, p)
+        except Exception as e:
+            dprint(f"[prefetch] no se pudo agendar (guild={guild_id}): {e}", _enabled=MUSIC_DEBUG)
+
     def _get_announce_channel(self, guild_id: int) -> Optional[discord.abc.Messageable]:
         """
         Devuelve el canal de anuncios registrado para el guild, si existe.
         """
-        ch_id = self._announce_ch.get(guild_id)
+        ch_id = self._guilds.announce_channel_id(guild_id)
         if not ch_id:
             return None
         ch = self.bot.get_channel(ch_id)
@@ -192,29 +469,221 @@ class Music(commands.Cog):
             return ch
         return None
 
-    def _resolve_local_path(self, track: Any) -> Optional[Path]:
-        """
-        Resuelve el Path local asociado a un 'track' (por identifier/uri/pathposix).
-        """
-        ident = self._track_attr(track, "identifier")
-        if isinstance(ident, str) and ident in self._local_map:
-            return self._local_map[ident]
-        uri = self._track_attr(track, "uri")
-        if isinstance(uri, str) and uri in self._local_map:
-            return self._local_map[uri]
-        # Algunas fuentes locales usan el path absoluto como identifier/uri
-        if isinstance(ident, str):
-            p = self._local_map.get(ident)
-            if p:
-                return p
-        return None
+    def _resolve_local_path(self, guild_id: int, track: Any) -> Optional[Path]:
+        """
+        Resuelve el Path local asociado a un 'track' en cola o sonando en el guild.
+        """
+        return self._guilds.local_path(guild_id, track)
+
+    def _map_local(self, guild_id: int, track: Any, path: Path) -> None:
+        """Registra la ruta de un track local recién encolado (una referencia)."""
+        self._guilds.get(guild_id).paths.acquire(track, path)
     
+    def _players(self) -> Dict[int, Any]:
+        return self._ll.player_manager.players if self._ll else {}
+
+    def _is_idle(self, guild_id: int) -> bool:
+        """
+        True si el player del guild está conectado sin reproducción ni cola.
+        """
+        player = self.ll.player_manager.get(guild_id)
+        if player is None:
+            return False
+        return (
+            not bool(getattr(player, "is_playing", False))
+            and getattr(player, "current", None) is None
+            and len(getattr(player, "queue", None) or []) == 0
+            and bool(getattr(player, "channel_id", None) or getattr(player, "is_connected", False))
+        )
+
+    def _ttfa_start(self, ctx: commands.Context, command: str) -> None:
+        """
+        Arranca la medición de tiempo al primer audio si el guild está en silencio
+        (si ya suena, el comando solo encola y no hay "primer audio").
+        """
+        if ctx.guild is None:
+            return
+        player = self.ll.player_manager.get(ctx.guild.id)
+        if player is None or (not getattr(player, "is_playing", False) and getattr(player, "current", None) is None):
+            self._ttfa.start(ctx.guild.id, command)
+
+    async def _auto_disconnect(self, guild_id: int) -> None:
+        """
+        Desconexión por inactividad: destruye el player y sale del canal de voz.
+        """
+        self._prefetch.invalidate(guild_id)
+        self._announcer.forget(guild_id)
+        self._journal.forget(guild_id)
+        self._guilds.release(guild_id)
+        player = self.ll.player_manager.get(guild_id)
+        if player is not None:
+            try:
+                await player.destroy()
+            except Exception as e:
+                dprint(f"[monitor] destroy fallo (guild={guild_id}): {e}", _enabled=MUSIC_DEBUG)
+        guild = self.bot.get_guild(guild_id)
+        vc = guild.voice_client if guild else None
+        if vc:
+            await vc.disconnect(force=True)
+
+    # --------------- Journal de colas: estado y restauración ---------------
+    def _voice_channel_id(self, guild_id: int) -> Optional[int]:
+        player = self._ll.player_manager.get(guild_id) if self._ll else None
+        cid = getattr(player, "channel_id", None) if player else None
+        if cid:
+            return int(cid)
+        guild = self.bot.get_guild(guild_id)
+        ch = getattr(getattr(guild, "voice_client", None), "channel", None) if guild else None
+        return getattr(ch, "id", None)
+
+    def _journal_state(self, guild_id: int) -> Optional[Dict[str, Any]]:
+        """Estado vivo del guild para el journal (None si ya no hay player)."""
+        player = self._ll.player_manager.get(guild_id) if self._ll else None
+        if player is None:
+            return None
+        current = getattr(player, "current", None)
+        return {
+            "queue": getattr(player, "queue", None) or (),
+            "current": current,
+            "position": int(getattr(player, "position", 0) or 0) if current is not None else 0,
+            "paused": bool(getattr(player, "paused", False)),
+            "voice": self._voice_channel_id(guild_id),
+            "text": self._guilds.announce_channel_id(guild_id),
+        }
+
+    async def _restore_queues(self) -> None:
+        """
+        Restaura las colas guardadas: reconecta al canal de voz y retoma el
+        track en curso en su posición. Una vez por carga del Cog.
+        """
+        await self.bot.wait_until_ready()
+        restored = 0
+        for gid in await asyncio.to_thread(self._journal.saved_guilds):
+            try:
+                saved = await asyncio.to_thread(self._journal.load, gid)
+                if await self._restore_guild(gid, saved):
+                    restored += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                dprint(f"[journal] no se pudo restaurar (guild={gid}): {e}", _enabled=MUSIC_DEBUG)
+        if restored:
+            dprint(f"[journal] {restored} cola(s) restaurada(s)", _enabled=MUSIC_DEBUG)
+
+    def _decode_saved(self, rows: List[List[Any]]) -> Tuple[List[Any], List[int]]:
+        """
+        Decodifica [encoded, requester] localmente (en hilo). Devuelve los
+        tracks (None donde no se pudo) y los índices de los locales a mapear.
+        """
+        base = self.music_base_path
+        tracks: List[Any] = []
+        local: List[int] = []
+        for enc, req in rows:
+            t = None
+            if isinstance(enc, str):
+                try:
+                    t = lavalink.decode_track(enc)
+                    t.requester = int(req or 0)
+                except Exception:
+                    t = None
+            tracks.append(t)
+            ident = getattr(t, "identifier", None)
+            if base is not None and isinstance(ident, str) and getattr(t, "source_name", "") == "local":
+                if is_subpath(Path(ident), base):
+                    local.append(len(tracks) - 1)
+        return tracks, local
+
+    async def _restore_guild(self, guild_id: int, saved: Optional[SavedQueue]) -> bool:
+        guild = self.bot.get_guild(guild_id)
+        channel = guild.get_channel(saved.voice_id) if (guild and saved and saved.voice_id) else None
+        listeners = [m for m in getattr(channel, "members", []) if not m.bot]
+        player = self.ll.player_manager.get(guild_id)
+        if player is not None and getattr(player, "current", None) is not None:
+            return False  # ya suena algo: no pisarlo
+        if (saved is None or saved.empty or not listeners
+                or not isinstance(channel, (discord.VoiceChannel, discord.StageChannel))):
+            self._journal.forget(guild_id)
+            return False
+
+        rows = ([saved.current] if saved.current else []) + saved.queue
+        tracks, local = await asyncio.to_thread(self._decode_saved, rows)
+        # Fuentes con campos propios que no se decodifican localmente: al nodo, en un solo pedido
+        missing = [i for i, t in enumerate(tracks) if t is None and isinstance(rows[i][0], str)]
+        if missing:
+            try:
+                for i, t in zip(missing, await self.ll.decode_tracks([rows[i][0] for i in missing])):
+                    t.requester = int(rows[i][1] or 0)
+                    tracks[i] = t
+            except Exception as e:
+                dprint(f"[journal] decode remoto fallo (guild={guild_id}): {e}", _enabled=MUSIC_DEBUG)
+        current = tracks[0] if saved.current else None
+        queued = [t for t in (tracks[1:] if saved.current else tracks) if t is not None]
+        if current is None and not queued:
+            self._journal.forget(guild_id)
+            return False
+
+        # Voz: el cliente anterior (reload) pertenece a otro cliente de Lavalink
+        vc = guild.voice_client
+        if vc is not None:
+            try:
+                await vc.disconnect(force=True)
+            except Exception:
+                pass
+        await channel.connect(cls=LavalinkVoiceClient, self_deaf=True)
+        vc = guild.voice_client
+        if isinstance(vc, LavalinkVoiceClient):
+            await vc.wait_ready(VOICE_READY_TIMEOUT)
+        if saved.text_id:
+            self._guilds.get(guild_id).announce_ch = int(saved.text_id)
+
+        player = await self._ensure_player(guild)
+        self._journal.reset(guild_id)
+        # Admisión: lo restaurado cuenta para los topes como cualquier encolado
+        room = self._admission.room(guild_id)
+        dropped = 0
+        if room is not None and len(queued) > room:
+            dropped = len(queued) - room
+            self._admission.note_rejected(dropped)
+            del queued[room:]
+        # track -> Path solo de lo que efectivamente vuelve a la cola
+        kept = {id(t) for t in queued}
+        if current is not None:
+            kept.add(id(current))
+        for i in local:
+            if id(tracks[i]) in kept:
+                self._map_local(guild_id, tracks[i], Path(tracks[i].identifier))
+        player.queue.extend(queued)
+        if current is not None:
+            pos = int(saved.position or 0)
+            kw: Dict[str, Any] = {"pause": saved.paused}
+            if 0 < pos < int(getattr(current, "duration", 0) or 0):
+                kw["start_time"] = pos
+            await player.play(current, **kw)
+        else:
+            await self._ensure_playing(player, guild_id)
+        dprint(
+            f"[journal] restaurado guild={guild_id}: {len(queued)} en cola ({dropped} sin lugar), "
+            f"actual={'sí' if current is not None else 'no'} @ {saved.position}ms",
+            _enabled=MUSIC_DEBUG,
+        )
+        return True
+
     async def _ensure_player(self, guild: discord.Guild) -> Any:
         """
-        Garantiza un player para el guild (crea si no existe).
+        Garantiza un player para el guild (crea si no existe) con cola indexada
+        de entradas compactas.
         """
         pm = self.ll.player_manager
         player = pm.create(guild.id)
+        # player.queue de lavalink es una list de AudioTrack: índice/rangos O(n)
+        # y un objeto completo por entrada con colas grandes
+        queue = getattr(player, "queue", None)
+        if not isinstance(queue, TrackQueue):
+            player.queue = TrackQueue(queue or ())
+            if queue:
+                self._journal.reset(guild.id)
+        if player.queue.listener is None:
+            player.queue.listener = self._journal.listener(guild.id)
         return player
 
     async def _ensure_playing(self, player: Any, guild_id: int, first_track: Optional[Any] = None) -> None:
@@ -244,7 +713,7 @@ class Music(commands.Cog):
         - Si 'channel' es None, usa el canal de voz del autor del comando.
         - Maneja clientes de voz previos (mover si es LavalinkVoiceClient, 
         desconectar si es otro).
-        - Espera a que el player de Lavalink quede conectado (hasta ~6s).
+        - Espera a que el handshake de voz llegue a Lavalink (hasta VOICE_READY_TIMEOUT).
         - Quita suppress en Stage si aplica.
         - Registra el canal de texto actual como canal de anuncios.
         """
@@ -253,12 +722,12 @@ class Music(commands.Cog):
         if channel is None:
             member = cast(discord.Member, ctx.author)
             if not member.voice or not member.voice.channel:
-                await ctx.reply("Debes estar en un canal de voz.")
+                await self._reply(ctx, "Debes estar en un canal de voz.")
                 return None
             channel = member.voice.channel
 
         if not isinstance(channel, (discord.VoiceChannel, discord.StageChannel)):
-            await ctx.reply("Tipo de canal no soportado.")
+            await self._reply(ctx, "Tipo de canal no soportado.")
             return None
         dest = channel
 
@@ -282,15 +751,20 @@ class Music(commands.Cog):
             dprint(f"[voice] aviso: {e}", _enabled=MUSIC_DEBUG)
             # No interrumpimos: intentaremos igual preparar player
         except Exception as e:
-            await ctx.reply(f"No pude conectar al canal de voz: {e!s}")
+            await self._reply(ctx, f"No pude conectar al canal de voz: {e!s}")
             return None
 
-        # 3) Esperar que el player esté listo
+        # 3) Esperar que el handshake de voz llegue a Lavalink (evento, sin polling)
         player = await self._ensure_player(guild)
-        for _ in range(12):  # ~6s
-            if getattr(player, "channel_id", None) or getattr(player, "is_connected", False):
-                break
-            await asyncio.sleep(0.5)
+        vc_now = guild.voice_client
+        if isinstance(vc_now, LavalinkVoiceClient):
+            if not await vc_now.wait_ready(VOICE_READY_TIMEOUT):
+                dprint(f"[voice] handshake sin completar tras {VOICE_READY_TIMEOUT}s (guild={guild.id})",
+                       _enabled=MUSIC_DEBUG)
+
+        # Sin nada sonando aún: corre el plazo de inactividad (un TrackStart lo cancela)
+        if self._is_idle(guild.id):
+            self._idle.mark_idle(guild.id)
 
         # 4) Stage: quitar suppress o avisar
         if isinstance(dest, discord.StageChannel):
@@ -300,13 +774,13 @@ class Music(commands.Cog):
                     await me.edit(suppress=False)
             except Exception:
                 try:
-                    await ctx.send("Estoy en un Stage: promuéveme a speaker o muéveme a un canal de voz normal.")
+                    await self._send(ctx.channel, "Estoy en un Stage: promuéveme a speaker o muéveme a un canal de voz normal.")
                 except Exception:
                     pass  # ignora si no puede mandar mensaje
 
         # 5) Registrar canal de anuncios
         if ctx.guild and isinstance(ctx.channel, discord.TextChannel):
-            self._announce_ch[ctx.guild.id] = ctx.channel.id
+            self._guilds.get(ctx.guild.id).announce_ch = ctx.channel.id
 
         # 6) Devolver estado del miembro (opcionalmente útil para el caller)
         return cast(discord.Member, ctx.author).voice
@@ -344,9 +818,13 @@ class Music(commands.Cog):
         embed.add_field(
             name="📜 Cola y navegación",
             value="\n".join([
-                both("queue") + " — Muestra la cola.",
+                both("queue", "[página]") + " — Muestra la cola (con botones para paginar).",
                 both("skip", "[n]") + " — Salta *n* temas (por defecto 1).",
                 both("skipto", "<n>") + " — Va a la posición *n* (1 = siguiente).",
+                both("remove", "<n|desde-hasta>") + " — Quita una posición o un rango de la cola.",
+                both("move", "<desde> <hasta>") + " — Mueve un tema a otra posición.",
+                both("dedupe") + " — Quita temas repetidos de la cola.",
+                both("removeuser", "<miembro>") + " — Quita los temas pedidos por un miembro.",
                 both("clearqueue", "[true|false]") + " — Limpia la cola (opcional: detener).",
                 both("now") + " — Track actual (con **portada** si es local).",
             ]),
@@ -358,6 +836,7 @@ class Music(commands.Cog):
                 both("join") + " — Conecta al canal de voz.",
                 both("stop") + " — Detiene, limpia y desconecta.",
                 both("vol", f"<{VOL_MIN}-{VOL_MAX}>") + " — Volumen.",
+                both("nowfijo", "[true|false]") + " — Un solo mensaje de *now playing* que se edita.",
                 both("setlocal") + " — Configura la carpeta base de música local.",
                 both("scanlocal") + " — Escanea (usa caché).",
                 both("reindex") + " — Reconstruye índice sin caché.",
@@ -366,4 +845,4 @@ class Music(commands.Cog):
             inline=False,
         )
         embed.set_footer(text="Sangonomiya Kokomi ♪  |  shuffle: en prefijo usa true/false; en slash marca el toggle.")
-        await ctx.reply(embed=embed)
+        await self._reply(ctx, embed=embed)
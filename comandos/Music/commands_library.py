@@ -2,20 +2,21 @@ from __future__ import annotations
 import asyncio
 import time
 import os
-import random
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Sequence
 import discord
 from discord.ext import commands
 from .library import LocalLibrary
+from .thumbs import CoverStore, cover_store_dir
 from .enqueue import enqueue_tracks_from_paths
+from .permute import LazyShuffle
 from .constants import MAX_CONC_ENQUEUE, WARMUP_FIRST, PROGRESS_EVERY, PROGRESS_MIN_SECS, MUSIC_DEBUG, MUSIC_BASE_ENV
 from .utils import is_subpath, norm, dprint
 from .commands_core import Music as m
  
 class Music(m):
     # ----------------------- Helpers internos de UX -----------------------
-    async def _progress_msg_updater(
+    def _progress_msg_updater(
         self,
         ctx: commands.Context,
         *,
@@ -24,33 +25,46 @@ class Music(m):
         total: int,
     ):
         """
-        Genera un closure async para actualizar un mensaje de progreso:
-        progress(done) -> None (async)
+        Genera closures para el mensaje de progreso, enviado/editado vía outbox:
+        progress(done) -> None (no bloquea; ediciones pendientes se coalescen)
+        finish(text) -> Awaitable (deja el texto final en el mismo mensaje)
         """
         prog_msg: Optional[discord.Message] = None
         last_edit = 0.0
+        latest = ""
+        key = ("progress", object())  # un mensaje de progreso por invocación
+        cid = ctx.channel.id
 
-        async def _progress(done: int):
-            nonlocal prog_msg, last_edit
+        async def _push() -> Optional[discord.Message]:
+            # Usa el texto más reciente al momento de ejecutarse
+            nonlocal prog_msg
+            if prog_msg is None:
+                prog_msg = await ctx.reply(latest)
+            else:
+                await prog_msg.edit(content=latest)
+            return prog_msg
+
+        def _progress(done: int) -> None:
+            nonlocal last_edit, latest
             if step <= 0:
                 return
             now = time.monotonic()
             if (done % step == 0) and (now - last_edit >= min_secs):
                 pct = (done * 100) // (total if total else 1)
-                text = f"Encolando… {done}/{total} ({pct}%)"
-                if prog_msg is None:
-                    try:
-                        prog_msg = await ctx.reply(text)
-                    except Exception:
-                        prog_msg = None
-                else:
-                    try:
-                        await prog_msg.edit(content=text)
-                    except Exception:
-                        pass
+                latest = f"Encolando… {done}/{total} ({pct}%)"
+                self._outbox.post(cid, _push, key=key, droppable=True, edit=prog_msg is not None)
                 last_edit = now
-        # devolver callable y el objeto de mensaje para usar al final
-        return _progress, lambda: prog_msg
+
+        async def _finish(text: str) -> None:
+            nonlocal latest
+            latest = text
+            try:
+                await self._outbox.submit(cid, _push, key=key, edit=prog_msg is not None, priority=True)
+            except Exception as e:
+                dprint(f"[commands_library] aviso: {e}", _enabled=MUSIC_DEBUG)
+                await self._reply(ctx, text)
+
+        return _progress, _finish
 
     async def _warmup_then_enqueue(
         self,
@@ -60,16 +74,17 @@ class Music(m):
         shuffle: bool,
     ) -> int:
         """
-        Warm-up secuencial para sonar rápido + encolado masivo preservando orden.
+        Camino rápido (reproduce apenas resuelve el primer tema) + resto del
+        warm-up y encolado masivo en paralelo, preservando orden.
         Devuelve cantidad total añadida.
         """
         if not paths:
-            await ctx.reply("No hay temas para encolar.")
+            await self._reply(ctx, "No hay temas para encolar.")
             return 0
 
         guild = ctx.guild
         if guild is None:
-            await ctx.reply("Este comando solo funciona en servidores.")
+            await self._reply(ctx, "Este comando solo funciona en servidores.")
             return 0
 
         # Conectar al canal del autor (o al que pases en otros comandos)
@@ -80,11 +95,21 @@ class Music(m):
 
         safe_paths = [p for p in paths if self.music_base_path and is_subpath(p, self.music_base_path)]
         if not safe_paths:
-            await ctx.reply("No hay temas válidos dentro de la carpeta de música configurada.")
+            await self._reply(ctx, "No hay temas válidos dentro de la carpeta de música configurada.")
             return 0
 
+        # Barajado perezoso: permutación sembrada sobre el mismo arreglo (sin
+        # copiarlo ni barajarlo entero); el warm-up solo evalúa los primeros.
+        order: Sequence[Path] = safe_paths
         if shuffle:
-            random.shuffle(safe_paths)
+            order = LazyShuffle(safe_paths)
+            dprint(f"[commands_library] shuffle seed={order.seed} ({len(order)} temas)", _enabled=MUSIC_DEBUG)
+
+        # Admisión: con la cola llena no se resuelve nada
+        if self._admission.room(guild.id) == 0:
+            self._ttfa.cancel(guild.id)
+            await self._reply(ctx, f"🚫 No se encoló nada: {self._admission.full_reason(guild.id)}.")
+            return 0
 
         total = len(safe_paths)
         step = int(getattr(self, "PROGRESS_EVERY", PROGRESS_EVERY))
@@ -92,15 +117,17 @@ class Music(m):
         warmup_first = int(getattr(self, "WARMUP_FIRST", WARMUP_FIRST))
 
         # Progreso (warm-up + paralelo comparten el mismo contador)
-        progress_cb_async, get_prog_msg = await self._progress_msg_updater(
+        progress_cb, finish_progress = self._progress_msg_updater(
             ctx, step=step, min_secs=min_secs, total=total
         )
         added_so_far = 0
-        first_track = None
 
-        # --------- 1) Warm-up secuencial ---------
-        warm_slice = safe_paths[:warmup_first]
-        for p in warm_slice:
+        # --------- 1) Camino rápido: sonar con el primer tema que resuelva ---------
+        gid = getattr(player, "guild_id", guild.id)
+        idx = 0
+        while idx < min(len(order), max(1, warmup_first)):
+            p = order[idx]
+            idx += 1
             identifier = p.resolve().as_posix()
             try:
                 lr = await node.get_tracks(identifier)
@@ -113,57 +140,56 @@ class Music(m):
             t = trks[0]
             player.add(requester=ctx.author.id, track=t)
 
-            # mapear claves locales
-            ident = getattr(t, "identifier", None)
-            uri = getattr(t, "uri", None)
-            for key in (ident, uri, identifier):
-                if isinstance(key, str):
-                    self._local_map[key] = p
-
-            if first_track is None:
-                first_track = t
+            # track -> Path (se suelta al salir de la cola)
+            self._map_local(gid, t, p)
 
             added_so_far += 1
-            await progress_cb_async(added_so_far)
+            progress_cb(added_so_far)
+            # arrancar reproducción ya; el resto se resuelve mientras suena
+            await self._ensure_playing(player, gid, first_track=t)
+            break
 
-        # arrancar reproducción temprano
-        gid = getattr(player, "guild_id", guild.id)
-        await self._ensure_playing(player, gid, first_track=first_track)
+        # --------- 2) Resto del warm-up y luego el masivo, en paralelo preservando orden ---------
+        # El warm-up va aparte (lote chico): deja cola para el 2º tema enseguida,
+        # sin esperar a que termine el masivo.
+        warm_end = max(idx, warmup_first)
+        skipped = 0
+        for chunk in (order[idx:warm_end], order[warm_end:]):
+            if not chunk:
+                continue
+            base_done = added_so_far
 
-        # --------- 2) Paralelo preservando orden ---------
-        rest_paths = safe_paths[warmup_first:]
-        if rest_paths:
             # el helper de enqueue reporta done relativo al subset;
-            # lo convertimos a global sumando added_so_far actual
-            def _progress_cb_subset(done_subset: int, total_subset: int):
-                self.bot.loop.create_task(progress_cb_async(added_so_far + done_subset))
+            # lo convertimos a global sumando lo añadido antes del subset
+            def _progress_cb_subset(done_subset: int, total_subset: int, base_done: int = base_done):
+                progress_cb(base_done + done_subset)
 
-            added2, _failed2 = await enqueue_tracks_from_paths(
+            added2, _failed2, skipped2 = await enqueue_tracks_from_paths(
                 node=node,
                 player=player,
                 guild_id=guild.id,
                 requester_id=ctx.author.id,
-                paths=rest_paths,
-                local_map=self._local_map,
+                paths=chunk,
+                local_paths=self._guilds.get(guild.id).paths,
                 ensure_playing=self._ensure_playing,
                 shuffle=False,
                 max_concurrency=MAX_CONC_ENQUEUE,
                 progress_cb=_progress_cb_subset,
+                room=lambda: self._admission.room(guild.id),
                 debug_enabled=False,
             )
             added_so_far += added2
+            skipped += skipped2
 
-        # Mensaje final
-        prog_msg = get_prog_msg()
-        final_text = f"Encolados {added_so_far} temas. 🎶"
-        if prog_msg:
-            try:
-                await prog_msg.edit(content=final_text)
-            except Exception as e:
-                dprint(f"[commands_library] aviso: {e}", _enabled=MUSIC_DEBUG)
-                await ctx.reply(final_text)
+        # Mensaje final (reemplaza cualquier progreso aún pendiente)
+        if skipped:
+            self._admission.note_rejected(skipped)
+            await finish_progress(
+                f"Encolados {added_so_far} de {total} temas. 🎶 "
+                f"{skipped} sin encolar: {self._admission.full_reason(guild.id)}."
+            )
         else:
-            await ctx.reply(final_text)
+            await finish_progress(f"Encolados {added_so_far} temas. 🎶")
 
         return added_so_far
 
@@ -172,18 +198,23 @@ class Music(m):
     async def setlocal(self, ctx: commands.Context, *, folder: str):
         p = Path(folder).expanduser().resolve()
         if not p.exists() or not p.is_dir():
-            return await ctx.reply("La ruta indicada no existe o no es una carpeta.")
+            return await self._reply(ctx, "La ruta indicada no existe o no es una carpeta.")
         # Actualiza base y librería
         self.music_base_path = p
         self.base_path = p.parent
         self.lib = LocalLibrary(p)
+        if self.cover_store is not None:
+            self.cover_store.close()
+        self.cover_store = CoverStore(cover_store_dir(p))
+        # Índice desde la caché de esa carpeta (si hay) + verificación de fondo
+        self._start_library_warmup()
 
         try:
             os.environ[MUSIC_BASE_ENV] = str(p)
         except Exception:
             pass
 
-        await ctx.reply(f"Carpeta de música configurada en:\n`{p}`\n"
+        await self._reply(ctx, f"Carpeta de música configurada en:\n`{p}`\n"
                         f"(Para persistir entre reinicios, define {MUSIC_BASE_ENV} en tu sistema o .env)")
 
 
@@ -192,7 +223,7 @@ class Music(m):
     async def scanlocal(self, ctx: commands.Context):
         await ctx.defer()
         if not self.music_base_path or not self.lib:
-            return await ctx.reply("Primero usa `!setmusic <ruta>`.")
+            return await self._reply(ctx, "Primero usa `!setmusic <ruta>`.")
         try:
             async with asyncio.Lock():
                 loop = asyncio.get_running_loop()
@@ -201,38 +232,40 @@ class Music(m):
             albs = sum(len(v) for v in self.lib.data.values())
             tracks = len(self.lib.all_tracks())
             s = self.lib.last_stats
-            await ctx.reply(
+            await self._reply(ctx, 
                 f"Escaneo: {arts} artistas, {albs} álbumes, {tracks} temas.\n"
                 f"Cache → total:{s['total']} reusados:{s['cached']} actualizados:{s['updated']} añadidos:{s['added']} eliminados:{s['removed']}."
             )
         except Exception as e:
             dprint(f"[commands_library] aviso: {e}", _enabled=MUSIC_DEBUG)
-            return await ctx.reply(f"No se pudo escanear.")
+            return await self._reply(ctx, f"No se pudo escanear.")
     
     @commands.guild_only()
     @commands.hybrid_command(name="reindex", description="Reconstruye índice ignorando caché.")
     async def reindex(self, ctx: commands.Context):
         await ctx.defer()
         if not self.base_path or not self.lib:
-            return await ctx.reply("MUSIC_BASE no está configurado.")
+            return await self._reply(ctx, "MUSIC_BASE no está configurado.")
         async with asyncio.Lock():
             loop = asyncio.get_running_loop()
             await loop.run_in_executor(None, self.lib.scan, True)
-        await ctx.reply("Reindex completo listo ✅")
+        await self._reply(ctx, "Reindex completo listo ✅")
     
     @commands.guild_only()
     @commands.hybrid_command(name="play_artist", description="Reproduce todos los temas de un artista.")
     async def play_artist(self, ctx: commands.Context, artista: str, shuffle: Optional[bool] = False):
+        self._ttfa_start(ctx, "play_artist")
         await ctx.defer()
         if not self.base_path or not self.lib:
-            return await ctx.reply("MUSIC_BASE no está configurado.")
+            return await self._reply(ctx, "MUSIC_BASE no está configurado.")
+        await self._library_loaded()
         if await self._connect(ctx) is None:
             return
         arts = self.lib.artists()
         if artista not in arts:
             m = next((a for a in arts if norm(a) == norm(artista)), None)
             if not m:
-                return await ctx.reply("Artista no encontrado. Ejecuta /scanlocal y revisa los nombres.")
+                return await self._reply(ctx, "Artista no encontrado. Ejecuta /scanlocal y revisa los nombres.")
             artista = m
         paths = self.lib.tracks_by_artist(artista)
         await self._warmup_then_enqueue(ctx, paths, shuffle=bool(shuffle))
@@ -240,22 +273,24 @@ class Music(m):
     @commands.guild_only()
     @commands.hybrid_command(name="play_album", description="Reproduce un álbum específico.")
     async def play_album(self, ctx: commands.Context, artista: str, album: str, shuffle: Optional[bool] = False):
+        self._ttfa_start(ctx, "play_album")
         await ctx.defer()
         if not self.base_path or not self.lib:
-            return await ctx.reply("MUSIC_BASE no está configurado.")
+            return await self._reply(ctx, "MUSIC_BASE no está configurado.")
+        await self._library_loaded()
         if await self._connect(ctx) is None:
             return
         arts = self.lib.artists()
         if artista not in arts:
             m = next((a for a in arts if norm(a) == norm(artista)), None)
             if not m:
-                return await ctx.reply("Artista no encontrado.")
+                return await self._reply(ctx, "Artista no encontrado.")
             artista = m
         albs = self.lib.albums(artista)
         if album not in albs:
             m = next((a for a in albs if norm(a) == norm(album)), None)
             if not m:
-                return await ctx.reply("Álbum no encontrado.")
+                return await self._reply(ctx, "Álbum no encontrado.")
             album = m
         paths = self.lib.tracks_by_album(artista, album)
         await self._warmup_then_enqueue(ctx, paths, shuffle=bool(shuffle))
@@ -263,9 +298,11 @@ class Music(m):
     @commands.guild_only()
     @commands.hybrid_command(name="play_local", description="Reproduce toda la biblioteca local.")
     async def play_local(self, ctx: commands.Context, shuffle: Optional[bool] = False):
+        self._ttfa_start(ctx, "play_local")
         await ctx.defer()
         if not self.base_path or not self.lib:
-            return await ctx.reply("MUSIC_BASE no está configurado.")
+            return await self._reply(ctx, "MUSIC_BASE no está configurado.")
+        await self._library_loaded()
         if await self._connect(ctx) is None:
             return
         paths = self.lib.all_tracks()
@@ -1,11 +1,14 @@
 from __future__ import annotations
-from typing import Optional, List, cast
+from itertools import islice
+from typing import Any, Optional, cast
 import discord
 from discord.ext import commands
 from .commands_core import Music as m
 from .constants import EMBED_COLOR_PRIMARY
-from .covers import build_local_now_embed
-from .utils import popleft_many, strip_discord_wrapping, is_subpath
+from .covers import send_local_now
+from .playqueue import entry_key, materialize
+from .queueview import QueuePager
+from .utils import parse_range, popleft_many, strip_discord_wrapping, is_subpath
 from pathlib import Path
 import lavalink
 
@@ -13,6 +16,7 @@ class Music(m):
     @commands.guild_only()
     @commands.hybrid_command(name="play", description="Reproduce una URL, ruta local o busca en YouTube. Acepta playlists.")
     async def play(self, ctx: commands.Context, *, query: str):
+        self._ttfa_start(ctx, "play")
         await ctx.defer()
         guild = cast(discord.Guild, ctx.guild)
         voice = await self._connect(ctx)
@@ -28,25 +32,24 @@ class Music(m):
         p = Path(q)
         if p.exists() and p.is_file():
             if self.base_path and not is_subpath(p, self.base_path):
-                return await ctx.reply("La ruta no está dentro de la MUSIC_BASE autorizada.")
+                return await self._reply(ctx, "La ruta no está dentro de la MUSIC_BASE autorizada.")
             local_identifier = p.resolve().as_posix()
             try:
                 load_res = await node.get_tracks(local_identifier)
             except Exception as e:
-                return await ctx.reply(f"No se pudo cargar el archivo local: {e}")
+                return await self._reply(ctx, f"No se pudo cargar el archivo local: {e}")
             tracks = getattr(load_res, "tracks", None) or []
             if not tracks:
-                return await ctx.reply("No se pudo cargar el archivo local (¿'local' habilitado en Lavalink?).")
+                return await self._reply(ctx, "No se pudo cargar el archivo local (¿'local' habilitado en Lavalink?).")
+            if self._admission.room(guild.id) == 0:
+                self._admission.note_rejected(1)
+                return await self._reply(ctx, f"🚫 No se encoló: {self._admission.full_reason(guild.id)}.")
             t = tracks[0]
             player.add(requester=ctx.author.id, track=t)
-            ident = self._track_attr(t, "identifier")
-            uri   = self._track_attr(t, "uri")
-            for key in (ident, uri, local_identifier, q):
-                if isinstance(key, str):
-                    self._local_map[key] = p.resolve()
+            self._map_local(guild.id, t, p.resolve())
             await self._ensure_playing(player, gid, first_track=t)
             try:
-                await ctx.reply("✅")
+                await self._reply(ctx, "✅")
             except Exception:
                 pass
             return
@@ -56,11 +59,11 @@ class Music(m):
         try:
             load_res = await node.get_tracks(identifier)
         except Exception as e:
-            return await ctx.reply(f"No se pudo cargar: {e}")
+            return await self._reply(ctx, f"No se pudo cargar: {e}")
 
         tracks = getattr(load_res, "tracks", None) or []
         if not tracks:
-            return await ctx.reply("Sin resultados.")
+            return await self._reply(ctx, "Sin resultados.")
 
         lt = getattr(load_res, "load_type", None)
         def _is(kind: "lavalink.LoadType") -> bool:
@@ -78,44 +81,60 @@ class Music(m):
         if _is(lavalink.LoadType.PLAYLIST):
             pl_info = getattr(load_res, "playlist_info", None)
             pl_name = getattr(pl_info, "name", None) if pl_info else None
-            for tr in tracks:
+            room = self._admission.room(guild.id)
+            admitted = tracks if room is None else tracks[:room]
+            if not admitted:
+                self._admission.note_rejected(len(tracks))
+                return await self._reply(ctx, f"🚫 No se encoló: {self._admission.full_reason(guild.id)}.")
+            for tr in admitted:
                 player.add(requester=ctx.author.id, track=tr)
-            await self._ensure_playing(player, gid, first_track=(tracks[0] if tracks else None))
-            msg = f"Añadida playlist con **{len(tracks)}** temas."
+            await self._ensure_playing(player, gid, first_track=admitted[0])
+            msg = f"Añadida playlist con **{len(admitted)}** temas."
             if pl_name:
-                msg = f"Añadida playlist **{pl_name}** con **{len(tracks)}** temas."
-            return await ctx.reply(msg)
+                msg = f"Añadida playlist **{pl_name}** con **{len(admitted)}** temas."
+            if len(admitted) < len(tracks):
+                self._admission.note_rejected(len(tracks) - len(admitted))
+                msg += f" {len(tracks) - len(admitted)} sin encolar: {self._admission.full_reason(guild.id)}."
+            return await self._reply(ctx, msg)
 
+        if self._admission.room(guild.id) == 0:
+            self._admission.note_rejected(1)
+            return await self._reply(ctx, f"🚫 No se encoló: {self._admission.full_reason(guild.id)}.")
         t = tracks[0]
+        player.add(requester=ctx.author.id, track=t)
         id_str = self._track_attr(t, "identifier")
         if isinstance(id_str, str):
             try:
                 maybe_path = Path(id_str)
                 if maybe_path.is_absolute():
-                    self._local_map[id_str] = maybe_path
+                    self._map_local(guild.id, t, maybe_path)
             except Exception:
                 pass
-        player.add(requester=ctx.author.id, track=t)
         if not player.is_playing:
             await self._ensure_playing(player, gid, first_track=t)
-            await ctx.reply("✅")
+            await self._reply(ctx, "✅")
         else:
-            await ctx.reply(f"➕ En cola: **{self._track_attr(t, 'title', '(sin título)')}**")
+            await self._reply(ctx, f"➕ En cola: **{self._track_attr(t, 'title', '(sin título)')}**")
 
     @commands.guild_only()
-    @commands.hybrid_command(name="queue", description="Muestra la cola.")
-    async def queue(self, ctx: commands.Context):
+    @commands.hybrid_command(name="queue", description="Muestra la cola (paginada).")
+    async def queue(self, ctx: commands.Context, pagina: Optional[int] = None):
         guild = cast(discord.Guild, ctx.guild)
         player = self.ll.player_manager.get(guild.id)
         if not player or (not player.queue and not player.current):
-            return await ctx.reply("Cola vacía.")
-        lines: List[str] = []
-        if player.current:
-            cur = player.current
-            lines.append(f"▶️ **Ahora:** {getattr(cur, 'title', '(sin título)')} — `{getattr(cur, 'author', '')}`")
-        for idx, t in enumerate(player.queue, start=1):
-            lines.append(f"{idx}. {getattr(t, 'title', '(sin título)')} — `{getattr(t, 'author', '')}`")
-        await ctx.reply("\n".join(lines[:20]) or "Cola vacía.")
+            return await self._reply(ctx, "Cola vacía.")
+        # Solo se renderiza la página pedida; los botones navegan el resto
+        view = QueuePager(
+            cache=self._queue_pages,
+            guild_id=guild.id,
+            get_player=self.ll.player_manager.get,
+            page=max(0, (pagina or 1) - 1),
+            post=self._outbox.post,
+        )
+        text = view.render()
+        if self._queue_pages.page_count(player) <= 1:
+            return await self._reply(ctx, text)
+        view.message = await self._reply(ctx, text, view=view)
 
     @commands.guild_only()
     @commands.hybrid_command(name="skip", description="Salta N temas (por defecto 1).")
@@ -124,13 +143,14 @@ class Music(m):
         guild = cast(discord.Guild, ctx.guild)
         player = self.ll.player_manager.get(guild.id)
         if not player:
-            return await ctx.reply("No hay reproductor.")
+            return await self._reply(ctx, "No hay reproductor.")
         n = 1 if (n is None or n < 1) else int(n)
         if not player.is_playing and not player.queue:
-            return await ctx.reply("No hay reproducción.")
-        q_list = list(player.queue)
+            return await self._reply(ctx, "No hay reproducción.")
+        self._prefetch.invalidate(guild.id)
         to_remove = max(0, n - 1)
-        target_pre = q_list[to_remove] if to_remove < len(q_list) else None
+        target_pre = player.queue[to_remove] if to_remove < len(player.queue) else None
+        self._guilds.release_tracks(guild.id, islice(player.queue, to_remove))
         removed_from_queue = popleft_many(player.queue, to_remove)
         gid = getattr(player, "guild_id", guild.id)
         if player.is_playing or player.current:
@@ -142,11 +162,11 @@ class Music(m):
                 await self._ensure_playing(player, gid, first_track=next_first)
                 total_skipped = removed_from_queue
             else:
-                return await ctx.reply("Cola vacía.")
+                return await self._reply(ctx, "Cola vacía.")
         if target_pre is not None:
-            await ctx.reply(f"⏭️ Saltados {total_skipped} temas.")
+            await self._reply(ctx, f"⏭️ Saltados {total_skipped} temas.")
         else:
-            await ctx.reply(f"⏭️ Saltados {total_skipped} temas. Cola terminada.")
+            await self._reply(ctx, f"⏭️ Saltados {total_skipped} temas. Cola terminada.")
 
     @commands.guild_only()
     @commands.hybrid_command(name="skipto", description="Salta a la posición N de la cola (1 = siguiente).")
@@ -155,19 +175,21 @@ class Music(m):
         guild = cast(discord.Guild, ctx.guild)
         player = self.ll.player_manager.get(guild.id)
         if not player:
-            return await ctx.reply("No hay reproductor.")
+            return await self._reply(ctx, "No hay reproductor.")
         if index < 1:
             index = 1
-        q_list = list(player.queue)
-        if not q_list:
+        self._prefetch.invalidate(guild.id)
+        q_len = len(player.queue)
+        if not q_len:
             if player.is_playing or player.current:
                 await player.skip()
-                return await ctx.reply("⏭️ Cola vacía. Reproducción detenida.")
-            return await ctx.reply("No hay temas en la cola.")
-        if index > len(q_list):
-            to_remove = len(q_list); target_pre = None
+                return await self._reply(ctx, "⏭️ Cola vacía. Reproducción detenida.")
+            return await self._reply(ctx, "No hay temas en la cola.")
+        if index > q_len:
+            to_remove = q_len;     target_pre = None
         else:
-            to_remove = index - 1;   target_pre = q_list[index - 1]
+            to_remove = index - 1; target_pre = player.queue[index - 1]
+        self._guilds.release_tracks(guild.id, islice(player.queue, to_remove))
         removed_from_queue = popleft_many(player.queue, to_remove)
         gid = getattr(player, "guild_id", guild.id)
         if (player.is_playing or player.current):
@@ -179,11 +201,11 @@ class Music(m):
                 await self._ensure_playing(player, gid, first_track=next_first)
                 total_skipped = removed_from_queue
             else:
-                return await ctx.reply("Cola vacía tras saltar.")
+                return await self._reply(ctx, "Cola vacía tras saltar.")
         if target_pre is not None:
-            await ctx.reply(f"⏭️ Saltados {total_skipped} temas hasta la posición {index}.")
+            await self._reply(ctx, f"⏭️ Saltados {total_skipped} temas hasta la posición {index}.")
         else:
-            await ctx.reply(f"⏭️ Saltados {total_skipped} temas hasta el final. Cola terminada.")
+            await self._reply(ctx, f"⏭️ Saltados {total_skipped} temas hasta el final. Cola terminada.")
 
     @commands.guild_only()
     @commands.hybrid_command(name="clearqueue", description="Limpia la cola. Opcional: detener la reproducción.")
@@ -192,22 +214,117 @@ class Music(m):
         guild = cast(discord.Guild, ctx.guild)
         player = self.ll.player_manager.get(guild.id)
         if not player:
-            return await ctx.reply("No hay reproductor.")
+            return await self._reply(ctx, "No hay reproductor.")
 
         # Limpiar cola
         n = len(player.queue)
         player.queue.clear()
+        self._prefetch.invalidate(guild.id)
+        st = self._guilds.peek(guild.id)
+        if st is not None:
+            # Solo conserva la ruta del que sigue sonando (si no se detiene)
+            st.paths.retain(None if stop else player.current)
 
         # Detener opcionalmente (pero NO desconectar del VC)
         if stop:
             await player.stop()
+            self._idle.mark_idle(guild.id)
             try:
                 await player.set_pause(False)  # por si quedó pausado
             except Exception:
                 pass
-            await ctx.reply(f"🧹 Cola limpiada ({n}). ⏹️ Reproducción detenida.")
+            await self._reply(ctx, f"🧹 Cola limpiada ({n}). ⏹️ Reproducción detenida.")
+        else:
+            await self._reply(ctx, f"🧹 Cola limpiada ({n}). ⏯️ Sonando se mantiene.")
+
+    # --------------- Edición de la cola (sin ida y vuelta a Lavalink) ---------------
+    def _queue_edited(self, player: Any, guild_id: int) -> None:
+        """Tras editar la cola: re-agenda el pre-render del siguiente si cambió."""
+        if getattr(player, "current", None) is not None:
+            self._prefetch_next(guild_id)
         else:
-            await ctx.reply(f"🧹 Cola limpiada ({n}). ⏯️ Sonando se mantiene.")
+            self._prefetch.invalidate(guild_id)
+
+    @commands.guild_only()
+    @commands.hybrid_command(name="remove", description="Quita de la cola una posición o un rango (p. ej. 3-10).")
+    async def remove(self, ctx: commands.Context, rango: str):
+        guild = cast(discord.Guild, ctx.guild)
+        player = self.ll.player_manager.get(guild.id)
+        if not player or not player.queue:
+            return await self._reply(ctx, "No hay temas en la cola.")
+        span = parse_range(rango, len(player.queue))
+        if span is None:
+            return await self._reply(ctx, f"Rango inválido. Usa `N` o `desde-hasta` (1-{len(player.queue)}).")
+        a, b = span
+        title = self._track_attr(materialize(player.queue[a - 1]), "title", "(sin título)") if a == b else None
+        self._guilds.release_tracks(guild.id, player.queue[a - 1:b])
+        del player.queue[a - 1:b]
+        self._queue_edited(player, guild.id)
+        if title is not None:
+            return await self._reply(ctx, f"🗑️ Quitado #{a}: **{title}**.")
+        await self._reply(ctx, f"🗑️ Quitados {b - a + 1} temas ({a}-{b}).")
+
+    @commands.guild_only()
+    @commands.hybrid_command(name="move", description="Mueve un tema de la cola a otra posición.")
+    async def move(self, ctx: commands.Context, desde: int, hasta: int):
+        guild = cast(discord.Guild, ctx.guild)
+        player = self.ll.player_manager.get(guild.id)
+        n = len(player.queue) if player else 0
+        if not n:
+            return await self._reply(ctx, "No hay temas en la cola.")
+        if not (1 <= desde <= n):
+            return await self._reply(ctx, f"Posición inválida: {desde} (1-{n}).")
+        hasta = min(max(1, hasta), n)
+        moved = player.queue.move(desde - 1, hasta - 1)
+        self._queue_edited(player, guild.id)
+        title = self._track_attr(materialize(moved), "title", "(sin título)")
+        await self._reply(ctx, f"↕️ **{title}**: {desde} → {hasta}.")
+
+    @commands.guild_only()
+    @commands.hybrid_command(name="dedupe", description="Quita de la cola los temas repetidos (queda el primero).")
+    async def dedupe(self, ctx: commands.Context):
+        guild = cast(discord.Guild, ctx.guild)
+        player = self.ll.player_manager.get(guild.id)
+        if not player or not player.queue:
+            return await self._reply(ctx, "No hay temas en la cola.")
+        seen: set = set()
+        dropped: list = []
+
+        def _dup(entry: Any) -> bool:
+            key = entry_key(entry)
+            if key in seen:
+                dropped.append(entry)
+                return True
+            seen.add(key)
+            return False
+
+        removed = player.queue.remove_if(_dup)
+        self._guilds.release_tracks(guild.id, dropped)
+        if removed:
+            self._queue_edited(player, guild.id)
+        await self._reply(ctx, f"🧹 Quitados {removed} repetidos. Quedan {len(player.queue)} temas en cola.")
+
+    @commands.guild_only()
+    @commands.hybrid_command(name="removeuser", description="Quita de la cola los temas pedidos por un miembro.")
+    async def removeuser(self, ctx: commands.Context, miembro: discord.Member):
+        guild = cast(discord.Guild, ctx.guild)
+        player = self.ll.player_manager.get(guild.id)
+        if not player or not player.queue:
+            return await self._reply(ctx, "No hay temas en la cola.")
+        uid = miembro.id
+        dropped: list = []
+
+        def _by_user(entry: Any) -> bool:
+            if getattr(entry, "requester", None) == uid:
+                dropped.append(entry)
+                return True
+            return False
+
+        removed = player.queue.remove_if(_by_user)
+        self._guilds.release_tracks(guild.id, dropped)
+        if removed:
+            self._queue_edited(player, guild.id)
+        await self._reply(ctx, f"🗑️ Quitados {removed} temas de **{miembro.display_name}**.")
 
     @commands.guild_only()
     @commands.hybrid_command(name="stop", description="Detiene y limpia la cola.")
@@ -215,9 +332,16 @@ class Music(m):
         guild = cast(discord.Guild, ctx.guild)
         player = self.ll.player_manager.get(guild.id)
         if not player:
-            return await ctx.reply("Nada que detener.")
+            return await self._reply(ctx, "Nada que detener.")
         await player.stop()
         player.queue.clear()
+        self._prefetch.invalidate(guild.id)
+        self._announcer.forget(guild.id)
+        self._idle.forget(guild.id)
+        self._ttfa.cancel(guild.id)
+        self._queue_pages.forget(guild.id)
+        self._journal.forget(guild.id)
+        self._guilds.release(guild.id)
         try:
             await player.destroy()
         except Exception:
@@ -228,7 +352,7 @@ class Music(m):
                 await vc.disconnect(force=True)
             except Exception:
                 pass
-        await ctx.reply("⏹️ Detenido y desconectado.")
+        await self._reply(ctx, "⏹️ Detenido y desconectado.")
     
     @commands.guild_only()
     @commands.hybrid_command(name="now", description="Muestra el tema actual. Si es local, incluye portada y metadatos.")
@@ -236,18 +360,15 @@ class Music(m):
         guild = cast(discord.Guild, ctx.guild)
         player = self.ll.player_manager.get(guild.id)
         if not player or not player.current:
-            return await ctx.reply("Nada sonando.")
+            return await self._reply(ctx, "Nada sonando.")
         cur = player.current
-        p = self._resolve_local_path(cur)
+        p = self._resolve_local_path(guild.id, cur)
         if p is not None and p.exists():
-            embed, cover_file = await build_local_now_embed(p)
-            if cover_file:
-                return await ctx.reply(embed=embed, file=cover_file)
-            return await ctx.reply(embed=embed)
+            return await send_local_now(lambda **kw: self._reply(ctx, **kw), p, lib=self.lib, store=self.cover_store, url_cache=self._cover_urls)
         title = self._track_attr(cur, "title", "(sin título)")
         author = self._track_attr(cur, "author", "")
         uri = self._track_attr(cur, "uri", None)
         embed = discord.Embed(title=str(title), colour=EMBED_COLOR_PRIMARY, description=f"`{author}`")
         if isinstance(uri, str):
             embed.add_field(name="Enlace", value=uri, inline=False)
-        await ctx.reply(embed=embed)
\ No newline at end of file
+        await self._reply(ctx, embed=embed)
\ No newline at end of file
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import cast, List
+from typing import cast, List, Optional
 import discord
 from discord.ext import commands
 from .commands_core import Music as m
@@ -11,7 +11,7 @@ class Music(m):
     async def vol(self, ctx: commands.Context, volume: int):
         # Validación estricta del rango antes de aplicar
         if volume < VOL_MIN or volume > VOL_MAX:
-            return await ctx.reply(
+            return await self._reply(ctx, 
                 f"⚠️ El volumen debe ser un valor **entre {VOL_MIN} y {VOL_MAX}**. "
                 "Por favor, ingresa un número dentro de ese rango."
             )
@@ -19,10 +19,22 @@ class Music(m):
         guild = cast(discord.Guild, ctx.guild)
         player = self.ll.player_manager.get(guild.id)
         if not player:
-            return await ctx.reply("❌ No hay reproductor activo en este servidor.")
+            return await self._reply(ctx, "❌ No hay reproductor activo en este servidor.")
 
         await player.set_volume(volume)
-        await ctx.reply(f"🔊 Volumen ajustado a **{volume}%** correctamente.")
+        await self._reply(ctx, f"🔊 Volumen ajustado a **{volume}%** correctamente.")
+
+    @commands.guild_only()
+    @commands.hybrid_command(name="nowfijo", description="Usa un solo mensaje de 'now playing' que se edita en cada tema.")
+    async def nowfijo(self, ctx: commands.Context, activar: Optional[bool] = None):
+        """Sin argumento alterna el modo; con true/false lo fija."""
+        guild = cast(discord.Guild, ctx.guild)
+        on = (not self._nowboard.enabled(guild.id)) if activar is None else bool(activar)
+        await self._nowboard.set_enabled(guild.id, on)
+        if on:
+            await self._reply(ctx, "📌 Mensaje fijo activado: el *now playing* se editará en cada tema.")
+        else:
+            await self._reply(ctx, "📌 Mensaje fijo desactivado: cada tema se anuncia en un mensaje nuevo.")
 
     # ---------------- Diagnóstico ----------------
     @commands.guild_only()
@@ -59,10 +71,50 @@ class Music(m):
             if vs and vs.channel:
                 author_in = vs.channel.name
         lines.append(f"Author in: {author_in}")
-        await ctx.reply("```\n" + "\n".join(lines) + "\n```")
+        ev = self._events.stats()
+        if ev:
+            lines.append("Eventos: " + " ".join(
+                f"{name.removesuffix('Event')}={st['count']}" + (f"({st['max_ms']:.0f}ms máx)" if st["handled"] else "")
+                for name, st in ev.items()
+            ))
+        for cmd, st in self._ttfa.stats().items():
+            lines.append(
+                f"TTFA {cmd}: n={st['count']} p50≤{st['p50_ms']:.0f}ms p90≤{st['p90_ms']:.0f}ms "
+                f"máx={st['max_ms']:.0f}ms"
+            )
+        an = self._announcer.stats()
+        lines.append(
+            f"Anuncios: cola={an['depth']} (pico {an['peak_depth']}) procesados={an['processed']} "
+            f"obsoletos={an['dropped_stale']} desbordados={an['dropped_overflow']} fallidos={an['failed']}"
+        )
+        ob = self._outbox.stats()
+        lines.append(
+            f"Outbox: cola={ob['depth']} (pico {ob['peak_depth']}) coalescidos={ob['coalesced']} "
+            f"descartados={ob['dropped']} fallidos={ob['failed']} 429={ob['rate_limited']}"
+        )
+        jn = self._journal.stats()
+        lines.append(
+            f"Journal: guilds={jn['guilds']} pendientes={jn['pending']} escrituras={jn['flushes']} "
+            f"líneas={jn['lines']} snapshots={jn['snapshots']}"
+        )
+        ad = self._admission.stats()
+        lines.append(
+            f"Admisión: entradas={ad['entries']} (~{ad['approx_bytes'] // (1024 * 1024)} MB) "
+            f"tope/guild={ad['max_len']} tope global={ad['max_entries']} rechazados={ad['rejected']}"
+        )
+        if self.lib is not None:
+            vt = self._lib_verify_task
+            verifying = vt is not None and not vt.done()
+            lines.append(
+                f"Biblioteca: temas={len(self.lib.meta)} "
+                f"verificación={'en curso' if verifying else 'lista'}"
+            )
+        gs = self._guilds.stats()
+        lines.append(f"Guilds: activos={gs['guilds']} rutas locales={gs['paths']} liberados={gs['released']}")
+        await self._reply(ctx, "```\n" + "\n".join(lines) + "\n```")
 
     @commands.guild_only()
     @commands.hybrid_command(name="join", description="Fuerza conexión al canal de voz actual.")
     async def join(self, ctx: commands.Context):
         voice = await self._connect(ctx)
-        await ctx.reply("OK" if voice else "NO")
\ No newline at end of file
+        await self._reply(ctx, "OK" if voice else "NO")
\ No newline at end of file
@@ -18,8 +18,29 @@ COVER_CAND_NAMES: Final[tuple[str, ...]] = (
 COVER_EXTS: Final[tuple[str, ...]] = (".png", ".jpg", ".jpeg", ".webp")
 
 # Índice local
-CACHE_VERSION: Final[int] = 1
+CACHE_VERSION: Final[int] = 3
 MUSIC_CACHE_FILENAME: Final[str] = ".kokomi_music_cache.json"
+LIBRARY_VERIFY_DELAY: Final[float] = 5.0   # s tras cargar la caché antes de verificar contra el disco
+LIBRARY_VERIFY_NICE: Final[int] = 10       # nice de los workers de tags en la verificación
+LIBRARY_VERIFY_YIELD_EVERY: Final[int] = 256  # archivos recorridos entre pausas (cede el GIL al loop)
+LIBRARY_VERIFY_PAUSE: Final[float] = 0.001    # s de cada pausa
+
+# Store de miniaturas de portada (en la carpeta de estado, una subcarpeta por biblioteca)
+THUMB_STORE_DIRNAME: Final[str] = "covers"
+THUMB_SIZE: Final[int] = 320                        # lado máximo en px
+THUMB_STORE_MAX_BYTES: Final[int] = 64 * 1024 * 1024  # límite total con desalojo LRU
+THUMB_WORKERS: Final[int] = 1
+
+# URLs de CDN de portadas ya subidas (se reusan en vez de re-subir)
+COVER_URL_TTL: Final[int] = 12 * 3600          # si la URL no trae 'ex'
+COVER_URL_EXPIRY_MARGIN: Final[int] = 3600     # vencer antes que la firma de Discord
+COVER_URL_CACHE_MAX: Final[int] = 4096
+
+# Estado persistente del bot (relativo al directorio de trabajo)
+STATE_DIR_ENV: Final[str] = "KOKOMI_STATE_DIR"
+STATE_DIR_DEFAULT: Final[str] = ".kokomi_state"
+NOWMSG_STATE_FILENAME: Final[str] = "nowplaying.json"
+JOURNAL_DIRNAME: Final[str] = "queues"          # journal + snapshot de cola por guild
 
 # Rendimiento / escaneo
 MAX_CONC_ENQUEUE: Final[int] = 6
@@ -34,15 +55,47 @@ PROGRESS_EVERY: Final[int] = 200
 PROGRESS_MIN_SECS: Final[float] = 12.0
 ANNOUNCE_DEDUP_SECONDS: Final[int] = 5  # evita spam de “now playing”
 AUTO_DC_IDLE_SECONDS: Final[int] = 180  # desconexión si no hay reproducción/cola
-AUTO_DC_POLL_PERIOD: Final[int] = 30    # cada cuánto chequea el monitor
+NOWMSG_MIN_EDIT_INTERVAL: Final[float] = 2.0  # mensaje fijo: máx. una edición por ventana
+ANNOUNCE_QUEUE_MAX: Final[int] = 8      # anuncios pendientes por guild
+ANNOUNCE_MAX_AGE: Final[float] = 30.0   # anuncios más viejos se descartan sin enviar
+ANNOUNCE_OVERFLOW: Final[str] = "drop_oldest"  # o "drop_new"
+EVENT_SLOW_HANDLER_MS: Final[float] = 50.0  # handlers de eventos de Lavalink más lentos se registran
 AUTO_DC_MESSAGE = "⏹️ Desconectado automáticamente por inactividad (3 min)."
 
+# Mensajes salientes: ritmo por canal (Discord: ~5 mensajes / 5 s por canal)
+OUTBOX_BUCKET_SIZE: Final[int] = 5
+OUTBOX_BUCKET_WINDOW: Final[float] = 5.0
+OUTBOX_MAX_QUEUE: Final[int] = 50       # por canal; al llenarse se descarta progreso viejo
+OUTBOX_RESERVED_SLOTS: Final[int] = 2   # del bucket, solo para respuestas a comandos
+
 # Audio / Player
 VOL_MIN: Final[int] = 0
 VOL_MAX: Final[int] = 100
 PLAYER_INITIAL_VOLUME: Final[int] = 50  # volumen por defecto al crear player
+VOICE_READY_TIMEOUT: Final[float] = 6.0  # espera máx. del handshake de voz al conectar
+
+# Métricas: tiempo hasta el primer audio (TTFA) por comando de reproducción
+TTFA_BUCKETS_MS: Final[tuple[float, ...]] = (100, 250, 500, 1000, 2000, 4000, 8000, 15000)
+TTFA_MAX_SECONDS: Final[float] = 60.0   # comando que no llegó a sonar: se descarta
+
+QUEUE_MAX_LEN: Final[int] = 50_000      # entradas por guild; 0 = sin límite
+QUEUE_MEMORY_BUDGET_MB: Final[int] = 256  # aprox., sumando las colas de todos los guilds; 0 = sin límite
+QUEUE_ENTRY_BYTES: Final[int] = 400     # estimación por entrada compacta (bench queue_mem: ~341 B)
+QUEUE_FULL_ENTRY_BYTES: Final[int] = 1600  # AudioTrack completo en cola (queue_mem sin compactar: ~1475 B)
+QUEUE_CHUNK_SIZE: Final[int] = 512      # bloques de la cola indexada (player.queue)
+# Fuentes cuyo 'encoded' se decodifica localmente sin campos propios de plugin:
+# sus entradas de cola guardan solo encoded + requester (ver playqueue.QueueEntry)
+QUEUE_COMPACT_SOURCES: Final[tuple[str, ...]] = (
+    "local", "http", "youtube", "soundcloud", "bandcamp", "twitch", "vimeo",
+)
+QUEUE_PAGE_SIZE: Final[int] = 15        # entradas por página en /queue
+QUEUE_PAGE_CACHE_MAX: Final[int] = 16   # páginas renderizadas en caché por guild
+QUEUE_VIEW_TIMEOUT: Final[float] = 180.0  # segundos hasta quitar los botones
 
-QUEUE_MAX_LEN: Final[int] = 0           # 0 = sin límite
+# Persistencia de colas (journal por guild, se restaura al iniciar / recargar)
+JOURNAL_FLUSH_SECONDS: Final[float] = 2.0     # escritura en lote de los cambios de cola
+JOURNAL_POSITION_SECONDS: Final[float] = 10.0  # registro periódico de la posición
+JOURNAL_COMPACT_OPS: Final[int] = 2000        # entradas del journal antes de compactar a snapshot
 
 # Estilo / símbolos
 EMBED_COLOR_PRIMARY: Final[int] = 0xF6D4CB
@@ -1,32 +1,74 @@
 from __future__ import annotations
 import asyncio
+import time
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, List, Tuple, cast, Callable, Any
-from .constants import COVER_CAND_NAMES, COVER_EXTS, EMBED_COLOR_PRIMARY
+from typing import TYPE_CHECKING, Optional, Dict, Iterable, List, Tuple, Callable, Any, Awaitable
+from urllib.parse import parse_qs, urlsplit
+from .tags import read_tags_worker, UNKNOWN_ARTIST, UNKNOWN_ALBUM
+from .utils import fmt_duration
+from .constants import (
+    COVER_CAND_NAMES,
+    COVER_EXTS,
+    EMBED_COLOR_PRIMARY,
+    COVER_URL_TTL,
+    COVER_URL_EXPIRY_MARGIN,
+    COVER_URL_CACHE_MAX,
+)
 from io import BytesIO
 import discord
 
-# mutagen es opcional: protege los imports para no romper en entornos sin mutagen
-try:
-    from mutagen.flac import FLAC
-except Exception:  # pragma: no cover
-    FLAC = None  # type: ignore
+if TYPE_CHECKING:
+    from .library import LocalLibrary
+    from .thumbs import CoverStore
 
-try:
-    from mutagen.mp4 import MP4, MP4Cover
-except Exception:  # pragma: no cover
-    MP4 = None  # type: ignore
-    MP4Cover = None  # type: ignore
-
-try:
-    from mutagen.id3 import ID3
-except Exception:  # pragma: no cover
-    ID3 = None  # type: ignore
+# mutagen es opcional y sus formatos pesan (~30 ms de import): se importan en
+# la primera portada extraída, no al cargar el Cog
+@lru_cache(maxsize=None)
+def _mutagen_cover_types() -> Tuple[Any, Any, Any, Any]:
+    """(FLAC, MP4, MP4Cover, ID3); None en los que no se pudieron importar."""
+    try:
+        from mutagen.flac import FLAC
+    except Exception:  # pragma: no cover
+        FLAC = None  # type: ignore
+    try:
+        from mutagen.mp4 import MP4, MP4Cover
+    except Exception:  # pragma: no cover
+        MP4 = None  # type: ignore
+        MP4Cover = None  # type: ignore
+    try:
+        from mutagen.id3 import ID3
+    except Exception:  # pragma: no cover
+        ID3 = None  # type: ignore
+    return FLAC, MP4, MP4Cover, ID3
 
-try:
-    import mutagen
-except Exception:  # pragma: no cover
-    mutagen = None  # type: ignore
+def _rank_cover_candidates(images: Iterable[Path]) -> Tuple[Optional[Path], Dict[str, Path]]:
+    """
+    Clasifica las imágenes de un directorio:
+    - Portada de carpeta: nombre exacto en COVER_CAND_NAMES o, si no hay,
+      nombre que contenga alguna keyword (la primera ordenada en cada caso).
+    - Mapa stem -> imagen, para portadas con el mismo nombre que el track.
+    """
+    exact_hits: List[Path] = []
+    keyword_hits: List[Path] = []
+    by_stem: Dict[str, Path] = {}
+    for f in images:
+        name, ext = f.stem.lower(), f.suffix.lower()
+        if ext not in COVER_EXTS:
+            continue
+        prev = by_stem.get(name)
+        if prev is None or f < prev:
+            by_stem[name] = f
+        if name in COVER_CAND_NAMES:
+            exact_hits.append(f)
+            continue
+        for kw in COVER_CAND_NAMES:
+            if kw in name:
+                keyword_hits.append(f)
+                break
+    folder = min(exact_hits) if exact_hits else (min(keyword_hits) if keyword_hits else None)
+    return folder, by_stem
 
 def _find_cover_in_dir(track_path: Path) -> Optional[Path]:
     """
@@ -34,30 +76,13 @@ def _find_cover_in_dir(track_path: Path) -> Optional[Path]:
     1) Imagen cuyo *stem* sea igual al del track.
     2) Imagen cuyo nombre sea exactamente uno de COVER_CAND_NAMES.
     3) Imagen cuyo nombre contenga alguna keyword de COVER_CAND_NAMES.
-    Devuelve la primera ruta (ordenada) que cumpla.
+    Lista el directorio: usar solo para tracks fuera del índice de LocalLibrary.
     """
-    d = track_path.parent
-    base = track_path.stem.lower()
-    exact_hits: List[Path] = []
-    keyword_hits: List[Path] = []
     try:
-        for f in d.iterdir():
-            if not f.is_file():
-                continue
-            name, ext = f.stem.lower(), f.suffix.lower()
-            if ext not in COVER_EXTS:
-                continue
-            if name == base or name in COVER_CAND_NAMES:
-                exact_hits.append(f.resolve())
-                continue
-            for kw in COVER_CAND_NAMES:
-                if kw in name:
-                    keyword_hits.append(f.resolve())
-                    break
-        if exact_hits:
-            return sorted(exact_hits)[0]
-        if keyword_hits:
-            return sorted(keyword_hits)[0]
+        images = [f.resolve() for f in track_path.parent.iterdir()
+                  if f.suffix.lower() in COVER_EXTS and f.is_file()]
+        folder, by_stem = _rank_cover_candidates(images)
+        return by_stem.get(track_path.stem.lower()) or folder
     except Exception:
         pass
     return None
@@ -68,6 +93,7 @@ def _extract_embedded_cover_bytes(track_path: Path) -> Optional[Tuple[bytes, str
     """
     try:
         suffix = track_path.suffix.lower()
+        FLAC, MP4, MP4Cover, ID3 = _mutagen_cover_types()
         if suffix == ".flac" and FLAC is not None:
             f = FLAC(track_path.as_posix())
             if f.pictures:
@@ -97,38 +123,221 @@ def _extract_embedded_cover_bytes(track_path: Path) -> Optional[Tuple[bytes, str
         pass
     return None
 
-async def build_local_now_embed(track_path: Path) -> Tuple[discord.Embed, Optional[discord.File]]:
+class CoverUrlCache:
     """
-    Construye un embed que muestra la info del track actual
+    URLs de CDN de portadas ya subidas: clave de portada -> (url, vence).
+    Discord firma las URLs de adjuntos con un parámetro `ex` (epoch en hex);
+    cada entrada vence COVER_URL_EXPIRY_MARGIN segundos antes que la firma,
+    o a los COVER_URL_TTL segundos si la URL no la trae.
     """
-    def _read():
-        m_file = cast(Callable[..., Any], getattr(mutagen, "File", None))
-        m = m_file(track_path.as_posix(), easy=True) if m_file else None
-        artist = album = None
-        title = track_path.stem
-        if m:
-            a = m.get("artist");  artist = a[0].strip() if a and a[0].strip() else None
-            al = m.get("album");  album  = al[0].strip() if al and al[0].strip() else None
-            t = m.get("title");   title  = t[0].strip() if t and t[0].strip() else title
-        return title, artist, album
+    def __init__(self, *, ttl: float = COVER_URL_TTL, margin: float = COVER_URL_EXPIRY_MARGIN,
+                 max_entries: int = COVER_URL_CACHE_MAX):
+        self.ttl = ttl
+        self.margin = margin
+        self.max_entries = max_entries
+        self._items: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
 
-    title, artist, album = await asyncio.to_thread(_read)
+    def _expiry(self, url: str) -> float:
+        now_mono, now_wall = time.monotonic(), time.time()
+        try:
+            ex = parse_qs(urlsplit(url).query).get("ex")
+            if ex:
+                return now_mono + (int(ex[0], 16) - now_wall) - self.margin
+        except Exception:
+            pass
+        return now_mono + self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        url, expires = item
+        if time.monotonic() >= expires:
+            del self._items[key]
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return url
+
+    def put(self, key: str, url: str) -> None:
+        expires = self._expiry(url)
+        if expires <= time.monotonic():
+            return
+        self._items[key] = (url, expires)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+def _uploaded_cover_url(msg: Any) -> Optional[str]:
+    """
+    URL de CDN de la portada subida con un mensaje: primero la miniatura del
+    embed (Discord reescribe attachment://...), si no el primer adjunto.
+    """
+    for e in getattr(msg, "embeds", None) or []:
+        url = getattr(getattr(e, "thumbnail", None), "url", None)
+        if isinstance(url, str) and url.startswith("http"):
+            return url
+    for a in getattr(msg, "attachments", None) or []:
+        url = getattr(a, "url", None)
+        if isinstance(url, str) and url.startswith("http"):
+            return url
+    return None
+
+async def build_local_now_embed(
+    track_path: Path,
+    lib: Optional["LocalLibrary"] = None,
+    store: Optional["CoverStore"] = None,
+) -> Tuple[discord.Embed, Optional[discord.File]]:
+    """
+    Construye un embed que muestra la info del track actual.
+    Si el track está en el índice de 'lib', la portada sale de ahí (sin listar
+    el directorio); si no, se busca en disco como antes, fuera del event loop.
+    Con 'store', se adjunta la miniatura cacheada en lugar de la portada original.
+    """
+    embed, cover_file, _key = await prepare_local_now(track_path, lib, store, None)
+    return embed, cover_file
+
+# (embed, archivo de portada o None, clave de portada o None)
+PreparedNow = Tuple[discord.Embed, Optional[discord.File], Optional[str]]
+
+async def send_local_now(
+    send: Callable[..., Awaitable[Any]],
+    track_path: Path,
+    *,
+    lib: Optional["LocalLibrary"] = None,
+    store: Optional["CoverStore"] = None,
+    url_cache: Optional[CoverUrlCache] = None,
+) -> Any:
+    """
+    Envía el embed de "now playing" con send(embed=..., [file=...]).
+    Si la portada ya se subió antes (url_cache), usa su URL de CDN sin re-subirla;
+    si no, la adjunta y guarda la URL que devuelve Discord para la próxima.
+    """
+    prepared = await prepare_local_now(track_path, lib, store, url_cache)
+    return await send_prepared_now(send, prepared, url_cache)
+
+async def send_prepared_now(
+    send: Callable[..., Awaitable[Any]],
+    prepared: PreparedNow,
+    url_cache: Optional[CoverUrlCache] = None,
+) -> Any:
+    """
+    Envía un embed ya preparado. Si mientras tanto la portada se subió en otro
+    mensaje (p.ej. el track anterior del mismo álbum), usa esa URL y no adjunta.
+    """
+    embed, cover_file, key = prepared
+    if cover_file is not None and url_cache is not None and key is not None:
+        url = url_cache.get(key)
+        if url:
+            cover_file.close()
+            embed.set_thumbnail(url=url)
+            cover_file = None
+    if cover_file is None:
+        return await send(embed=embed)
+    msg = await send(embed=embed, file=cover_file)
+    if url_cache is not None and key is not None:
+        url = _uploaded_cover_url(msg)
+        if url:
+            url_cache.put(key, url)
+    return msg
+
+def discard_prepared_now(prepared: Optional[PreparedNow]) -> None:
+    """Libera el archivo de portada de un embed preparado que no se enviará."""
+    if prepared is not None and prepared[1] is not None:
+        prepared[1].close()
+
+async def prepare_local_now(
+    track_path: Path,
+    lib: Optional["LocalLibrary"],
+    store: Optional["CoverStore"],
+    url_cache: Optional[CoverUrlCache],
+) -> PreparedNow:
+    """
+    Arma (embed, archivo de portada o None, clave de portada o None).
+    Si url_cache tiene la portada, el embed apunta a su URL y no hay archivo.
+    """
+    # Metadatos: del índice de la librería si está; si no, se leen con mutagen
+    meta = lib.track_meta(track_path) if lib is not None else None
+    if meta is None:
+        meta = await asyncio.to_thread(read_tags_worker, track_path.as_posix(), False)
+    artist = meta.get("artist")
+    album = meta.get("album")
+    lines = [
+        f"**Artista**: {artist if artist and artist != UNKNOWN_ARTIST else 'Desconocido'}",
+        f"**Álbum**: {album if album and album != UNKNOWN_ALBUM else 'Desconocido'}",
+    ]
+    if meta.get("year"):
+        lines.append(f"**Año**: {meta['year']}")
+    if meta.get("duration"):
+        dur = f"**Duración**: {fmt_duration(meta['duration'])}"
+        if meta.get("bitrate"):
+            dur += f" · {meta['bitrate'] // 1000} kbps"
+        lines.append(dur)
 
     embed = discord.Embed(
-        title=title, colour=EMBED_COLOR_PRIMARY,
-        description=f"**Artista**: {artist or 'Desconocido'}\n**Álbum**: {album or 'Desconocido'}"
+        title=meta.get("title") or track_path.stem, colour=EMBED_COLOR_PRIMARY,
+        description="\n".join(lines)
     )
+
+    indexed = lib.cover_for(track_path) if lib is not None else None
+    if indexed is not None:
+        cover_path, embedded_fmt = indexed
+        try_embedded = embedded_fmt is not None
+    else:
+        cover_path = await asyncio.to_thread(_find_cover_in_dir, track_path)
+        try_embedded = True
+
+    # Clave de la portada para url_cache: la miniatura (por contenido) si hay store,
+    # si no la imagen de carpeta o el propio track (portada incrustada).
+    key: Optional[str] = None
+    thumb: Optional[Path] = None
+    if store is not None and (cover_path is not None or try_embedded):
+        try:
+            thumb = await store.thumb_for(track_path, cover_path, try_embedded)
+        except Exception:
+            thumb = None  # store roto: seguir con la portada original
+        else:
+            if thumb is None and cover_path is None:
+                try_embedded = False  # ya se intentó en el worker: no hay portada
+    if thumb is not None:
+        key = f"thumb:{thumb.stem}"
+    elif cover_path is not None:
+        key = f"file:{cover_path.as_posix()}"
+    elif try_embedded:
+        key = f"embedded:{track_path.as_posix()}"
+
+    if url_cache is not None and key is not None:
+        url = url_cache.get(key)
+        if url:
+            embed.set_thumbnail(url=url)
+            return embed, None, key
+
     cover_file: Optional[discord.File] = None
-    cover_path = _find_cover_in_dir(track_path)
-    if cover_path and cover_path.exists():
+    if thumb is not None:
+        try:
+            cover_file = await asyncio.to_thread(discord.File, thumb.as_posix(), filename=f"cover{thumb.suffix}")
+        except OSError:
+            cover_file = None  # desalojada entre medias
+    if cover_file is None and cover_path is not None:
         filename = f"cover{cover_path.suffix.lower()}"
-        cover_file = discord.File(cover_path.as_posix(), filename=filename)
-        embed.set_thumbnail(url=f"attachment://{filename}")
-    else:
+        try:
+            cover_file = await asyncio.to_thread(discord.File, cover_path.as_posix(), filename=filename)
+        except OSError:
+            cover_file = None
+    if cover_file is None and try_embedded:
         emb = await asyncio.to_thread(_extract_embedded_cover_bytes, track_path)
         if emb is not None:
             data, ext = emb
             filename = f"cover.{ext}"
             cover_file = discord.File(BytesIO(data), filename=filename)
-            embed.set_thumbnail(url=f"attachment://{filename}")
-    return embed, cover_file
\ No newline at end of file
+    if cover_file is None:
+        return embed, None, None
+    embed.set_thumbnail(url=f"attachment://{cover_file.filename}")
+    return embed, cover_file, key
@@ -2,14 +2,18 @@
 from __future__ import annotations
 import asyncio
 from pathlib import Path
-from typing import Any, Awaitable, Callable, Iterable, Optional, Tuple, List
+from typing import Any, Awaitable, Callable, Optional, Sequence, Tuple, List
 from .constants import MAX_CONC_ENQUEUE
+from .guildstate import LocalPaths
+from .permute import LazyShuffle
 from .utils import dprint
 
 # ensure_playing(player, guild_id, first_track) -> Awaitable[None]
 EnsurePlayingCB = Callable[[Any, int, Optional[Any]], Awaitable[None]]
 # progress_cb(done: int, total: int) -> None  (no-async)
 ProgressCB = Callable[[int, int], None]
+# room() -> Optional[int]  entradas que aún admite la cola (None = sin límite)
+RoomCB = Callable[[], Optional[int]]
 
 
 async def enqueue_tracks_from_paths(
@@ -18,72 +22,111 @@ async def enqueue_tracks_from_paths(
     player: Any,
     guild_id: int,
     requester_id: int,
-    paths: Iterable[Path],
-    local_map: dict[str, Path],
+    paths: Sequence[Path],
+    local_paths: LocalPaths,
     ensure_playing: EnsurePlayingCB,
     shuffle: bool = False,
+    seed: Optional[int] = None,
     max_concurrency: int = MAX_CONC_ENQUEUE,
     progress_cb: Optional[ProgressCB] = None,
-    debug_enabled: bool = False ) -> Tuple[int, int]:
+    room: Optional[RoomCB] = None,
+    debug_enabled: bool = False ) -> Tuple[int, int, int]:
     """
     Carga en paralelo y AÑADE AL PLAYER EN EL MISMO ORDEN DE ENTRADA.
 
     Estrategia:
-      - Se lanza carga concurrente (node.get_tracks) con límite de semáforo.
+      - max_concurrency workers toman índices en orden y cargan (node.get_tracks).
+      - Admisión: con room(), nunca hay más cargas exitosas + en vuelo que lugares
+        libres; al llenarse la cola se deja de resolver (no se resuelve para descartar).
       - Se acumulan resultados como (idx, track, path) a medida que llegan.
       - Se ordenan por idx (posición original) y recién ahí se hace player.add(...).
-      - Se actualiza local_map con claves identifier/uri/identifier_local -> Path.
+      - Cada track añadido toma una referencia a su Path en local_paths.
       - Al final, si se añadió al menos uno, ensure_playing(...) con la primera pista añadida.
 
     progress_cb(done, total) se invoca en cada resultado de carga exitosa (antes del add),
     usando 'done' relativo al conjunto pasado en 'paths'.
+    Devuelve (añadidos, fallidos, no admitidos por límite de cola).
+    Con shuffle=True el orden sale de una permutación perezosa (reproducible
+    con 'seed'), sin barajar una copia de la lista.
+    'paths' se indexa tal cual (p. ej. una vista LazyShuffle, sin materializarla);
+    cada ruta se resuelve recién al cargarla.
     """
-    items: List[Path] = [p.resolve() for p in paths]
+    items: Sequence[Path] = paths
     if shuffle:
-        import random
-        random.shuffle(items)
+        items = LazyShuffle(items, seed)
+        dprint(f"[enqueue] shuffle seed={items.seed}", _enabled=debug_enabled)
 
     total = len(items)
     if total == 0:
-        return (0, 0)
+        return (0, 0, 0)
 
-    sem = asyncio.Semaphore(max(1, int(max_concurrency)))
+    def _room() -> Optional[int]:
+        try:
+            return room() if room is not None else None
+        except Exception:
+            return None
+
+    limit = _room()
+    results: List[Tuple[int, Any, Path]] = []
+    done_loads = 0
+    failed = 0
+    next_idx = 0
+    inflight = 0
+    cond = asyncio.Condition()
 
     async def _fetch_one(idx: int, path: Path) -> Optional[Tuple[int, Any, Path]]:
+        path = path.resolve()
         identifier = path.as_posix()
-        async with sem:
-            try:
-                lr = await node.get_tracks(identifier)
-            except Exception as e:
-                dprint(f"[enqueue] fallo get_tracks({identifier}): {e}", _enabled=debug_enabled)
-                return None
+        try:
+            lr = await node.get_tracks(identifier)
+        except Exception as e:
+            dprint(f"[enqueue] fallo get_tracks({identifier}): {e}", _enabled=debug_enabled)
+            return None
         tracks = getattr(lr, "tracks", None) or []
         if not tracks:
             return None
         return (idx, tracks[0], path)
 
-    tasks = [asyncio.create_task(_fetch_one(i, p)) for i, p in enumerate(items)]
-    results: List[Tuple[int, Any, Path]] = []
-    done_loads = 0
-    failed = 0
-
-    # Recogemos a medida que terminan las cargas
-    for coro in asyncio.as_completed(tasks):
-        res = await coro
-        if res is None:
-            failed += 1
-            continue
-        results.append(res)
-        done_loads += 1
-        if progress_cb:
-            try:
-                progress_cb(done_loads, total)
-            except Exception:
-                pass
+    async def _worker() -> None:
+        nonlocal next_idx, inflight, done_loads, failed
+        while True:
+            async with cond:
+                # lleno con lo que está en vuelo: esperar (si algo falla, se libera lugar)
+                while limit is not None and inflight and done_loads + inflight >= limit:
+                    await cond.wait()
+                if next_idx >= total or (limit is not None and done_loads + inflight >= limit):
+                    cond.notify_all()
+                    return
+                idx = next_idx
+                next_idx += 1
+                inflight += 1
+            res = await _fetch_one(idx, items[idx])
+            async with cond:
+                inflight -= 1
+                if res is None:
+                    failed += 1
+                else:
+                    results.append(res)
+                    done_loads += 1
+                    if progress_cb:
+                        try:
+                            progress_cb(done_loads, total)
+                        except Exception:
+                            pass
+                cond.notify_all()
+
+    await asyncio.gather(*(_worker() for _ in range(max(1, min(int(max_concurrency), total)))))
+    skipped = total - next_idx
 
     # Orden estable por índice original
     results.sort(key=lambda t: t[0])
 
+    # Re-chequeo al añadir: otros comandos pudieron encolar mientras tanto
+    limit = _room()
+    if limit is not None and len(results) > limit:
+        skipped += len(results) - limit
+        del results[limit:]
+
     # Ahora, recién añadimos al player en orden
     added = 0
     first_added_track: Optional[Any] = None
@@ -95,16 +138,8 @@ async def enqueue_tracks_from_paths(
             failed += 1
             continue
 
-        # mapear posibles claves -> Path
-        try:
-            ident = getattr(track, "identifier", None)
-            uri = getattr(track, "uri", None)
-            identifier_local = path.as_posix()
-            for key in (ident, uri, identifier_local):
-                if isinstance(key, str):
-                    local_map[key] = path
-        except Exception:
-            local_map[path.as_posix()] = path
+        # track -> Path (una clave por track; se suelta al salir de la cola)
+        local_paths.acquire(track, path)
 
         if first_added_track is None:
             first_added_track = track
@@ -118,4 +153,4 @@ async def enqueue_tracks_from_paths(
         except Exception as e:
             dprint(f"[enqueue] ensure_playing fallo: {e}", _enabled=debug_enabled)
 
-    return (added, failed)
+    return (added, failed, skipped)
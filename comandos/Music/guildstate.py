@@ -0,0 +1,124 @@
+# comandos/Music/guildstate.py
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+def local_key(track: Any) -> Optional[str]:
+    """
+    Clave de un track en el mapa de rutas locales: el 'encoded' (el mismo str
+    que guarda la entrada compacta de la cola, sin decodificar nada); si no
+    hay, identifier/uri.
+    """
+    for attr in ("track", "identifier", "uri"):
+        v = getattr(track, attr, None)
+        if isinstance(v, str) and v:
+            return v
+    return None
+
+
+class LocalPaths:
+    """
+    Rutas de los tracks locales de un guild: una clave por track, con
+    contador de referencias = veces que está en la cola (+1 mientras suena).
+    La entrada se borra cuando el último uso sale de la cola / termina.
+    """
+    __slots__ = ("_paths",)
+
+    def __init__(self):
+        self._paths: Dict[str, Tuple[Path, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def acquire(self, track: Any, path: Path) -> None:
+        key = local_key(track)
+        if key is None:
+            return
+        entry = self._paths.get(key)
+        self._paths[key] = (path, entry[1] + 1 if entry else 1)
+
+    def release(self, track: Any) -> None:
+        key = local_key(track)
+        entry = self._paths.get(key) if key is not None else None
+        if entry is None:
+            return
+        if entry[1] <= 1:
+            del self._paths[key]
+        else:
+            self._paths[key] = (entry[0], entry[1] - 1)
+
+    def release_many(self, tracks: Iterable[Any]) -> None:
+        for t in tracks:
+            self.release(t)
+
+    def retain(self, track: Any) -> None:
+        """Cola vaciada: solo queda (una vez) el track que está sonando, si es local."""
+        key = local_key(track) if track is not None else None
+        entry = self._paths.get(key) if key is not None else None
+        self._paths.clear()
+        if entry is not None:
+            self._paths[key] = (entry[0], 1)
+
+    def get(self, track: Any) -> Optional[Path]:
+        key = local_key(track)
+        entry = self._paths.get(key) if key is not None else None
+        return entry[0] if entry else None
+
+
+class GuildState:
+    """Estado de un guild que vive mientras el bot lo usa (stop/desconexión lo libera)."""
+    __slots__ = ("announce_ch", "last_announced", "last_announced_ts", "paths")
+
+    def __init__(self):
+        self.announce_ch: Optional[int] = None  # canal de anuncios
+        self.last_announced: Optional[str] = None  # dedupe de "now playing"
+        self.last_announced_ts: float = 0.0
+        self.paths = LocalPaths()
+
+
+class GuildStates:
+    """
+    Registro de GuildState por guild. get() crea, peek() no (los eventos que
+    llegan tras un stop no resucitan el estado), release() lo suelta entero.
+    """
+    def __init__(self):
+        self._states: Dict[int, GuildState] = {}
+        self.released = 0
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def get(self, guild_id: int) -> GuildState:
+        st = self._states.get(guild_id)
+        if st is None:
+            st = self._states[guild_id] = GuildState()
+        return st
+
+    def peek(self, guild_id: int) -> Optional[GuildState]:
+        return self._states.get(guild_id)
+
+    def release(self, guild_id: int) -> None:
+        if self._states.pop(guild_id, None) is not None:
+            self.released += 1
+
+    def announce_channel_id(self, guild_id: int) -> Optional[int]:
+        st = self._states.get(guild_id)
+        return st.announce_ch if st else None
+
+    def local_path(self, guild_id: int, track: Any) -> Optional[Path]:
+        st = self._states.get(guild_id)
+        return st.paths.get(track) if st and track is not None else None
+
+    def release_tracks(self, guild_id: int, tracks: Iterable[Any]) -> None:
+        """Tracks que salen de la cola sin sonar (o que terminaron)."""
+        st = self._states.get(guild_id)
+        if st is not None and len(st.paths):
+            st.paths.release_many(tracks)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "guilds": len(self._states),
+            "paths": sum(len(st.paths) for st in self._states.values()),
+            "released": self.released,
+        }
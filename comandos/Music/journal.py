@@ -0,0 +1,346 @@
+# comandos/Music/journal.py
+from __future__ import annotations
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from .constants import JOURNAL_FLUSH_SECONDS, JOURNAL_POSITION_SECONDS, JOURNAL_COMPACT_OPS
+from .utils import dprint
+
+# describe(guild_id) -> dict | None con el estado vivo del guild:
+#   {"queue": Sequence, "current": track | None, "position": int, "paused": bool,
+#    "voice": int | None, "text": int | None}
+DescribeCB = Callable[[int], Optional[Dict[str, Any]]]
+
+_SNAP_SUFFIX = ".snap"
+_LOG_SUFFIX = ".log"
+
+
+def _row(item: Any) -> List[Any]:
+    """Entrada de cola -> [encoded, requester] (lo mínimo para reconstruirla)."""
+    if item is None:
+        return [None, 0]
+    enc = getattr(item, "track", None)
+    try:
+        req = int(getattr(item, "requester", 0) or 0)
+    except Exception:
+        req = 0
+    return [enc if isinstance(enc, str) else None, req]
+
+
+class SavedQueue:
+    """Estado de un guild reconstruido desde snapshot + journal."""
+    __slots__ = ("guild_id", "queue", "current", "position", "paused", "voice_id", "text_id")
+
+    def __init__(self, guild_id: int) -> None:
+        self.guild_id = guild_id
+        self.queue: List[List[Any]] = []
+        self.current: Optional[List[Any]] = None
+        self.position = 0
+        self.paused = False
+        self.voice_id: Optional[int] = None
+        self.text_id: Optional[int] = None
+
+    @property
+    def empty(self) -> bool:
+        return not (self.current and self.current[0]) and not any(r[0] for r in self.queue)
+
+
+class QueueJournal:
+    """
+    Persistencia de colas por guild: journal de solo-anexado + snapshot compactado.
+    - La cola (IndexedQueue) notifica cada cambio a record(); aquí solo se
+      anexa a una lista en memoria (O(1) por player.add).
+    - Cada JOURNAL_FLUSH_SECONDS se escriben en lote, en un hilo, las líneas
+      pendientes de todos los guilds (<gid>.log, JSON por línea).
+    - Mientras algo suena se registra la posición cada JOURNAL_POSITION_SECONDS.
+    - Tras JOURNAL_COMPACT_OPS entradas se escribe un snapshot (<gid>.snap) y el
+      journal vuelve a empezar. Ambos llevan una generación: un journal de otra
+      generación que el snapshot (corte a mitad de compactación) se ignora.
+    """
+    def __init__(
+        self,
+        root: Path,
+        *,
+        describe: DescribeCB,
+        flush_interval: float = JOURNAL_FLUSH_SECONDS,
+        position_interval: float = JOURNAL_POSITION_SECONDS,
+        compact_ops: int = JOURNAL_COMPACT_OPS,
+        debug_enabled: bool = False,
+    ):
+        self.root = root
+        self.describe = describe
+        self.flush_interval = float(flush_interval)
+        self.position_interval = float(position_interval)
+        self.compact_ops = max(1, int(compact_ops))
+        self.debug_enabled = debug_enabled
+        self._pending: Dict[int, List[Tuple[Any, ...]]] = {}
+        self._ops: Dict[int, int] = {}        # entradas en el journal actual
+        self._gen: Dict[int, int] = {}        # generación del snapshot actual
+        self._compact: Set[int] = set()
+        self._drop: Set[int] = set()
+        self._playing: Set[int] = set()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.lines = 0
+        self.snapshots = 0
+
+    # --------------- Registro (loop, O(1)) ---------------
+    def listener(self, guild_id: int) -> Callable[..., None]:
+        """Callback para IndexedQueue.listener: (op, *args)."""
+        return lambda op, *args: self.record(guild_id, op, *args)
+
+    def record(self, guild_id: int, op: str, *args: Any) -> None:
+        if guild_id in self._compact:
+            return  # el próximo flush escribe el estado completo
+        self._pending.setdefault(guild_id, []).append((op,) + args)
+        self._schedule(self.flush_interval)
+
+    def record_current(self, guild_id: int, track: Any, *, voice_id: Optional[int] = None,
+                       text_id: Optional[int] = None) -> None:
+        """Track en reproducción (None al terminar la cola)."""
+        if track is None:
+            self._playing.discard(guild_id)
+        else:
+            self._playing.add(guild_id)
+        self.record(guild_id, "cur", track, voice_id, text_id)
+
+    def reset(self, guild_id: int) -> None:
+        """El próximo flush reemplaza todo lo guardado por el estado actual."""
+        self._pending.pop(guild_id, None)
+        self._compact.add(guild_id)
+        self._schedule(self.flush_interval)
+
+    def forget(self, guild_id: int) -> None:
+        """Borra lo guardado del guild (stop, desconexión)."""
+        self._pending.pop(guild_id, None)
+        self._compact.discard(guild_id)
+        self._playing.discard(guild_id)
+        self._gen.pop(guild_id, None)
+        self._ops.pop(guild_id, None)
+        self._drop.add(guild_id)
+        self._schedule(self.flush_interval)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "guilds": len(self._gen),
+            "pending": sum(len(v) for v in self._pending.values()),
+            "flushes": self.flushes,
+            "lines": self.lines,
+            "snapshots": self.snapshots,
+        }
+
+    # --------------- Lectura ---------------
+    def _paths(self, guild_id: int) -> Tuple[Path, Path]:
+        return self.root / f"{guild_id}{_SNAP_SUFFIX}", self.root / f"{guild_id}{_LOG_SUFFIX}"
+
+    def saved_guilds(self) -> List[int]:
+        out: Set[int] = set()
+        try:
+            for p in self.root.iterdir():
+                if p.suffix in (_SNAP_SUFFIX, _LOG_SUFFIX) and p.stem.isdigit():
+                    out.add(int(p.stem))
+        except FileNotFoundError:
+            pass
+        return sorted(out)
+
+    def load(self, guild_id: int) -> Optional[SavedQueue]:
+        """Snapshot + replay del journal (bloqueante: usar en hilo)."""
+        snap_p, log_p = self._paths(guild_id)
+        saved = SavedQueue(guild_id)
+        gen = 0
+        try:
+            blob = json.loads(snap_p.read_text(encoding="utf-8"))
+            gen = int(blob.get("gen", 0))
+            saved.queue = [list(r) for r in blob.get("queue") or []]
+            saved.current = blob.get("current")
+            saved.position = int(blob.get("position") or 0)
+            saved.paused = bool(blob.get("paused"))
+            saved.voice_id = blob.get("voice")
+            saved.text_id = blob.get("text")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            dprint(f"[journal] snapshot ilegible {snap_p}: {e}", _enabled=self.debug_enabled)
+            return None
+        ops = 0
+        try:
+            with log_p.open("r", encoding="utf-8") as fh:
+                for i, line in enumerate(fh):
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # línea cortada por un cierre abrupto: lo anterior vale
+                    if i == 0:
+                        if entry[:1] != ["gen"] or entry[1] != gen:
+                            break  # journal de otra generación (compactación a medias)
+                        continue
+                    self._replay(saved, entry)
+                    ops += 1
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            dprint(f"[journal] journal ilegible {log_p}: {e}", _enabled=self.debug_enabled)
+        self._gen[guild_id] = gen
+        self._ops[guild_id] = ops
+        return saved
+
+    @staticmethod
+    def _replay(saved: SavedQueue, entry: List[Any]) -> None:
+        op = entry[0]
+        q = saved.queue
+        if op == "a":
+            q.extend(entry[1])
+        elif op == "i":
+            q.insert(entry[1], entry[2])
+        elif op == "s":
+            q[entry[1]] = entry[2]
+        elif op == "d":
+            del q[entry[1]:entry[2]]
+        elif op == "c":
+            q.clear()
+        elif op == "cur":
+            saved.current = entry[1]
+            saved.voice_id = entry[2] or saved.voice_id
+            saved.text_id = entry[3] or saved.text_id
+            saved.position = 0
+            saved.paused = False
+        elif op == "p":
+            saved.position = int(entry[1] or 0)
+            saved.paused = bool(entry[2])
+
+    # --------------- Escritura en lote ---------------
+    def _schedule(self, delay: float) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._task is not None and not self._task.done():
+            return  # el flush en curso re-agenda al terminar
+        when = loop.time() + delay
+        if self._timer is not None:
+            if self._timer.when() <= when:
+                return
+            self._timer.cancel()
+        self._timer = loop.call_at(when, self._start_flush)
+
+    def _start_flush(self) -> None:
+        self._timer = None
+        self._task = asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self) -> None:
+        """Escribe todo lo pendiente (un solo hilo para todos los guilds)."""
+        jobs = self._collect()
+        if jobs:
+            try:
+                await asyncio.to_thread(self._write_jobs, jobs)
+            except Exception as e:
+                dprint(f"[journal] fallo escribiendo: {e}", _enabled=self.debug_enabled)
+            self.flushes += 1
+        if self._pending or self._compact or self._drop:
+            self._task = None
+            self._schedule(self.flush_interval)
+        elif self._playing:
+            self._task = None
+            self._schedule(self.position_interval)
+
+    def _collect(self) -> List[Tuple[str, int, Any]]:
+        """Arma los trabajos en el loop (solo referencias; serializa el hilo)."""
+        jobs: List[Tuple[str, int, Any]] = []
+        jobs.extend(("rm", gid, None) for gid in self._drop)
+        self._drop.clear()
+
+        for gid in self._playing:
+            st = self.describe(gid)
+            if st and st.get("current") is not None:
+                self._pending.setdefault(gid, []).append(("p", int(st.get("position") or 0), bool(st.get("paused"))))
+
+        pending, self._pending = self._pending, {}
+        for gid, ops in pending.items():
+            n = self._ops.get(gid)
+            # sin journal propio aún (o muy largo): se empieza desde un snapshot
+            if n is None or n + len(ops) >= self.compact_ops:
+                self._compact.add(gid)
+            elif gid not in self._compact:
+                self._ops[gid] = n + len(ops)
+                jobs.append(("log", gid, ops))
+
+        for gid in list(self._compact):
+            st = self.describe(gid)
+            if st is None:
+                jobs.append(("rm", gid, None))
+                self._gen.pop(gid, None)
+                self._ops.pop(gid, None)
+                continue
+            gen = self._gen.get(gid, 0) + 1
+            self._gen[gid] = gen
+            self._ops[gid] = 0
+            jobs.append(("snap", gid, {
+                "gen": gen,
+                "queue": list(st.get("queue") or ()),
+                "current": st.get("current"),
+                "position": int(st.get("position") or 0),
+                "paused": bool(st.get("paused")),
+                "voice": st.get("voice"),
+                "text": st.get("text"),
+            }))
+        self._compact.clear()
+        return jobs
+
+    def _write_jobs(self, jobs: List[Tuple[str, int, Any]]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        for kind, gid, data in jobs:
+            snap_p, log_p = self._paths(gid)
+            try:
+                if kind == "rm":
+                    for p in (snap_p, log_p):
+                        p.unlink(missing_ok=True)
+                elif kind == "log":
+                    with log_p.open("a", encoding="utf-8") as fh:
+                        fh.write("".join(json.dumps(self._encode(op)) + "\n" for op in data))
+                    self.lines += len(data)
+                elif kind == "snap":
+                    data["queue"] = [_row(t) for t in data["queue"]]
+                    cur = data["current"]
+                    data["current"] = _row(cur) if cur is not None else None
+                    tmp = snap_p.with_suffix(".tmp")
+                    tmp.write_text(json.dumps(data), encoding="utf-8")
+                    tmp.replace(snap_p)
+                    tmp = log_p.with_suffix(".tmp")
+                    tmp.write_text(json.dumps(["gen", data["gen"]]) + "\n", encoding="utf-8")
+                    tmp.replace(log_p)
+                    self.snapshots += 1
+            except Exception as e:
+                dprint(f"[journal] fallo escribiendo (guild={gid}): {e}", _enabled=self.debug_enabled)
+
+    @staticmethod
+    def _encode(op: Tuple[Any, ...]) -> List[Any]:
+        kind = op[0]
+        if kind == "a":
+            return ["a", [_row(t) for t in op[1]]]
+        if kind in ("i", "s"):
+            return [kind, op[1], _row(op[2])]
+        if kind == "cur":
+            return ["cur", _row(op[1]) if op[1] is not None else None, op[2], op[3]]
+        return list(op)
+
+    async def close(self) -> None:
+        """Flush final (unload): cancela el timer y escribe lo pendiente."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        task = self._task
+        if task is not None and not task.done():
+            try:
+                await task
+            except Exception:
+                pass
+        self._task = asyncio.current_task()
+        try:
+            jobs = self._collect()
+            if jobs:
+                await asyncio.to_thread(self._write_jobs, jobs)
+        except Exception as e:
+            dprint(f"[journal] fallo en flush final: {e}", _enabled=self.debug_enabled)
+        self._playing.clear()
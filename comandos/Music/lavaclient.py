@@ -1,10 +1,10 @@
 from __future__ import annotations
 import os
-from typing import Awaitable, Callable
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 import lavalink
-
-OnTrackStartCB = Callable[[int, object], Awaitable[None]]
-OnQueueEndCB  = Callable[[int], Awaitable[None]]
+from .constants import EVENT_SLOW_HANDLER_MS
+from .utils import dprint
 
 def _env_bool(name: str, default: bool = False) -> bool:
     v = os.getenv(name)
@@ -43,43 +43,158 @@ async def init_lavalink(bot) -> lavalink.Client:
     setattr(bot, "_ll_voice_update", ll.voice_update_handler)
     return ll
 
-def add_event_hooks(ll: lavalink.Client, on_track_start: OnTrackStartCB, on_queue_end: OnQueueEndCB) -> None:
+# handler(event, guild_id | None) -> Awaitable[None]
+EventHandler = Callable[[Any, Optional[int]], Awaitable[None]]
+
+_EVENTS_ATTR = "__lavalink_events__"
+
+
+def on_lavalink_event(*event_classes: type):
     """
-    Registra un solo hook que enruta a los callbacks del Cog.
-    Mantiene compatibilidad con lavalink.py v3/v4 (tipos de eventos).
+    Marca un método del Cog como handler de eventos de Lavalink
+    (como commands.Cog.listener). EventRouter.subscribe_cog() los registra.
+    Acepta cualquier clase de evento, incluida lavalink.Event (todos).
     """
-    async def _hook(event):
-        # Según versión, los eventos pueden venir con nombres/clases distintas.
-        # Usamos duck-typing y getattr para evitar romper en cambios menores.
-        etype = type(event).__name__
-
-        # guild_id: en v4 suele venir en event.player.guild_id (string) o event.player.guild_id int
-        guild_id = None
-        player = getattr(event, "player", None)
-        if player is not None:
-            gid = getattr(player, "guild_id", None)
+    def deco(fn):
+        setattr(fn, _EVENTS_ATTR, tuple(getattr(fn, _EVENTS_ATTR, ())) + tuple(event_classes))
+        return fn
+    return deco
+
+
+def _event_guild_id(event: Any) -> Optional[int]:
+    """guild_id del evento (v4/v5: event.player.guild_id, a veces string)."""
+    player = getattr(event, "player", None)
+    gid = getattr(player, "guild_id", None) if player is not None else None
+    if gid is None:
+        return None
+    try:
+        return int(gid)
+    except Exception:
+        return None
+
+
+class _EventStats:
+    __slots__ = ("count", "handled", "errors", "total_s", "max_s")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.handled = 0
+        self.errors = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+
+
+class EventRouter:
+    """
+    Registro de handlers de eventos de Lavalink indexado por clase de evento.
+    - Un solo hook genérico en el cliente; la lista de handlers de cada clase
+      se resuelve una vez (recorriendo el MRO) y queda en caché.
+    - Cubre todos los eventos: los que no tienen handler igual se cuentan.
+    - Por tipo: cantidad, errores y tiempo de los handlers (total y máximo);
+      los handlers lentos se registran con dprint.
+    """
+    def __init__(self, *, slow_handler_ms: float = EVENT_SLOW_HANDLER_MS, debug_enabled: bool = False):
+        self.slow_handler_s = float(slow_handler_ms) / 1000.0
+        self.debug_enabled = debug_enabled
+        self._handlers: Dict[type, List[EventHandler]] = {}
+        self._resolved: Dict[type, Tuple[EventHandler, ...]] = {}
+        self._stats: Dict[type, _EventStats] = {}
+        self._ll: Optional[lavalink.Client] = None
+
+    # --------------- Registro ---------------
+    def subscribe(self, event_cls: type, handler: EventHandler) -> None:
+        hs = self._handlers.setdefault(event_cls, [])
+        if handler not in hs:
+            hs.append(handler)
+        self._resolved.clear()
+
+    def unsubscribe(self, event_cls: type, handler: EventHandler) -> None:
+        hs = self._handlers.get(event_cls)
+        if hs and handler in hs:
+            hs.remove(handler)
+        self._resolved.clear()
+
+    def subscribe_cog(self, cog: Any) -> int:
+        """Registra los métodos del Cog marcados con @on_lavalink_event. Devuelve cuántos."""
+        n = 0
+        for name in dir(type(cog)):
+            fn = getattr(type(cog), name, None)
+            classes = getattr(fn, _EVENTS_ATTR, None)
+            if not classes:
+                continue
+            bound = getattr(cog, name)
+            for cls in classes:
+                self.subscribe(cls, bound)
+                n += 1
+        return n
+
+    def attach(self, ll: lavalink.Client) -> None:
+        self._ll = ll
+        ll.add_event_hook(self._hook)
+
+    def detach(self) -> None:
+        ll, self._ll = self._ll, None
+        self._handlers.clear()
+        self._resolved.clear()
+        remove = getattr(ll, "remove_event_hooks", None) if ll is not None else None
+        if callable(remove):
             try:
-                guild_id = int(gid) if gid is not None else None
+                remove(hooks=[self._hook])
             except Exception:
                 pass
 
-        # TrackStart
-        if etype.endswith("TrackStartEvent") or etype == "TrackStartEvent":
-            if guild_id is not None:
-                track = getattr(event, "track", None)
-                await on_track_start(guild_id, track)
-            return
+    # --------------- Despacho ---------------
+    def _resolve(self, cls: type) -> Tuple[EventHandler, ...]:
+        hs: List[EventHandler] = []
+        for base in cls.__mro__:
+            for h in self._handlers.get(base, ()):
+                if h not in hs:
+                    hs.append(h)
+        out = tuple(hs)
+        self._resolved[cls] = out
+        return out
 
-        # QueueEnd
-        if etype.endswith("QueueEndEvent") or etype == "QueueEndEvent":
-            if guild_id is not None:
-                await on_queue_end(guild_id)
+    async def _hook(self, event: Any) -> None:
+        cls = type(event)
+        st = self._stats.get(cls)
+        if st is None:
+            st = self._stats[cls] = _EventStats()
+        st.count += 1
+        handlers = self._resolved.get(cls)
+        if handlers is None:
+            handlers = self._resolve(cls)
+        if not handlers:
             return
+        guild_id = _event_guild_id(event)
+        for h in handlers:
+            t0 = time.perf_counter()
+            try:
+                await h(event, guild_id)
+            except Exception as e:
+                st.errors += 1
+                dprint(f"[events] handler {getattr(h, '__name__', h)} falló en {cls.__name__}: {e}",
+                       _enabled=self.debug_enabled)
+            dt = time.perf_counter() - t0
+            st.handled += 1
+            st.total_s += dt
+            if dt > st.max_s:
+                st.max_s = dt
+            if dt >= self.slow_handler_s:
+                dprint(f"[events] handler lento {getattr(h, '__name__', h)} en {cls.__name__}: "
+                       f"{dt * 1000:.1f}ms", _enabled=self.debug_enabled)
 
-        # Otros eventos: ignora silenciosamente
-        return
-
-    ll.add_event_hook(_hook)
+    # --------------- Métricas ---------------
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        out: Dict[str, Dict[str, float]] = {}
+        for cls, st in sorted(self._stats.items(), key=lambda kv: -kv[1].count):
+            out[cls.__name__] = {
+                "count": st.count,
+                "handled": st.handled,
+                "errors": st.errors,
+                "avg_ms": (st.total_s / st.handled * 1000.0) if st.handled else 0.0,
+                "max_ms": st.max_s * 1000.0,
+            }
+        return out
 
 def get_first_node(ll: lavalink.Client):
     """
@@ -1,18 +1,41 @@
 from __future__ import annotations
 import json
+import threading
 import time
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
-from .constants import SUPPORTED_EXTS, CACHE_VERSION, MUSIC_CACHE_FILENAME
-from .utils import file_stat
-from .tags import read_tags_worker
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from .constants import (
+    SUPPORTED_EXTS, COVER_EXTS, CACHE_VERSION, MUSIC_CACHE_FILENAME,
+    LIBRARY_VERIFY_NICE, LIBRARY_VERIFY_YIELD_EVERY, LIBRARY_VERIFY_PAUSE,
+    EXCLUDED_DIR_NAMES, SCAN_FOLLOW_SYMLINKS,
+)
+from .utils import file_stat, state_dir
+from .tags import read_tags_worker, UNKNOWN_ARTIST, UNKNOWN_ALBUM
+from .covers import _rank_cover_candidates
 import os
 
+# Artist -> Album -> [(trackno, Path)]
+LibraryData = Dict[str, Dict[str, List[Tuple[Optional[int], Path]]]]
+# dir -> (portada de carpeta, {stem: imagen})
+RankDir = Callable[[str], Tuple[Optional[Path], Dict[str, Path]]]
+
+
+def _lower_priority() -> None:
+    """Initializer de los workers de la verificación en segundo plano."""
+    try:
+        os.nice(LIBRARY_VERIFY_NICE)
+    except (AttributeError, OSError):
+        pass  # Windows / sin permisos: prioridad normal
+
+
 class LocalLibrary:
     f"""
     Artist -> Album -> [(trackno, Path)]
     Cache JSON en BASE/{MUSIC_CACHE_FILENAME}
+    Índice de portadas por directorio: dir -> {{file, by_stem, embedded}}
+    El índice se reemplaza entero al final de cada escaneo: mientras se
+    escanea (en un hilo) los comandos siguen leyendo el anterior.
     """
     def __init__(self, base: Path, cache_path: Optional[Path] = None):
         """
@@ -21,7 +44,10 @@ class LocalLibrary:
         self.base = base.resolve()
         self.cache_path = (cache_path or (self.base / MUSIC_CACHE_FILENAME)).resolve()
         self.data: Dict[str, Dict[str, List[Tuple[Optional[int], Path]]]] = {}
+        self.covers: Dict[str, Dict[str, Any]] = {}
+        self.meta: Dict[str, Dict[str, Any]] = {}  # path posix -> metadatos del escaneo
         self.last_stats: Dict[str, int] = {"total": 0, "cached": 0, "updated": 0, "removed": 0, "added": 0}
+        self._scan_lock = threading.Lock()
 
     def _load_cache(self) -> Dict[str, Any]:
         """
@@ -44,17 +70,26 @@ class LocalLibrary:
         except Exception:
             return {}
 
-    def _save_cache(self, files: Dict[str, Any]) -> None:
+    def _save_cache(self, files: Dict[str, Any], covers: Dict[str, Dict[str, Any]]) -> None:
         """
         Persiste la caché atomizada (archivo temporal + rename).
-        Guarda version, base, timestamp y el mapa de archivos.
+        Guarda version, base, timestamp, el mapa de archivos y las portadas
+        de carpeta por directorio (para arrancar sin recorrer el disco).
         """
         try:
+            dirs = {
+                d: {
+                    "file": rec["file"].as_posix() if rec["file"] is not None else None,
+                    "by_stem": {s: p.as_posix() for s, p in rec["by_stem"].items()},
+                }
+                for d, rec in covers.items()
+            }
             blob = {
                 "version": CACHE_VERSION, 
                 "base": str(self.base), 
                 "saved_at": int(time.time()), 
-                "files": files
+                "files": files,
+                "dirs": dirs,
                 }
             tmp = self.cache_path.with_suffix(".tmp")
             with tmp.open("w", encoding="utf-8") as f:
@@ -64,22 +99,112 @@ class LocalLibrary:
             pass
 
     def clear(self):
-        self.data.clear()
+        self.data = {}
+        self.covers = {}
+        self.meta = {}
         self.last_stats = {"total": 0, "cached": 0, "updated": 0, "removed": 0, "added": 0}
 
-    def scan(self, force_full: bool = False) -> None:
+    def _build_index(self, files: Dict[str, Any], rank_dir: Optional[RankDir]) -> Tuple[LibraryData, Dict[str, Dict[str, Any]]]:
+        """
+        Arma Artist/Album/Tracks y el índice de portadas desde el mapa de
+        archivos. Sin rank_dir no se indexan portadas (cover_for -> disco).
+        """
+        data: LibraryData = {}
+        covers: Dict[str, Dict[str, Any]] = {}
+        for path_str, meta in files.items():
+            artist = meta.get("artist") or UNKNOWN_ARTIST
+            album = meta.get("album") or UNKNOWN_ALBUM
+            trackno = meta.get("trackno")
+            p = Path(path_str)
+            albums = data.setdefault(artist, {})
+            tracks = albums.setdefault(album, [])
+            tracks.append((trackno if isinstance(trackno, int) else None, p))
+
+            if rank_dir is None:
+                continue
+            d = p.parent.as_posix()
+            rec = covers.get(d)
+            if rec is None:
+                folder, by_stem = rank_dir(d)
+                rec = covers[d] = {"file": folder, "by_stem": by_stem, "embedded": {}}
+            art = meta.get("art")
+            if art:
+                rec["embedded"][p.name] = art
+
+        for _artist, albums in data.items():
+            for _album, items in albums.items():
+                items.sort(key=lambda it: (999999 if it[0] is None else it[0], it[1].name))
+        return data, covers
+
+    def load_cached(self) -> int:
+        """
+        Arranque en caliente: arma el índice solo desde la caché persistida,
+        sin recorrer ni leer los archivos de música (la verificación contra el
+        disco es scan()). No pisa un índice ya construido. Devuelve los temas.
+        """
+        with self._scan_lock:
+            if self.meta:
+                return len(self.meta)
+            cache = self._load_cache()
+            files: Dict[str, Any] = cache.get("files", {}) if cache else {}
+            if not files:
+                return 0
+            saved_dirs = cache.get("dirs")
+            rank_dir: Optional[RankDir] = None
+            if isinstance(saved_dirs, dict):
+                def rank_dir(d: str) -> Tuple[Optional[Path], Dict[str, Path]]:
+                    rec = saved_dirs.get(d) or {}
+                    folder = rec.get("file")
+                    return (Path(folder) if folder else None,
+                            {s: Path(p) for s, p in (rec.get("by_stem") or {}).items()})
+            self.data, self.covers = self._build_index(files, rank_dir)
+            self.meta = files
+            self.last_stats = {"total": len(files), "cached": len(files), "updated": 0, "removed": 0, "added": 0}
+            return len(files)
+
+    def scan(self, force_full: bool = False, low_priority: bool = False) -> None:
         """
         (Re)construye el índice: compara caché vs. disco, lee metadatos
         cuando hay cambios y actualiza la estructura Artist/Album/Tracks.
+        low_priority: verificación de fondo (mitad de workers con nice y
+        pausas cortas al recorrer, para no competir con el bot).
+        """
+        with self._scan_lock:
+            self._scan(force_full, low_priority)
+
+    def _walk_files(self) -> Iterator[Path]:
         """
-        self.clear()
+        Archivos bajo la biblioteca. Poda al bajar las carpetas excluidas
+        (EXCLUDED_DIR_NAMES) y la carpeta de estado del bot si cae dentro,
+        en vez de recorrerlas y descartar después.
+        """
+        skip_names = set(EXCLUDED_DIR_NAMES)
+        skip_paths = {state_dir().as_posix()}
+        for root, dirnames, filenames in os.walk(self.base, followlinks=SCAN_FOLLOW_SYMLINKS):
+            dirnames[:] = [
+                d for d in dirnames
+                if d not in skip_names and Path(root, d).as_posix() not in skip_paths
+            ]
+            for name in filenames:
+                yield Path(root, name)
+
+    def _scan(self, force_full: bool, low_priority: bool) -> None:
         if not self.base.exists():
+            self.clear()
             return
 
         current_files: List[str] = []
-        for f in self.base.rglob("*"):
-            if f.is_file() and f.suffix.lower() in SUPPORTED_EXTS:
-                current_files.append(f.resolve().as_posix())
+        dir_images: Dict[str, List[Path]] = {}
+        for i, f in enumerate(self._walk_files(), 1):
+            if low_priority and i % LIBRARY_VERIFY_YIELD_EVERY == 0:
+                time.sleep(LIBRARY_VERIFY_PAUSE)
+            ext = f.suffix.lower()
+            if ext in SUPPORTED_EXTS:
+                if f.is_file():
+                    current_files.append(f.resolve().as_posix())
+            elif ext in COVER_EXTS and f.is_file():
+                img = f.resolve()
+                dir_images.setdefault(img.parent.as_posix(), []).append(img)
         current_set = set(current_files)
 
         cache = {} if force_full else self._load_cache()
@@ -88,7 +213,9 @@ class LocalLibrary:
         to_add_or_update: List[str] = []
         kept: Dict[str, Any] = {}
         removed_count = 0
-        for path_str, meta in list(cached_files.items()):
+        for i, (path_str, meta) in enumerate(list(cached_files.items()), 1):
+            if low_priority and i % LIBRARY_VERIFY_YIELD_EVERY == 0:
+                time.sleep(LIBRARY_VERIFY_PAUSE)
             if path_str not in current_set:
                 removed_count += 1
                 continue
@@ -108,12 +235,13 @@ class LocalLibrary:
         updated_entries: Dict[str, Any] = {}
         if to_add_or_update:
             max_workers = max(1, os.cpu_count() or 1)
-            with ProcessPoolExecutor(max_workers=max_workers) as pool:
-                futures = [pool.submit(read_tags_worker, p) for p in to_add_or_update]
-                for _p, _fut in zip(to_add_or_update, as_completed(futures)):
-                    pass
-            for p in to_add_or_update:
-                tags = read_tags_worker(p)
+            if low_priority:
+                max_workers = max(1, max_workers // 2)
+            chunk = max(1, len(to_add_or_update) // (max_workers * 4))
+            with ProcessPoolExecutor(max_workers=max_workers,
+                                     initializer=_lower_priority if low_priority else None) as pool:
+                all_tags = list(pool.map(read_tags_worker, to_add_or_update, chunksize=chunk))
+            for p, tags in zip(to_add_or_update, all_tags):
                 size_now, mtime_now = file_stat(p)
                 tags["size"] = size_now
                 tags["mtime"] = mtime_now
@@ -123,26 +251,40 @@ class LocalLibrary:
         merged.update(kept)
         merged.update(updated_entries)
 
-        for path_str, meta in merged.items():
-            artist = meta.get("artist") or "Unknown Artist"
-            album = meta.get("album") or "Unknown Album"
-            trackno = meta.get("trackno")
-            p = Path(path_str)
-            albums = self.data.setdefault(artist, {})
-            tracks = albums.setdefault(album, [])
-            tracks.append((trackno if isinstance(trackno, int) else None, p))
-
-        for _artist, albums in self.data.items():
-            for _album, items in albums.items():
-                items.sort(key=lambda it: (999999 if it[0] is None else it[0], it[1].name))
+        data, covers = self._build_index(merged, lambda d: _rank_cover_candidates(dir_images.get(d, ())))
+        # Reemplazo de una vez: los lectores ven el índice viejo o el nuevo
+        self.data, self.covers, self.meta = data, covers, merged
 
-        self._save_cache(merged)
+        self._save_cache(merged, covers)
         self.last_stats = {
             "total": len(current_files), "cached": len(kept),
             "updated": len(to_add_or_update), "removed": removed_count,
             "added": len(added_files)
         }
 
+    def track_meta(self, track: Path) -> Optional[Dict[str, Any]]:
+        """
+        Metadatos indexados de un track (los de read_tags_worker + size/mtime),
+        o None si está fuera del índice. No toca disco.
+        """
+        return self.meta.get(track.as_posix())
+
+    def cover_for(self, track: Path) -> Optional[Tuple[Optional[Path], Optional[str]]]:
+        """
+        Portada indexada para un track, sin tocar disco:
+          - None: el directorio no está en el índice (buscar en disco).
+          - (Path, None): imagen en la carpeta (por stem o portada de carpeta).
+          - (None, "png"/"jpg"): solo portada incrustada, con su formato.
+          - (None, None): el track no tiene portada.
+        """
+        rec = self.covers.get(track.parent.as_posix())
+        if rec is None:
+            return None
+        img = rec["by_stem"].get(track.stem.lower()) or rec["file"]
+        if img is not None:
+            return img, None
+        return None, rec["embedded"].get(track.name)
+
     def artists(self) -> List[str]:
         return sorted(self.data.keys(), key=lambda s: s.lower())
 
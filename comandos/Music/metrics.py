@@ -0,0 +1,94 @@
+# comandos/Music/metrics.py
+from __future__ import annotations
+import bisect
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from .constants import TTFA_BUCKETS_MS, TTFA_MAX_SECONDS
+from .utils import dprint
+
+
+class LatencyHistogram:
+    """
+    Histograma de latencias con buckets fijos (ms, límite superior inclusivo)
+    más un bucket de desborde. Memoria constante; percentiles aproximados
+    por el límite del bucket.
+    """
+    __slots__ = ("bounds", "counts", "count", "total_ms", "max_ms")
+
+    def __init__(self, bounds_ms: Sequence[float] = TTFA_BUCKETS_MS):
+        self.bounds: Tuple[float, ...] = tuple(sorted(bounds_ms))
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= rank and c:
+                return self.bounds[i] if i < len(self.bounds) else self.max_ms
+        return self.max_ms
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avg_ms": (self.total_ms / self.count) if self.count else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p90_ms": self.percentile(0.90),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_ms,
+        }
+
+    def buckets(self) -> List[Tuple[str, int]]:
+        labels = [f"≤{b:g}ms" for b in self.bounds] + [f">{self.bounds[-1]:g}ms" if self.bounds else "all"]
+        return list(zip(labels, self.counts))
+
+
+class FirstAudioTracker:
+    """
+    Tiempo hasta el primer audio (TTFA) por comando:
+    start() al invocar un comando de reproducción con el guild en silencio,
+    track_started() en el TrackStart siguiente de ese guild. Lo pendiente
+    por más de 'max_age' (el comando no llegó a reproducir) se descarta.
+    """
+    def __init__(self, *, max_age: float = TTFA_MAX_SECONDS, debug_enabled: bool = False):
+        self.max_age = float(max_age)
+        self.debug_enabled = debug_enabled
+        self._pending: Dict[int, Tuple[str, float]] = {}
+        self.histograms: Dict[str, LatencyHistogram] = {}
+
+    def start(self, guild_id: int, command: str) -> None:
+        self._pending[guild_id] = (command, time.monotonic())
+
+    def cancel(self, guild_id: int) -> None:
+        self._pending.pop(guild_id, None)
+
+    def track_started(self, guild_id: int) -> Optional[float]:
+        item = self._pending.pop(guild_id, None)
+        if item is None:
+            return None
+        command, t0 = item
+        dt = time.monotonic() - t0
+        if dt > self.max_age:
+            return None
+        ms = dt * 1000.0
+        h = self.histograms.get(command)
+        if h is None:
+            h = self.histograms[command] = LatencyHistogram()
+        h.observe(ms)
+        dprint(f"[ttfa] {command} (guild={guild_id}): {ms:.0f}ms", _enabled=self.debug_enabled)
+        return ms
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {cmd: h.summary() for cmd, h in sorted(self.histograms.items())}
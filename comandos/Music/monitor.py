@@ -1,110 +1,114 @@
 # comandos/Music/monitor.py
 from __future__ import annotations
 import asyncio
-import time
-from typing import Any, Callable, Iterable
+from typing import Any, Awaitable, Callable, Dict, Optional
 from .constants import (
     AUTO_DC_IDLE_SECONDS,
-    AUTO_DC_POLL_PERIOD,
     AUTO_DC_MESSAGE,
 )
 from .utils import dprint
 
 
 # Tipos de callback que se inyectan desde el Cog:
-# - get_all_players(): Iterable[Any]          -> retorna todos los players activos de lavalink
+# - is_idle(guild_id:int) -> bool             -> re-verificación al vencer (sin reproducción ni cola)
+# - disconnect(guild_id:int) -> Awaitable     -> detiene el player y sale del canal de voz
 # - get_announce_channel(guild_id:int) -> Optional[discord.abc.Messageable]
-GetPlayersCB = Callable[[], Iterable[Any]]
+# - send_message(channel, text) -> None       (no bloquea; lo encola el outbox del Cog)
+IsIdleCB = Callable[[int], bool]
+DisconnectCB = Callable[[int], Awaitable[None]]
 GetAnnounceCB = Callable[[int], Any]  # retorna canal o None
+SendCB = Callable[[Any, str], Any]
 
 
-async def _auto_disconnect_monitor_loop(
-    *,
-    get_all_players: GetPlayersCB,
-    get_announce_channel: GetAnnounceCB,
-    idle_seconds: int = AUTO_DC_IDLE_SECONDS,
-    poll_period: int = AUTO_DC_POLL_PERIOD,
-    debug_enabled: bool = False ) -> None:
+class IdleDisconnector:
     """
-    Bucle principal del monitor:
-      - Recorre periódicamente todos los players (guilds).
-      - Si un player NO está reproduciendo, NO tiene cola y está conectado,
-        espera 'idle_seconds' acumulados y desconecta.
-      - Envía AUTO_DC_MESSAGE al canal de anuncios si existe.
+    Auto-desconexión por inactividad, dirigida por eventos (sin polling):
+      - mark_idle(): al quedar sin reproducción (QueueEnd, stop, conexión sin
+        tema) agenda un vencimiento con loop.call_at a 'idle_seconds'.
+      - mark_active(): al arrancar un track cancela el vencimiento.
+      - Al vencer re-verifica ese guild, envía AUTO_DC_MESSAGE al canal de
+        anuncios (si existe) y desconecta.
+    Costo O(1) por cambio de estado (el heap de timers es el del event loop)
+    y la desconexión ocurre a tiempo, no hasta un período de polling tarde.
     """
-    # Mapa para acumular tiempo de inactividad por guild
-    idle_since: dict[int, float] = {}
+    def __init__(
+        self,
+        *,
+        is_idle: IsIdleCB,
+        disconnect: DisconnectCB,
+        get_announce_channel: GetAnnounceCB,
+        send_message: Optional[SendCB] = None,
+        idle_seconds: float = AUTO_DC_IDLE_SECONDS,
+        debug_enabled: bool = False,
+    ):
+        self.is_idle = is_idle
+        self.disconnect = disconnect
+        self.get_announce_channel = get_announce_channel
+        self.send_message = send_message
+        self.idle_seconds = float(idle_seconds)
+        self.debug_enabled = debug_enabled
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self.fired = 0
 
-    while True:
-        try:
-            now = time.monotonic()
-            for player in list(get_all_players() or []):
-                # Obtención de datos mínimos, con duck-typing
-                gid = getattr(player, "guild_id", None)
-                if gid is None:
-                    continue
+    # --------------- API ---------------
+    def mark_idle(self, guild_id: int) -> None:
+        """Agenda la desconexión si aún no hay un vencimiento pendiente."""
+        if guild_id in self._timers:
+            return
+        loop = asyncio.get_running_loop()
+        self._timers[guild_id] = loop.call_at(loop.time() + self.idle_seconds, self._fire, guild_id)
 
-                # Estados del player
-                is_playing = bool(getattr(player, "is_playing", False))
-                current = getattr(player, "current", None)
-                queue = getattr(player, "queue", None) or []
-                connected = bool(getattr(player, "channel_id", None))
+    def mark_active(self, guild_id: int) -> None:
+        h = self._timers.pop(guild_id, None)
+        if h is not None:
+            h.cancel()
 
-                # Condición de "inactivo": sin reproducción actual y sin cola
-                inactive = (not is_playing) and (current is None) and (len(queue) == 0) and connected
+    forget = mark_active
 
-                if inactive:
-                    # comenzar/incrementar contador de inactividad
-                    if gid not in idle_since:
-                        idle_since[gid] = now
-                    # si excede el umbral -> desconectar
-                    if (now - idle_since[gid]) >= idle_seconds:
-                        # intentar obtener el canal de anuncios
-                        ch = get_announce_channel(int(gid))
-                        if ch is not None and AUTO_DC_MESSAGE:
-                            try:
-                                await ch.send(AUTO_DC_MESSAGE)
-                            except Exception:
-                                pass
-                        # desconectar del canal de voz (vía player)
-                        try:
-                            await player.disconnect()
-                        except Exception as e:
-                            dprint(f"[monitor] disconnect fallo (guild={gid}): {e}", _enabled=debug_enabled)
-                        # limpiar contador para ese guild
-                        idle_since.pop(gid, None)
-                else:
-                    # si vuelve actividad, resetea el contador
-                    if gid in idle_since:
-                        idle_since.pop(gid, None)
+    def deadline(self, guild_id: int) -> Optional[float]:
+        """Instante (reloj del loop) en que se desconectaría el guild, o None."""
+        h = self._timers.get(guild_id)
+        return h.when() if h is not None else None
 
-        except asyncio.CancelledError:
-            # Finalización ordenada del task
-            raise
-        except Exception as e:
-            dprint(f"[monitor] excepción en loop: {e}", _enabled=debug_enabled)
+    def pending(self) -> int:
+        return len(self._timers)
 
-        await asyncio.sleep(max(1, int(poll_period)))
+    def close(self) -> None:
+        for h in self._timers.values():
+            h.cancel()
+        self._timers.clear()
+        for t in self._tasks.values():
+            t.cancel()
+        self._tasks.clear()
 
+    # --------------- Internos ---------------
+    def _fire(self, guild_id: int) -> None:
+        self._timers.pop(guild_id, None)
+        try:
+            if not self.is_idle(guild_id):
+                return
+        except Exception as e:
+            dprint(f"[monitor] no se pudo verificar inactividad (guild={guild_id}): {e}", _enabled=self.debug_enabled)
+            return
+        task = asyncio.get_running_loop().create_task(self._disconnect(guild_id))
+        self._tasks[guild_id] = task
+        task.add_done_callback(lambda _t, g=guild_id: self._tasks.pop(g, None))
 
-def start_monitor(
-    *,
-    loop: asyncio.AbstractEventLoop,
-    get_all_players: GetPlayersCB,
-    get_announce_channel: GetAnnounceCB,
-    idle_seconds: int = AUTO_DC_IDLE_SECONDS,
-    poll_period: int = AUTO_DC_POLL_PERIOD,
-    debug_enabled: bool = False ) -> asyncio.Task:
-    """
-    Arranca el task del monitor y devuelve el handle (asyncio.Task).
-    El caller (Cog) debe conservar este handle para cancelarlo en cog_unload().
-    """
-    return loop.create_task(
-        _auto_disconnect_monitor_loop(
-            get_all_players=get_all_players,
-            get_announce_channel=get_announce_channel,
-            idle_seconds=idle_seconds,
-            poll_period=poll_period,
-            debug_enabled=debug_enabled,
-        )
-    )
\ No newline at end of file
+    async def _disconnect(self, guild_id: int) -> None:
+        self.fired += 1
+        # intentar obtener el canal de anuncios
+        ch = self.get_announce_channel(int(guild_id))
+        if ch is not None and AUTO_DC_MESSAGE:
+            try:
+                if self.send_message is not None:
+                    self.send_message(ch, AUTO_DC_MESSAGE)
+                else:
+                    await ch.send(AUTO_DC_MESSAGE)
+            except Exception:
+                pass
+        # desconectar del canal de voz
+        try:
+            await self.disconnect(guild_id)
+        except Exception as e:
+            dprint(f"[monitor] disconnect fallo (guild={guild_id}): {e}", _enabled=self.debug_enabled)
@@ -0,0 +1,188 @@
+# comandos/Music/nowmsg.py
+from __future__ import annotations
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+import discord
+from .constants import NOWMSG_MIN_EDIT_INTERVAL
+from .covers import CoverUrlCache, PreparedNow, discard_prepared_now, _uploaded_cover_url
+from .outbox import Outbox
+from .utils import dprint
+
+
+class _GuildBoard:
+    __slots__ = ("channel_id", "message_id", "last_edit", "pending", "task")
+
+    def __init__(self) -> None:
+        self.channel_id: Optional[int] = None
+        self.message_id: Optional[int] = None
+        self.last_edit: float = 0.0
+        self.pending: Optional[tuple] = None  # (canal, prepared | None, content | None)
+        self.task: Optional[asyncio.Task] = None
+
+
+class NowPlayingBoard:
+    """
+    Modo opcional de "now playing" fijo: un solo mensaje por guild que se edita
+    en cada TrackStart en lugar de enviar uno nuevo.
+    - Las actualizaciones se coalescen: durante la ventana de rate-limit solo
+      queda la última, y se aplica a lo sumo una edición por ventana.
+    - Los guilds activados y el ID de cada mensaje se guardan en disco
+      (sobreviven reconexiones, reload y reinicios).
+    """
+    def __init__(self, state_path: Path, *, url_cache: Optional[CoverUrlCache] = None,
+                 outbox: Optional[Outbox] = None,
+                 min_interval: float = NOWMSG_MIN_EDIT_INTERVAL, debug_enabled: bool = False):
+        self.state_path = state_path
+        self.url_cache = url_cache
+        self.outbox = outbox
+        self.min_interval = min_interval
+        self.debug_enabled = debug_enabled
+        self._enabled: Set[int] = set()
+        self._boards: Dict[int, _GuildBoard] = {}
+        self.edits = 0
+        self.sends = 0
+        self.coalesced = 0
+
+    # --------------- Persistencia ---------------
+    def load(self) -> None:
+        """Carga guilds activados e IDs de mensaje (silencioso si no hay archivo)."""
+        try:
+            blob = json.loads(self.state_path.read_text(encoding="utf-8"))
+            for gid_s, st in (blob.get("guilds") or {}).items():
+                gid = int(gid_s)
+                if st.get("enabled"):
+                    self._enabled.add(gid)
+                b = self._boards.setdefault(gid, _GuildBoard())
+                b.channel_id = st.get("channel_id")
+                b.message_id = st.get("message_id")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            dprint(f"[nowmsg] estado ilegible {self.state_path}: {e}", _enabled=self.debug_enabled)
+
+    def _snapshot(self) -> Dict[str, Any]:
+        guilds: Dict[str, Any] = {}
+        for gid in self._enabled | set(self._boards):
+            b = self._boards.get(gid)
+            guilds[str(gid)] = {
+                "enabled": gid in self._enabled,
+                "channel_id": b.channel_id if b else None,
+                "message_id": b.message_id if b else None,
+            }
+        return {"guilds": guilds}
+
+    def _write(self, blob: Dict[str, Any]) -> None:
+        try:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.state_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(blob), encoding="utf-8")
+            tmp.replace(self.state_path)
+        except Exception as e:
+            dprint(f"[nowmsg] no se pudo guardar estado: {e}", _enabled=self.debug_enabled)
+
+    async def _save(self) -> None:
+        await asyncio.to_thread(self._write, self._snapshot())
+
+    # --------------- API ---------------
+    def enabled(self, guild_id: int) -> bool:
+        return guild_id in self._enabled
+
+    async def set_enabled(self, guild_id: int, on: bool) -> None:
+        if on:
+            self._enabled.add(guild_id)
+        else:
+            self._enabled.discard(guild_id)
+            self._drop_pending(self._boards.pop(guild_id, None))
+        await self._save()
+
+    def update(self, guild_id: int, channel: Any, *, prepared: Optional[PreparedNow] = None,
+               content: Optional[str] = None) -> None:
+        """
+        Encola el nuevo contenido del mensaje fijo (embed preparado o texto).
+        Reemplaza cualquier actualización aún no aplicada.
+        """
+        b = self._boards.setdefault(guild_id, _GuildBoard())
+        if b.pending is not None:
+            self.coalesced += 1
+            discard_prepared_now(b.pending[1])
+        b.pending = (channel, prepared, content)
+        if b.task is None or b.task.done():
+            b.task = asyncio.get_running_loop().create_task(self._flush(guild_id, b))
+
+    def forget(self, guild_id: int) -> None:
+        """Descarta lo pendiente del guild (el mensaje fijo se conserva)."""
+        self._drop_pending(self._boards.get(guild_id))
+
+    def close(self) -> None:
+        for b in self._boards.values():
+            self._drop_pending(b)
+
+    # --------------- Internos ---------------
+    @staticmethod
+    def _drop_pending(b: Optional[_GuildBoard]) -> None:
+        if b is None:
+            return
+        if b.task is not None and not b.task.done():
+            b.task.cancel()
+        if b.pending is not None:
+            discard_prepared_now(b.pending[1])
+            b.pending = None
+
+    async def _flush(self, guild_id: int, b: _GuildBoard) -> None:
+        while b.pending is not None:
+            wait = b.last_edit + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            channel, prepared, content = b.pending
+            b.pending = None
+            b.last_edit = time.monotonic()
+            try:
+                await self._apply(guild_id, b, channel, prepared, content)
+            except Exception as e:
+                dprint(f"[nowmsg] fallo actualizando (guild={guild_id}): {e}", _enabled=self.debug_enabled)
+
+    async def _out(self, channel_id: Any, factory: Callable[[], Awaitable[Any]], *, edit: bool = False) -> Any:
+        if self.outbox is None or channel_id is None:
+            return await factory()
+        return await self.outbox.submit(channel_id, factory, edit=edit)
+
+    async def _apply(self, guild_id: int, b: _GuildBoard, channel: Any,
+                     prepared: Optional[PreparedNow], content: Optional[str]) -> None:
+        embed, cover_file, key = prepared if prepared is not None else (None, None, None)
+        if cover_file is not None and self.url_cache is not None and key is not None:
+            url = self.url_cache.get(key)
+            if url and embed is not None:
+                cover_file.close()
+                embed.set_thumbnail(url=url)
+                cover_file = None
+
+        msg = None
+        cid = getattr(channel, "id", None)
+        if b.message_id is not None and b.channel_id == cid:
+            try:
+                partial = channel.get_partial_message(b.message_id)
+                msg = await self._out(cid, lambda: partial.edit(
+                    content=content, embed=embed,
+                    attachments=[cover_file] if cover_file is not None else [],
+                ), edit=True)
+                self.edits += 1
+            except (discord.NotFound, discord.Forbidden):
+                msg = None  # borrado o sin acceso: se envía uno nuevo
+                if cover_file is not None:
+                    cover_file.reset()
+        if msg is None:
+            kwargs: Dict[str, Any] = {"content": content, "embed": embed}
+            if cover_file is not None:
+                kwargs["file"] = cover_file
+            msg = await self._out(cid, lambda: channel.send(**kwargs))
+            self.sends += 1
+            b.channel_id, b.message_id = cid, getattr(msg, "id", None)
+            await self._save()
+
+        if cover_file is not None and self.url_cache is not None and key is not None:
+            url = _uploaded_cover_url(msg)
+            if url:
+                self.url_cache.put(key, url)
@@ -0,0 +1,281 @@
+# comandos/Music/outbox.py
+from __future__ import annotations
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+import discord
+from .constants import OUTBOX_BUCKET_SIZE, OUTBOX_BUCKET_WINDOW, OUTBOX_MAX_QUEUE, OUTBOX_RESERVED_SLOTS
+from .utils import dprint
+
+# factory() -> Awaitable  (p. ej. lambda: channel.send(...)); se invoca recién al ejecutarse
+JobFactory = Callable[[], Awaitable[Any]]
+
+
+class _Job:
+    __slots__ = ("factory", "key", "droppable", "waiters", "lane")
+
+    def __init__(self, factory: JobFactory, key: Optional[Hashable], droppable: bool, lane: "_Lane") -> None:
+        self.factory = factory
+        self.key = key
+        self.droppable = droppable
+        self.waiters: List[asyncio.Future] = []
+        self.lane = lane
+
+
+class _Lane:
+    """
+    Carril de un tipo de operación (envíos u ediciones) de un canal: Discord
+    los limita en buckets distintos, así que cada uno lleva su ritmo y su
+    worker. 'urgent' (respuestas a comandos) se sirve antes que 'jobs'.
+    """
+    __slots__ = ("urgent", "jobs", "stamps", "blocked_until", "task", "wake")
+
+    def __init__(self, size: int) -> None:
+        self.urgent: Deque[_Job] = deque()
+        self.jobs: Deque[_Job] = deque()
+        self.stamps: Deque[float] = deque(maxlen=max(1, size))  # últimas operaciones
+        self.blocked_until: float = 0.0                          # tras un 429
+        self.task: Optional[asyncio.Task] = None
+        self.wake = asyncio.Event()  # llegó un trabajo urgente mientras se espera turno
+
+    def __len__(self) -> int:
+        return len(self.urgent) + len(self.jobs)
+
+    def idle(self) -> bool:
+        return not self.urgent and not self.jobs and (self.task is None or self.task.done())
+
+
+class _ChannelQueue:
+    __slots__ = ("send", "edit", "keyed")
+
+    def __init__(self, size: int) -> None:
+        self.send = _Lane(size)
+        self.edit = _Lane(size)
+        self.keyed: Dict[Hashable, _Job] = {}
+
+    def __len__(self) -> int:
+        return len(self.send) + len(self.edit)
+
+
+class Outbox:
+    """
+    Scheduler de mensajes salientes (envíos y ediciones), con una cola por canal.
+    - submit(): encola la operación y devuelve un Future con su resultado
+      (normalmente el discord.Message). post() es la variante sin esperar.
+    - key: si ya hay una operación pendiente con la misma clave (p. ej. la
+      edición del mismo mensaje de progreso), se reemplaza en su lugar de la
+      cola: gana la última y todos los que esperaban reciben ese resultado.
+    - edit: envíos y ediciones van por carriles separados, como los buckets
+      de Discord (una tanda de ediciones no retrasa un envío, ni al revés).
+    - priority: las respuestas a comandos se sirven antes que anuncios y
+      progreso ya encolados en su carril y no esperan turno en la ventana
+      (solo las frena un 429 real; discord.py ya respeta los headers de rate
+      limit). Anuncios y progreso dejan 'reserved' huecos del bucket libres
+      para ellas.
+    - Ritmo: a lo sumo 'bucket_size' - 'reserved' operaciones no urgentes por
+      'bucket_window' segundos, por canal y carril; ante un 429 se respeta
+      retry_after y se reintenta una vez.
+    - Cola acotada por canal: al llenarse se descarta la operación descartable
+      más antigua (progreso); las respuestas a comandos nunca se descartan.
+    """
+    def __init__(self, *, bucket_size: int = OUTBOX_BUCKET_SIZE,
+                 bucket_window: float = OUTBOX_BUCKET_WINDOW,
+                 max_queue: int = OUTBOX_MAX_QUEUE, reserved: int = OUTBOX_RESERVED_SLOTS,
+                 debug_enabled: bool = False):
+        self.bucket_size = max(1, int(bucket_size))
+        self.reserved = min(max(0, int(reserved)), self.bucket_size - 1)
+        self.bucket_window = float(bucket_window)
+        self.max_queue = max(1, int(max_queue))
+        self.debug_enabled = debug_enabled
+        self._channels: Dict[int, _ChannelQueue] = {}
+        self.submitted = 0
+        self.completed = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.prioritized = 0
+        self.peak_depth = 0  # mayor cola vista en un canal
+
+    # --------------- API ---------------
+    def submit(self, channel_id: int, factory: JobFactory, *, key: Optional[Hashable] = None,
+               droppable: bool = False, edit: bool = False, priority: bool = False) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self.submitted += 1
+        q = self._channels.get(channel_id)
+        if q is None:
+            q = self._channels[channel_id] = _ChannelQueue(self.bucket_size)
+
+        job = q.keyed.get(key) if key is not None else None
+        if job is not None:
+            # Reemplazo en el lugar: conserva la posición (y el carril) en la cola
+            job.factory = factory
+            job.droppable = job.droppable and droppable
+            job.waiters.append(fut)
+            self.coalesced += 1
+            lane = job.lane
+            if priority and job in lane.jobs:
+                # Pasa a ser respuesta a un comando (p. ej. el texto final del progreso)
+                lane.jobs.remove(job)
+                lane.urgent.append(job)
+                lane.wake.set()
+                self.prioritized += 1
+        else:
+            if len(q) >= self.max_queue and not self._make_room(q) and droppable:
+                self.dropped += 1
+                fut.set_result(None)
+                return fut
+            lane = q.edit if edit else q.send
+            job = _Job(factory, key, droppable, lane)
+            job.waiters.append(fut)
+            if priority:
+                lane.urgent.append(job)
+                lane.wake.set()
+                self.prioritized += 1
+            else:
+                lane.jobs.append(job)
+            if key is not None:
+                q.keyed[key] = job
+            if len(q) > self.peak_depth:
+                self.peak_depth = len(q)
+
+        if lane.task is None or lane.task.done():
+            lane.task = loop.create_task(self._drain(channel_id, q, lane))
+        return fut
+
+    def post(self, channel_id: int, factory: JobFactory, *, key: Optional[Hashable] = None,
+             droppable: bool = False, edit: bool = False, priority: bool = False) -> None:
+        """Como submit(), sin esperar: los errores solo se registran."""
+        fut = self.submit(channel_id, factory, key=key, droppable=droppable, edit=edit, priority=priority)
+        fut.add_done_callback(self._log_failure)
+
+    def depth(self, channel_id: Optional[int] = None) -> int:
+        if channel_id is not None:
+            q = self._channels.get(channel_id)
+            return len(q) if q else 0
+        return sum(len(q) for q in self._channels.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "depth": self.depth(),
+            "peak_depth": self.peak_depth,
+            "channels": len(self._channels),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "prioritized": self.prioritized,
+        }
+
+    def close(self) -> None:
+        """Cancela los workers y resuelve lo pendiente con None."""
+        for q in self._channels.values():
+            for lane in (q.send, q.edit):
+                if lane.task is not None and not lane.task.done():
+                    lane.task.cancel()
+                for jobs in (lane.urgent, lane.jobs):
+                    while jobs:
+                        self._resolve(jobs.popleft(), None)
+            q.keyed.clear()
+        self._channels.clear()
+
+    # --------------- Internos ---------------
+    def _make_room(self, q: _ChannelQueue) -> bool:
+        for job in (*q.send.jobs, *q.edit.jobs):
+            if job.droppable:
+                job.lane.jobs.remove(job)
+                if job.key is not None:
+                    q.keyed.pop(job.key, None)
+                self.dropped += 1
+                self._resolve(job, None)
+                return True
+        return False
+
+    @staticmethod
+    def _resolve(job: _Job, result: Any = None, exc: Optional[BaseException] = None) -> None:
+        for fut in job.waiters:
+            if fut.done():
+                continue
+            if exc is not None:
+                fut.set_exception(exc)
+            else:
+                fut.set_result(result)
+
+    def _log_failure(self, fut: asyncio.Future) -> None:
+        if fut.cancelled():
+            return
+        e = fut.exception()
+        if e is not None:
+            dprint(f"[outbox] envío fallido: {e}", _enabled=self.debug_enabled)
+
+    async def _wait_slot(self, lane: _Lane) -> None:
+        while True:
+            # Un urgente solo espera un 429; el resto deja libres los huecos reservados
+            limit = self.bucket_size - self.reserved
+            now = time.monotonic()
+            wait = lane.blocked_until - now
+            if not lane.urgent and len(lane.stamps) >= limit:
+                wait = max(wait, lane.stamps[-limit] + self.bucket_window - now)
+            if wait <= 0:
+                return
+            lane.wake.clear()
+            try:
+                await asyncio.wait_for(lane.wake.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _drain(self, channel_id: int, q: _ChannelQueue, lane: _Lane) -> None:
+        try:
+            while lane:
+                # Se espera el turno ANTES de sacar el trabajo: mientras tanto
+                # puede seguir reemplazándose (coalescing) o llegar uno urgente
+                await self._wait_slot(lane)
+                job = (lane.urgent or lane.jobs).popleft()
+                if job.key is not None and q.keyed.get(job.key) is job:
+                    del q.keyed[job.key]
+                await self._run(channel_id, lane, job)
+        finally:
+            lane.task = None
+            if not lane:
+                asyncio.get_running_loop().call_later(self.bucket_window, self._prune, channel_id)
+
+    async def _run(self, channel_id: int, lane: _Lane, job: _Job) -> None:
+        for attempt in (0, 1):
+            lane.stamps.append(time.monotonic())
+            try:
+                result = await job.factory()
+            except discord.HTTPException as e:
+                if getattr(e, "status", None) == 429 and attempt == 0:
+                    self.rate_limited += 1
+                    retry_after = float(getattr(e, "retry_after", None) or self.bucket_window)
+                    lane.blocked_until = time.monotonic() + retry_after
+                    dprint(f"[outbox] 429 en canal {channel_id}, reintento en {retry_after:.1f}s",
+                           _enabled=self.debug_enabled)
+                    await self._wait_slot(lane)
+                    continue
+                self.failed += 1
+                self._resolve(job, exc=e)
+                return
+            except asyncio.CancelledError:
+                self._resolve(job, None)
+                raise
+            except Exception as e:
+                self.failed += 1
+                self._resolve(job, exc=e)
+                return
+            self.completed += 1
+            self._resolve(job, result)
+            return
+
+    def _prune(self, channel_id: int) -> None:
+        q = self._channels.get(channel_id)
+        if q is None or not (q.send.idle() and q.edit.idle()):
+            return
+        now = time.monotonic()
+        if any(lane.stamps and now - lane.stamps[-1] < self.bucket_window for lane in (q.send, q.edit)):
+            return
+        del self._channels[channel_id]
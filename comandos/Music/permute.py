@@ -0,0 +1,118 @@
+# comandos/Music/permute.py
+from __future__ import annotations
+import random
+from collections.abc import Sequence
+from typing import Any, Iterator, Optional, Tuple, Union
+
+_M64 = (1 << 64) - 1
+_ROUNDS = 4
+
+
+def _mix64(x: int) -> int:
+    """Mezclador splitmix64 (rápido, buena difusión de bits)."""
+    x = (x + 0x9E3779B97F4A7C15) & _M64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _M64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _M64
+    return x ^ (x >> 31)
+
+
+class FeistelPermutation:
+    """
+    Permutación pseudoaleatoria de [0, n) evaluada bajo demanda: red de
+    Feistel de 4 rondas sobre el menor dominio 2^(2h) >= n, con "cycle
+    walking" para caer dentro de [0, n) (en promedio < 4 pasos).
+    - perm[i]: O(1) esperado, sin materializar la permutación.
+    - Determinística por 'seed'; reseed() cambia el orden en O(1).
+    """
+    __slots__ = ("n", "seed", "_half", "_mask", "_keys")
+
+    def __init__(self, n: int, seed: Optional[int] = None):
+        self.n = max(0, int(n))
+        bits = max(2, (self.n - 1).bit_length()) if self.n > 1 else 2
+        self._half = (bits + 1) // 2
+        self._mask = (1 << self._half) - 1
+        self.seed = 0
+        self._keys: Tuple[int, ...] = ()
+        self.reseed(seed)
+
+    def reseed(self, seed: Optional[int] = None) -> int:
+        """Nuevo orden (O(1)). Devuelve la semilla usada."""
+        self.seed = int(seed) if seed is not None else random.getrandbits(63)
+        k = _mix64(self.seed)
+        keys = []
+        for _ in range(_ROUNDS):
+            k = _mix64(k)
+            keys.append(k)
+        self._keys = tuple(keys)
+        return self.seed
+
+    def _encrypt(self, x: int) -> int:
+        h, mask = self._half, self._mask
+        left, right = x >> h, x & mask
+        for k in self._keys:
+            left, right = right, left ^ (_mix64(right ^ k) & mask)
+        return (left << h) | right
+
+    def __len__(self) -> int:
+        return self.n
+
+    def __getitem__(self, i: int) -> int:
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError("permutation index out of range")
+        v = self._encrypt(i)
+        while v >= self.n:
+            v = self._encrypt(v)
+        return v
+
+    def __iter__(self) -> Iterator[int]:
+        for i in range(self.n):
+            yield self[i]
+
+
+class LazyShuffle(Sequence):
+    """
+    Vista barajada de una secuencia, sin copiarla: shuffled[i] es
+    base[perm[i]]. Los slices de paso 1 devuelven otra vista (misma
+    permutación, otro rango), así el warm-up y el masivo la recorren por
+    tramos sin materializar nada.
+    """
+    __slots__ = ("base", "perm", "_start", "_stop")
+
+    def __init__(self, base: Sequence, seed: Optional[int] = None, *,
+                 perm: Optional[FeistelPermutation] = None, start: int = 0, stop: Optional[int] = None):
+        self.base = base
+        self.perm = perm if perm is not None else FeistelPermutation(len(base), seed)
+        self._start = start
+        self._stop = len(base) if stop is None else stop
+
+    @property
+    def seed(self) -> int:
+        return self.perm.seed
+
+    def reshuffle(self, seed: Optional[int] = None) -> int:
+        """Re-baraja en O(1) (afecta a todas las vistas que comparten la permutación)."""
+        return self.perm.reseed(seed)
+
+    def __len__(self) -> int:
+        return max(0, self._stop - self._start)
+
+    def __getitem__(self, idx: Union[int, slice]) -> Any:
+        n = len(self)
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(n)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return LazyShuffle(self.base, perm=self.perm,
+                               start=self._start + start, stop=self._start + max(start, stop))
+        if idx < 0:
+            idx += n
+        if not 0 <= idx < n:
+            raise IndexError("LazyShuffle index out of range")
+        return self.base[self.perm[self._start + idx]]
+
+    def __iter__(self) -> Iterator[Any]:
+        base, perm = self.base, self.perm
+        for i in range(self._start, self._stop):
+            yield base[perm[i]]
@@ -0,0 +1,452 @@
+# comandos/Music/playqueue.py
+from __future__ import annotations
+from collections.abc import MutableSequence
+from itertools import chain, islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+import lavalink
+from .constants import (
+    QUEUE_CHUNK_SIZE,
+    QUEUE_COMPACT_SOURCES,
+    QUEUE_MAX_LEN,
+    QUEUE_MEMORY_BUDGET_MB,
+    QUEUE_ENTRY_BYTES,
+    QUEUE_FULL_ENTRY_BYTES,
+)
+
+
+class IndexedQueue(MutableSequence):
+    """
+    Cola indexada para player.queue (rope por bloques): lista de bloques no
+    vacíos de hasta 2*chunk elementos + árbol de Fenwick con el tamaño de
+    cada bloque para ubicar posiciones.
+    - q[i], q[i] = x ............ O(log B)   (B = n / chunk bloques)
+    - q[a:b], iter_from(a) ...... O(log B + k), sin copiar la cola entera
+    - del q[a:b] ................ bloques enteros se sueltan sin recorrerlos
+    - insert / pop / move ....... O(log B + chunk)
+    Habla la API de list que usa lavalink.DefaultPlayer (append, insert,
+    pop(i), len, clear), así que puede reemplazar a player.queue.
+    'version' aumenta con cada modificación (clave de cachés de vistas).
+    'listener' (opcional) recibe cada cambio como (op, *args), con op en
+    "a" (items al final), "i" (índice, item), "s" (índice, item),
+    "d" (desde, hasta) o "c" (vaciar): lo usa el journal de colas.
+    """
+    __slots__ = ("_chunks", "_tree", "_len", "_chunk", "version", "listener")
+
+    def __init__(self, items: Iterable[Any] = (), *, chunk: int = QUEUE_CHUNK_SIZE):
+        self._chunk = max(8, int(chunk))
+        self._chunks: List[List[Any]] = []
+        self._tree: List[int] = [0]
+        self._len = 0
+        self.version = 0
+        self.listener: Optional[Callable[..., None]] = None
+        self.extend(items)
+
+    # --------------- Fenwick sobre tamaños de bloque ---------------
+    def _rebuild(self) -> None:
+        nb = len(self._chunks)
+        tree = [0] * (nb + 1)
+        for i, c in enumerate(self._chunks, start=1):
+            tree[i] += len(c)
+            j = i + (i & -i)
+            if j <= nb:
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def _bump(self, ci: int, delta: int) -> None:
+        i = ci + 1
+        tree = self._tree
+        nb = len(tree) - 1
+        while i <= nb:
+            tree[i] += delta
+            i += i & -i
+
+    def _locate(self, pos: int) -> Tuple[int, int]:
+        """(bloque, desplazamiento) de la posición 0 <= pos < len."""
+        tree = self._tree
+        nb = len(tree) - 1
+        i = 0
+        step = 1 << (nb.bit_length() - 1) if nb else 0
+        while step:
+            j = i + step
+            if j <= nb and tree[j] <= pos:
+                i = j
+                pos -= tree[j]
+            step >>= 1
+        return i, pos
+
+    def _norm(self, i: int) -> int:
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("IndexedQueue index out of range")
+        return i
+
+    # --------------- Lectura ---------------
+    def __len__(self) -> int:
+        return self._len
+
+    def __bool__(self) -> bool:
+        return self._len > 0
+
+    def __iter__(self) -> Iterator[Any]:
+        return chain.from_iterable(list(self._chunks))
+
+    def iter_from(self, start: int) -> Iterator[Any]:
+        """Itera desde la posición 'start' sin recorrer lo anterior."""
+        if start >= self._len:
+            return iter(())
+        ci, off = self._locate(max(0, start))
+        head = islice(self._chunks[ci], off, None)
+        return chain(head, chain.from_iterable(self._chunks[ci + 1:]))
+
+    def __getitem__(self, idx: Union[int, slice]) -> Any:
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(self._len)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            if stop <= start:
+                return []
+            return list(islice(self.iter_from(start), stop - start))
+        ci, off = self._locate(self._norm(idx))
+        return self._chunks[ci][off]
+
+    def __repr__(self) -> str:
+        return f"IndexedQueue(len={self._len}, chunks={len(self._chunks)})"
+
+    # --------------- Escritura ---------------
+    def __setitem__(self, idx: Union[int, slice], value: Any) -> None:
+        self.version += 1
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(self._len)
+            values = list(value)
+            if step != 1:
+                targets = range(start, stop, step)
+                if len(values) != len(targets):
+                    raise ValueError("extended slice assignment size mismatch")
+                for i, v in zip(targets, values):
+                    self[i] = v
+                return
+            del self[start:stop]
+            for k, v in enumerate(values):
+                self.insert(start + k, v)
+            return
+        i = self._norm(idx)
+        ci, off = self._locate(i)
+        self._chunks[ci][off] = value
+        if self.listener is not None:
+            self.listener("s", i, value)
+
+    def __delitem__(self, idx: Union[int, slice]) -> None:
+        self.version += 1
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(self._len)
+            if step != 1:
+                for i in sorted(range(start, stop, step), reverse=True):
+                    del self[i]
+                return
+            if stop <= start:
+                return
+            if self.listener is not None:
+                self.listener("d", start, stop)
+            ca, oa = self._locate(start)
+            cb, ob = self._locate(stop - 1)
+            chunks = self._chunks
+            if ca == cb:
+                del chunks[ca][oa:ob + 1]
+            else:
+                del chunks[cb][:ob + 1]
+                del chunks[ca][oa:]
+                del chunks[ca + 1:cb]
+            self._len -= stop - start
+            self._chunks = [c for c in chunks if c]
+            self._rebuild()
+            return
+        i = self._norm(idx)
+        if self.listener is not None:
+            self.listener("d", i, i + 1)
+        ci, off = self._locate(i)
+        chunk = self._chunks[ci]
+        del chunk[off]
+        self._len -= 1
+        if chunk:
+            self._bump(ci, -1)
+        else:
+            del self._chunks[ci]
+            self._rebuild()
+
+    def insert(self, index: int, value: Any) -> None:
+        self.version += 1
+        if index < 0:
+            index = max(0, index + self._len)
+        if index >= self._len:
+            self.append(value)
+            return
+        if self.listener is not None:
+            self.listener("i", index, value)
+        ci, off = self._locate(index)
+        chunk = self._chunks[ci]
+        chunk.insert(off, value)
+        self._len += 1
+        if len(chunk) > 2 * self._chunk:
+            self._chunks[ci:ci + 1] = [chunk[:self._chunk], chunk[self._chunk:]]
+            self._rebuild()
+        else:
+            self._bump(ci, 1)
+
+    def append(self, value: Any) -> None:
+        self.version += 1
+        if self.listener is not None:
+            self.listener("a", (value,))
+        chunks = self._chunks
+        if chunks and len(chunks[-1]) < 2 * self._chunk:
+            chunks[-1].append(value)
+            self._len += 1
+            self._bump(len(chunks) - 1, 1)
+            return
+        chunks.append([value])
+        self._len += 1
+        self._rebuild()
+
+    def extend(self, values: Iterable[Any]) -> None:
+        items = list(values)
+        if not items:
+            return
+        self.version += 1
+        if self.listener is not None:
+            self.listener("a", items)
+        size = self._chunk
+        chunks = self._chunks
+        if chunks and len(chunks[-1]) < size:
+            room = size - len(chunks[-1])
+            chunks[-1].extend(items[:room])
+            items = items[room:]
+        for i in range(0, len(items), size):
+            chunks.append(items[i:i + size])
+        self._len = sum(len(c) for c in chunks)
+        self._rebuild()
+
+    def pop(self, index: int = -1) -> Any:
+        value = self[index]
+        del self[index]
+        return value
+
+    def clear(self) -> None:
+        self.version += 1
+        if self.listener is not None:
+            self.listener("c")
+        self._chunks = []
+        self._tree = [0]
+        self._len = 0
+
+    def move(self, src: int, dst: int) -> Any:
+        """Mueve el elemento de 'src' a la posición 'dst' (índices 0-based)."""
+        value = self.pop(src)
+        self.insert(dst, value)
+        return value
+
+    def remove_if(self, pred: Callable[[Any], bool]) -> int:
+        """
+        Quita en una sola pasada los elementos con pred(x) verdadero y
+        reconstruye los bloques. Devuelve cuántos se quitaron.
+        """
+        kept = [x for x in self if not pred(x)]
+        removed = self._len - len(kept)
+        if removed:
+            self.clear()
+            self.extend(kept)
+        return removed
+
+
+class QueueEntry:
+    """
+    Entrada compacta de cola: solo el 'encoded' del track y el requester.
+    El AudioTrack (título, autor, uri, dicts raw/info/extra) se arma con
+    materialize() al llegar a la cabeza de la cola o al mostrarse; no expone
+    los atributos de AudioTrack (leerlos exige decodificar explícitamente).
+    """
+    __slots__ = ("track", "requester")
+
+    def __init__(self, track: str, requester: int = 0):
+        self.track = track
+        self.requester = requester
+
+    def materialize(self) -> lavalink.AudioTrack:
+        t = lavalink.decode_track(self.track)
+        t.requester = self.requester
+        return t
+
+    def __repr__(self) -> str:
+        return f"QueueEntry(requester={self.requester}, len={len(self.track)})"
+
+
+def compact_entry(item: Any) -> Any:
+    """AudioTrack de una fuente decodificable localmente -> QueueEntry; lo demás tal cual."""
+    if type(item) is lavalink.AudioTrack and isinstance(item.track, str) \
+            and item.source_name in QUEUE_COMPACT_SOURCES and not item.user_data:
+        return QueueEntry(item.track, item.requester)
+    return item
+
+
+def entry_key(item: Any) -> Any:
+    """
+    Clave de identidad de una entrada (dedupe): el 'encoded' en las compactas
+    (determinado por fuente + identifier, sin decodificar) y el identifier
+    en los AudioTrack que se guardan completos.
+    """
+    if isinstance(item, QueueEntry):
+        return item.track
+    return getattr(item, "identifier", None) or getattr(item, "uri", None) or getattr(item, "track", None) or id(item)
+
+
+def materialize(item: Any) -> Any:
+    """Entrada de cola -> AudioTrack (no-op si ya lo es)."""
+    return item.materialize() if isinstance(item, QueueEntry) else item
+
+
+class TrackQueue(IndexedQueue):
+    """
+    IndexedQueue para player.queue que guarda entradas compactas: compacta
+    al insertar (player.add y la propia lavalink) y devuelve el AudioTrack
+    en pop(), que es como DefaultPlayer.play() toma el siguiente tema.
+    'full' cuenta las entradas que no se pudieron compactar (AudioTrack
+    completo, ~4x más memoria): lo usa QueueAdmission para el presupuesto.
+    """
+    __slots__ = ("full",)
+
+    def __init__(self, items: Iterable[Any] = (), *, chunk: int = QUEUE_CHUNK_SIZE):
+        self.full = 0
+        super().__init__(items, chunk=chunk)
+
+    def __setitem__(self, idx: Union[int, slice], value: Any) -> None:
+        if isinstance(idx, slice):
+            # se reparte en del/insert/self[i] = v, que ya llevan la cuenta
+            super().__setitem__(idx, [compact_entry(v) for v in value])
+            return
+        value = compact_entry(value)
+        old = self[idx]
+        super().__setitem__(idx, value)
+        self.full += _is_full(value) - _is_full(old)
+
+    def __delitem__(self, idx: Union[int, slice]) -> None:
+        if self.full:
+            if isinstance(idx, slice):
+                start, stop, step = idx.indices(len(self))
+                if step == 1 and stop > start:
+                    self.full -= sum(map(_is_full, islice(self.iter_from(start), stop - start)))
+                # step != 1: IndexedQueue borra de a uno vía del self[i]
+            else:
+                self.full -= _is_full(self[idx])
+        super().__delitem__(idx)
+
+    def insert(self, index: int, value: Any) -> None:
+        if index < 0:
+            index = max(0, index + len(self))
+        if index >= len(self):  # IndexedQueue lo delega en append
+            self.append(value)
+            return
+        value = compact_entry(value)
+        super().insert(index, value)
+        self.full += _is_full(value)
+
+    def append(self, value: Any) -> None:
+        value = compact_entry(value)
+        super().append(value)
+        self.full += _is_full(value)
+
+    def extend(self, values: Iterable[Any]) -> None:
+        items = [compact_entry(v) for v in values]
+        super().extend(items)
+        self.full += sum(map(_is_full, items))
+
+    def clear(self) -> None:
+        super().clear()
+        self.full = 0
+
+    def pop(self, index: int = -1) -> Any:
+        return materialize(super().pop(index))
+
+    def move(self, src: int, dst: int) -> Any:
+        value = super().pop(src)
+        self.insert(dst, value)
+        return value
+
+
+def _is_full(item: Any) -> int:
+    return 0 if isinstance(item, QueueEntry) else 1
+
+
+class QueueAdmission:
+    """
+    Control de admisión de player.queue:
+    - tope de entradas por guild (QUEUE_MAX_LEN);
+    - presupuesto de memoria aproximado para todas las colas juntas
+      (QUEUE_MEMORY_BUDGET_MB): cada entrada compacta pesa QUEUE_ENTRY_BYTES
+      y cada AudioTrack completo QUEUE_FULL_ENTRY_BYTES; el lugar libre se
+      expresa en entradas compactas.
+    room() se calcula al momento desde los players (O(guilds)); los encolados
+    masivos la consultan antes de resolver, así no resuelven lo que no entra.
+    """
+    def __init__(
+        self,
+        players: Callable[[], Mapping[int, Any]],
+        *,
+        max_len: int = QUEUE_MAX_LEN,
+        budget_mb: float = QUEUE_MEMORY_BUDGET_MB,
+        entry_bytes: int = QUEUE_ENTRY_BYTES,
+        full_entry_bytes: int = QUEUE_FULL_ENTRY_BYTES,
+    ):
+        self.players = players
+        self.max_len = max(0, int(max_len))
+        self.budget_bytes = int(budget_mb * 1024 * 1024) if budget_mb else 0
+        self.entry_bytes = max(1, int(entry_bytes))
+        self.full_entry_bytes = max(self.entry_bytes, int(full_entry_bytes))
+        self.max_entries = self.budget_bytes // self.entry_bytes
+        self.rejected = 0
+
+    def _lengths(self, guild_id: int) -> Tuple[int, int, int]:
+        """
+        (entradas del guild, entradas totales, bytes estimados de todas las colas).
+        Una cola que no es TrackQueue (list de lavalink) cuenta todo como completo.
+        """
+        own = total = used = 0
+        for gid, player in list(self.players().items()):
+            q = getattr(player, "queue", None) or ()
+            n = len(q)
+            full = min(n, getattr(q, "full", n))
+            total += n
+            used += (n - full) * self.entry_bytes + full * self.full_entry_bytes
+            if gid == guild_id:
+                own = n
+        return own, total, used
+
+    def room(self, guild_id: int) -> Optional[int]:
+        """Entradas que aún se admiten en la cola del guild (None = sin límite)."""
+        if not self.max_len and not self.budget_bytes:
+            return None
+        own, _total, used = self._lengths(guild_id)
+        limits = []
+        if self.max_len:
+            limits.append(self.max_len - own)
+        if self.budget_bytes:
+            limits.append((self.budget_bytes - used) // self.entry_bytes)
+        return max(0, min(limits))
+
+    def full_reason(self, guild_id: int) -> str:
+        """Texto para el usuario: qué límite se alcanzó."""
+        own, _total, _used = self._lengths(guild_id)
+        if self.max_len and own >= self.max_len:
+            return f"la cola llegó al máximo de {self.max_len} temas"
+        return "se alcanzó el límite de memoria de colas del bot"
+
+    def note_rejected(self, n: int) -> None:
+        self.rejected += max(0, int(n))
+
+    def stats(self) -> Dict[str, int]:
+        _own, total, used = self._lengths(0)
+        return {
+            "entries": total,
+            "approx_bytes": used,
+            "max_len": self.max_len,
+            "max_entries": self.max_entries,
+            "rejected": self.rejected,
+        }
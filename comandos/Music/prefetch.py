@@ -0,0 +1,76 @@
+# comandos/Music/prefetch.py
+from __future__ import annotations
+import asyncio
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from .covers import PreparedNow, discard_prepared_now
+from .utils import dprint
+
+# prepare(path) -> Awaitable[PreparedNow]  (lo inyecta el Cog con lib/store/url_cache)
+PrepareCB = Callable[[Path], Awaitable[PreparedNow]]
+
+
+class AnnouncePrefetcher:
+    """
+    Pre-render por guild del anuncio del PRÓXIMO track local.
+    - schedule(): al empezar un track, prepara en segundo plano el embed
+      y la portada de player.queue[0].
+    - take(): en el siguiente TrackStart devuelve lo preparado si corresponde
+      al track que arrancó (misma clave); si no, lo descarta.
+    - invalidate(): skips y ediciones de cola tiran lo preparado.
+    """
+    def __init__(self, prepare: PrepareCB, *, debug_enabled: bool = False):
+        self._prepare = prepare
+        self._slots: Dict[int, Tuple[str, asyncio.Task]] = {}
+        self.debug_enabled = debug_enabled
+        self.hits = 0
+        self.misses = 0
+
+    def schedule(self, guild_id: int, track_key: str, path: Path) -> None:
+        slot = self._slots.get(guild_id)
+        if slot is not None and slot[0] == track_key:
+            return
+        self.invalidate(guild_id)
+        task = asyncio.get_running_loop().create_task(self._prepare(path))
+        self._slots[guild_id] = (track_key, task)
+
+    async def take(self, guild_id: int, track_key: str) -> Optional[PreparedNow]:
+        slot = self._slots.pop(guild_id, None)
+        if slot is None:
+            self.misses += 1
+            return None
+        key, task = slot
+        if key != track_key:
+            self._drop(task)
+            self.misses += 1
+            return None
+        try:
+            prepared = await task
+        except asyncio.CancelledError:
+            if task.cancelled():
+                self.misses += 1
+                return None
+            raise
+        except Exception as e:
+            dprint(f"[prefetch] fallo preparando anuncio (guild={guild_id}): {e}", _enabled=self.debug_enabled)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return prepared
+
+    def invalidate(self, guild_id: int) -> None:
+        slot = self._slots.pop(guild_id, None)
+        if slot is not None:
+            self._drop(slot[1])
+
+    def clear(self) -> None:
+        for gid in list(self._slots):
+            self.invalidate(gid)
+
+    @staticmethod
+    def _drop(task: asyncio.Task) -> None:
+        if not task.done():
+            task.cancel()
+            return
+        if not task.cancelled() and task.exception() is None:
+            discard_prepared_now(task.result())
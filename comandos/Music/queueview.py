@@ -0,0 +1,150 @@
+# comandos/Music/queueview.py
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import discord
+from .constants import QUEUE_PAGE_SIZE, QUEUE_PAGE_CACHE_MAX, QUEUE_VIEW_TIMEOUT
+from .playqueue import materialize
+
+# post(channel_id, factory, edit=True) -> None  (outbox del Cog, sin esperar)
+PostCB = Callable[..., None]
+
+
+def _clip(s: str, n: int = 80) -> str:
+    return s if len(s) <= n else s[: n - 1] + "…"
+
+
+def _queue_key(player: Any) -> Hashable:
+    """Clave de caché: versión de la cola + track actual (cambia al avanzar)."""
+    queue = getattr(player, "queue", None)
+    version = getattr(queue, "version", None)
+    if version is None:  # cola sin contador (list): sin caché confiable
+        version = object()
+    return (version, id(getattr(player, "current", None)))
+
+
+class QueuePageCache:
+    """
+    Páginas de la vista de cola por guild, renderizadas bajo demanda desde el
+    slice pedido (O(tamaño de página)) y cacheadas mientras la cola no cambie
+    (clave = versión de la cola + track actual). LRU acotado por guild.
+    """
+    def __init__(self, *, page_size: int = QUEUE_PAGE_SIZE, max_pages: int = QUEUE_PAGE_CACHE_MAX):
+        self.page_size = max(1, int(page_size))
+        self.max_pages = max(1, int(max_pages))
+        self._pages: Dict[int, Tuple[Hashable, "OrderedDict[int, str]"]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def page_count(self, player: Any) -> int:
+        n = len(getattr(player, "queue", None) or ())
+        return max(1, -(-n // self.page_size))
+
+    def render(self, guild_id: int, player: Any, page: int) -> Tuple[str, int, int]:
+        """Devuelve (texto, página efectiva, total de páginas)."""
+        pages = self.page_count(player)
+        page = min(max(0, page), pages - 1)
+        key = _queue_key(player)
+        entry = self._pages.get(guild_id)
+        if entry is None or entry[0] != key:
+            entry = (key, OrderedDict())
+            self._pages[guild_id] = entry
+        cache = entry[1]
+        text = cache.get(page)
+        if text is not None:
+            cache.move_to_end(page)
+            self.hits += 1
+            return text, page, pages
+        self.misses += 1
+        text = self._render_page(player, page, pages)
+        cache[page] = text
+        if len(cache) > self.max_pages:
+            cache.popitem(last=False)
+        return text, page, pages
+
+    def forget(self, guild_id: int) -> None:
+        self._pages.pop(guild_id, None)
+
+    def _render_page(self, player: Any, page: int, pages: int) -> str:
+        queue = getattr(player, "queue", None) or []
+        lines = []
+        cur = getattr(player, "current", None)
+        if cur is not None:
+            lines.append(
+                f"▶️ **Ahora:** {_clip(getattr(cur, 'title', '(sin título)') or '(sin título)')} — "
+                f"`{_clip(getattr(cur, 'author', '') or '', 40)}`"
+            )
+        start = page * self.page_size
+        for idx, entry in enumerate(queue[start:start + self.page_size], start=start + 1):
+            t = materialize(entry)
+            lines.append(
+                f"{idx}. {_clip(getattr(t, 'title', '(sin título)') or '(sin título)')} — "
+                f"`{_clip(getattr(t, 'author', '') or '', 40)}`"
+            )
+        if len(queue):
+            lines.append(f"\n_Página {page + 1}/{pages} · {len(queue)} temas en cola_")
+        return "\n".join(lines) or "Cola vacía."
+
+
+class QueuePager(discord.ui.View):
+    """
+    Botones de navegación para la vista de cola. Cada click re-renderiza
+    (o toma de caché) solo la página pedida.
+    """
+    def __init__(self, *, cache: QueuePageCache, guild_id: int, get_player: Callable[[int], Any],
+                 page: int = 0, post: Optional[PostCB] = None, timeout: float = QUEUE_VIEW_TIMEOUT):
+        super().__init__(timeout=timeout)
+        self.cache = cache
+        self.guild_id = guild_id
+        self.get_player = get_player
+        self.page = page
+        self.post = post
+        self.message: Optional[discord.Message] = None
+        self._sync_buttons(cache.page_count(get_player(guild_id)) if get_player(guild_id) else 1)
+
+    def render(self) -> str:
+        player = self.get_player(self.guild_id)
+        if player is None:
+            self._sync_buttons(1)
+            return "Cola vacía."
+        text, self.page, pages = self.cache.render(self.guild_id, player, self.page)
+        self._sync_buttons(pages)
+        return text
+
+    def _sync_buttons(self, pages: int) -> None:
+        self.first.disabled = self.prev.disabled = self.page <= 0
+        self.next.disabled = self.last.disabled = self.page >= pages - 1
+
+    async def _show(self, interaction: discord.Interaction, page: int) -> None:
+        self.page = page
+        await interaction.response.edit_message(content=self.render(), view=self)
+
+    @discord.ui.button(emoji="⏮️", style=discord.ButtonStyle.secondary)
+    async def first(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, 0)
+
+    @discord.ui.button(emoji="◀️", style=discord.ButtonStyle.secondary)
+    async def prev(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page - 1)
+
+    @discord.ui.button(emoji="▶️", style=discord.ButtonStyle.secondary)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1)
+
+    @discord.ui.button(emoji="⏭️", style=discord.ButtonStyle.secondary)
+    async def last(self, interaction: discord.Interaction, button: discord.ui.Button):
+        player = self.get_player(self.guild_id)
+        await self._show(interaction, (self.cache.page_count(player) - 1) if player else 0)
+
+    async def on_timeout(self) -> None:
+        msg = self.message
+        if msg is None:
+            return
+        factory = lambda: msg.edit(view=None)
+        if self.post is not None:
+            self.post(msg.channel.id, factory, edit=True)
+        else:
+            try:
+                await factory()
+            except Exception:
+                pass
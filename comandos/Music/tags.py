@@ -1,38 +1,127 @@
 from __future__ import annotations
+from functools import lru_cache
 from typing import Optional, Dict, cast, Callable, Any
 from pathlib import Path
 
-try:
-    import mutagen
-except ImportError:
-    mutagen = None
 
-def read_tags_worker(path_str: str) -> Dict[str, Any]:
+@lru_cache(maxsize=None)
+def _mutagen_file() -> Optional[Callable[..., Any]]:
+    """mutagen.File, importado en el primer uso (mutagen es opcional)."""
+    try:
+        import mutagen
+    except ImportError:
+        return None
+    return cast(Optional[Callable[..., Any]], getattr(mutagen, "File", None))
+
+# Valores por defecto cuando el archivo no trae tags
+UNKNOWN_ARTIST = "Unknown Artist"
+UNKNOWN_ALBUM = "Unknown Album"
+
+# Claves de cada campo sin easy=True: Vorbis/APE (FLAC, OGG, Opus), ID3 (MP3)
+# y MP4 (M4A/AAC), en ese orden
+_TAG_KEYS: Dict[str, tuple] = {
+    "artist": ("artist", "TPE1", "\xa9ART"),
+    "album": ("album", "TALB", "\xa9alb"),
+    "title": ("title", "TIT2", "\xa9nam"),
+    "tracknumber": ("tracknumber", "TRCK", "trkn"),
+    "date": ("date", "TDRC", "\xa9day"),
+    "originaldate": ("originaldate", "TDOR"),
+}
+
+# Contenedores cuya portada incrustada sabe extraer covers._extract_embedded_cover_bytes
+_ART_SUFFIXES = (".flac", ".mp3", ".m4a", ".mp4", ".aac")
+
+def _tag_text(tags: Any, field: str) -> Optional[str]:
+    """Primer valor de texto no vacío de un campo, sea cual sea el contenedor."""
+    for key in _TAG_KEYS[field]:
+        try:
+            v = tags.get(key)
+        except Exception:
+            continue
+        v = getattr(v, "text", v)  # frame ID3 -> lista de textos
+        if isinstance(v, (list, tuple)):
+            if not v:
+                continue
+            v = v[0]
+        if isinstance(v, tuple):  # MP4 trkn: (número, total)
+            v = v[0] if v else None
+        s = str(v).strip() if v is not None else ""
+        if s:
+            return s
+    return None
+
+def _embedded_art_format(m: Any) -> Optional[str]:
+    """
+    Formato ("png"/"jpg") de la portada incrustada en un archivo ya abierto
+    con mutagen.File, o None si no tiene.
+    """
+    try:
+        pics = getattr(m, "pictures", None)
+        if pics:
+            return "png" if "png" in (pics[0].mime or "").lower() else "jpg"
+        tags = getattr(m, "tags", None)
+        if tags is None:
+            return None
+        if hasattr(tags, "getall"):
+            apics = tags.getall("APIC")
+            if apics:
+                return "png" if "png" in (getattr(apics[0], "mime", "") or "").lower() else "jpg"
+            return None
+        covr = tags.get("covr")
+        if covr:
+            # MP4Cover.FORMAT_PNG == 14
+            return "png" if getattr(covr[0], "imageformat", None) == 14 else "jpg"
+    except Exception:
+        pass
+    return None
+
+def read_tags_worker(path_str: str, with_art: bool = True) -> Dict[str, Any]:
+    """
+    Metadatos de un archivo para el índice: artist/album/title/trackno, más
+    year, duration (s), bitrate (bps) y, si with_art, el formato de la
+    portada incrustada ("art"). Abre el archivo una sola vez (sin easy=True)
+    y saca tags y portada del mismo objeto. Pensado para correr en un proceso
+    worker.
+    """
     p = Path(path_str)
-    artist = "Unknown Artist"
-    album = "Unknown Album"
+    artist = UNKNOWN_ARTIST
+    album = UNKNOWN_ALBUM
     title = p.stem
     trackno: Optional[int] = None
+    year: Optional[int] = None
+    duration: Optional[float] = None
+    bitrate: Optional[int] = None
+    art: Optional[str] = None
     try:
-        m_file = cast(Callable[..., Any], getattr(mutagen, "File", None))
-        m = m_file(p.as_posix(), easy=True) if m_file else None
-        if m:
-            a = m.get("artist")
-            if a and a[0].strip():
-                artist = a[0].strip()
-            al = m.get("album")
-            if al and al[0].strip():
-                album = al[0].strip()
-            t = m.get("title")
-            if t and t[0].strip():
-                title = t[0].strip()
-            tn = m.get("tracknumber")
-            if tn and tn[0].strip():
-                raw = tn[0].strip()
-                try:
-                    trackno = int(raw.split("/")[0])
-                except Exception:
-                    trackno = None
+        m_file = _mutagen_file()
+        m = m_file(p.as_posix()) if m_file else None
+        if m is not None:
+            tags = getattr(m, "tags", None)
+            if tags is not None:
+                artist = _tag_text(tags, "artist") or artist
+                album = _tag_text(tags, "album") or album
+                title = _tag_text(tags, "title") or title
+                tn = _tag_text(tags, "tracknumber")
+                if tn:
+                    try:
+                        trackno = int(tn.split("/")[0])
+                    except Exception:
+                        trackno = None
+                d = _tag_text(tags, "date") or _tag_text(tags, "originaldate")
+                if d and d[:4].isdigit():
+                    year = int(d[:4])
+            info = getattr(m, "info", None)
+            length = getattr(info, "length", None)
+            if isinstance(length, (int, float)) and length > 0:
+                duration = round(float(length), 2)
+            br = getattr(info, "bitrate", None)
+            if isinstance(br, int) and br > 0:
+                bitrate = br
+            if with_art and p.suffix.lower() in _ART_SUFFIXES:
+                art = _embedded_art_format(m)
     except Exception:
         pass
-    return {"artist": artist, "album": album, "title": title, "trackno": trackno}
\ No newline at end of file
+    return {
+        "artist": artist, "album": album, "title": title, "trackno": trackno,
+        "year": year, "duration": duration, "bitrate": bitrate, "art": art,
+    }
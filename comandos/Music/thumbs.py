@@ -0,0 +1,214 @@
+# comandos/Music/thumbs.py
+from __future__ import annotations
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from .constants import THUMB_SIZE, THUMB_STORE_DIRNAME, THUMB_STORE_MAX_BYTES, THUMB_WORKERS, COVER_EXTS
+from .covers import _extract_embedded_cover_bytes
+from .utils import state_dir
+
+# Pillow es opcional: sin él se guarda la portada original (solo deduplicación).
+# Se importa en la primera miniatura (en el proceso worker), no al cargar el Cog.
+@lru_cache(maxsize=None)
+def _pil_image() -> Any:
+    try:
+        from PIL import Image
+    except Exception:  # pragma: no cover
+        return None
+    return Image
+
+
+def _thumb_bytes(data: bytes, ext: str, size: int) -> Tuple[bytes, str]:
+    """
+    Normaliza una portada a JPEG de como máximo size x size.
+    Si Pillow no está o la imagen no se puede decodificar, devuelve el original.
+    """
+    Image = _pil_image()
+    if Image is None:
+        return data, ext
+    try:
+        with Image.open(BytesIO(data)) as im:
+            im = im.convert("RGB")
+            im.thumbnail((size, size))
+            out = BytesIO()
+            im.save(out, format="JPEG", quality=85, optimize=True)
+            return out.getvalue(), "jpg"
+    except Exception:
+        return data, ext
+
+
+def _normalize_worker(root_str: str, kind: str, src_str: str, size: int) -> Optional[Tuple[str, str, int]]:
+    """
+    (Proceso worker) Lee la portada, la identifica por hash de contenido y,
+    si aún no existe en el store, escribe su miniatura de forma atómica.
+    Devuelve (digest, ruta_miniatura, bytes) o None si no hay portada.
+    """
+    src = Path(src_str)
+    try:
+        if kind == "file":
+            data = src.read_bytes()
+            ext = src.suffix.lower().lstrip(".") or "jpg"
+        else:
+            emb = _extract_embedded_cover_bytes(src)
+            if emb is None:
+                return None
+            data, ext = emb
+    except OSError:
+        return None
+
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    shard = Path(root_str) / digest[:2]
+    for e in ("jpg", ext):
+        hit = shard / f"{digest}.{e}"
+        if hit.exists():
+            return digest, hit.as_posix(), hit.stat().st_size
+
+    thumb, text = _thumb_bytes(data, ext, size)
+    shard.mkdir(parents=True, exist_ok=True)
+    dest = shard / f"{digest}.{text}"
+    tmp = dest.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_bytes(thumb)
+    tmp.replace(dest)
+    return digest, dest.as_posix(), len(thumb)
+
+
+def cover_store_dir(music_base: Path) -> Path:
+    """
+    Carpeta del store para una biblioteca: dentro de la carpeta de estado del
+    bot (la biblioteca puede ser de solo lectura y no se modifica), una por
+    MUSIC_BASE según el hash de su ruta.
+    """
+    key = hashlib.sha1(music_base.resolve().as_posix().encode("utf-8")).hexdigest()[:16]
+    return state_dir() / THUMB_STORE_DIRNAME / key
+
+
+class CoverStore:
+    """
+    Store en disco de miniaturas de portada, direccionado por contenido.
+    - Cada portada única (por hash de bytes) se normaliza una sola vez, en un
+      proceso worker; todos los tracks de un álbum comparten la misma miniatura.
+    - Límite de tamaño total con desalojo LRU (el orden se reconstruye por
+      mtime al reiniciar).
+    """
+    def __init__(self, root: Path, *, max_bytes: int = THUMB_STORE_MAX_BYTES, size: int = THUMB_SIZE):
+        self.root = root.resolve()
+        self.max_bytes = max_bytes
+        self.size = size
+        self._lru: "OrderedDict[str, Tuple[Path, int]]" = OrderedDict()  # digest -> (path, bytes)
+        self._total = 0
+        self._by_source: Dict[str, str] = {}  # ruta origen (o track#embedded) -> digest
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._load_task: Optional[asyncio.Future] = None
+
+    # --------------- Estado en disco ---------------
+    def _list_existing(self) -> List[Tuple[str, Path, int]]:
+        """Miniaturas ya presentes en disco, más antiguas primero (por mtime)."""
+        found = []
+        try:
+            for f in self.root.glob("??/*"):
+                if f.suffix.lower() in COVER_EXTS and f.is_file():
+                    st = f.stat()
+                    found.append((st.st_mtime, f.stem, f, st.st_size))
+        except OSError:
+            pass
+        found.sort()
+        return [(digest, f, n) for _mt, digest, f, n in found]
+
+    async def _ensure_loaded(self) -> None:
+        if self._load_task is None:
+            self._load_task = asyncio.ensure_future(asyncio.to_thread(self._list_existing))
+            # de la más nueva a la más antigua, cada una al frente: el frente queda con la más antigua
+            for digest, f, n in reversed(await self._load_task):
+                if digest not in self._lru:
+                    self._lru[digest] = (f, n)
+                    self._lru.move_to_end(digest, last=False)
+                    self._total += n
+        else:
+            await self._load_task
+
+    def _pop_victims(self) -> List[Path]:
+        victims = []
+        while self._total > self.max_bytes and len(self._lru) > 1:
+            _digest, (path, n) = self._lru.popitem(last=False)
+            self._total -= n
+            victims.append(path)
+        return victims
+
+    @staticmethod
+    def _unlink_all(paths: List[Path]) -> None:
+        for path in paths:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def _register(self, digest: str, path: Path, n: int) -> None:
+        if digest in self._lru:
+            self._lru.move_to_end(digest)
+            return
+        self._lru[digest] = (path, n)
+        self._total += n
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    # --------------- API ---------------
+    async def thumb_for(self, track_path: Path, cover_path: Optional[Path], try_embedded: bool) -> Optional[Path]:
+        """
+        Ruta de la miniatura para la portada de un track:
+        la imagen de carpeta si hay, si no la incrustada (si try_embedded).
+        """
+        if cover_path is not None:
+            key, kind, src = cover_path.as_posix(), "file", cover_path
+        elif try_embedded:
+            key, kind, src = track_path.as_posix() + "#embedded", "embedded", track_path
+        else:
+            return None
+
+        digest = self._by_source.get(key)
+        if digest is not None and digest in self._lru:
+            self._lru.move_to_end(digest)
+            return self._lru[digest][0]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._normalize(key, kind, src))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        return await asyncio.shield(task)
+
+    async def _normalize(self, key: str, kind: str, src: Path) -> Optional[Path]:
+        loop = asyncio.get_running_loop()
+        await self._ensure_loaded()
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=max(1, THUMB_WORKERS))
+        res = await loop.run_in_executor(
+            self._pool, _normalize_worker, self.root.as_posix(), kind, src.as_posix(), self.size
+        )
+        if res is None:
+            return None
+        digest, path_str, n = res
+        path = Path(path_str)
+        self._by_source[key] = digest
+        self._register(digest, path, n)
+        victims = self._pop_victims()
+        if victims:
+            await asyncio.to_thread(self._unlink_all, victims)
+        return path if digest in self._lru else None
+
+    def close(self) -> None:
+        """Libera el pool de procesos (llamar en cog_unload)."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
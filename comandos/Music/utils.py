@@ -1,6 +1,8 @@
 from __future__ import annotations
+import os
 from pathlib import Path
-from typing import Tuple, Iterable
+from typing import Optional, Tuple, Iterable
+from .constants import STATE_DIR_ENV, STATE_DIR_DEFAULT
 
 # ---------------------- Helper de depuración ----------------------
 def dprint(*a, **k):
@@ -10,6 +12,12 @@ def dprint(*a, **k):
     if k.pop("_enabled", False):
         print("[music]", *a, **k)
 
+def state_dir() -> Path:
+    """
+    Carpeta de estado persistente del bot ($KOKOMI_STATE_DIR o ./.kokomi_state).
+    """
+    return Path(os.getenv(STATE_DIR_ENV) or STATE_DIR_DEFAULT).expanduser().resolve()
+
 def strip_discord_wrapping(s: str) -> str:
     """
     Remueve <...>, "..." o '...' y \u200b de los extremos.
@@ -46,9 +54,39 @@ def file_stat(path_str: str) -> Tuple[int, int]:
     st = p.stat()
     return (st.st_size, int(st.st_mtime))
 
+def fmt_duration(seconds: float) -> str:
+    """
+    Formatea segundos como m:ss (o h:mm:ss si pasa de una hora).
+    """
+    s = int(round(seconds))
+    h, rem = divmod(s, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+def parse_range(text: str, n: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta un rango de posiciones 1-based sobre una cola de largo n:
+    "5", "3-10", "3..10", "3:10" o "7-" (hasta el final). Devuelve
+    (inicio, fin) inclusivos y recortados a [1, n], o None si no es válido.
+    """
+    s = text.strip().replace("..", "-").replace(":", "-").replace(" ", "")
+    a_s, sep, b_s = s.partition("-")
+    try:
+        a = int(a_s)
+        b = (int(b_s) if b_s else n) if sep else a
+    except ValueError:
+        return None
+    if a > b:
+        a, b = b, a
+    a, b = max(1, a), min(n, b)
+    if a > b:
+        return None
+    return a, b
+
 def popleft_many(q: Iterable, k: int) -> int:
     """
-    Elimina hasta k elementos desde el inicio de una cola 'q' (deque, lista, etc.).
+    Elimina hasta k elementos desde el inicio de una cola 'q' (deque, lista,
+    IndexedQueue, etc.); con soporte de slices es un solo 'del q[:k]'.
     Devuelve cuántos fueron removidos.
     """
     if k <= 0:
@@ -1,4 +1,5 @@
 from __future__ import annotations
+import asyncio
 from typing import Optional, Union
 import discord
 from discord.types.voice import GuildVoiceState, VoiceServerUpdate
@@ -13,11 +14,49 @@ class LavalinkVoiceClient(discord.VoiceProtocol):
             self.client: discord.Client = client
             self._chan_opt: Optional[ChanT] = channel if isinstance(channel, (discord.VoiceChannel, discord.StageChannel)) else None
             self.guild: Optional[discord.Guild] = getattr(channel, "guild", None)
+            # Handshake de voz: listo cuando VOICE_STATE y VOICE_SERVER ya se
+            # reenviaron a Lavalink (el future se resuelve en ese momento)
+            self._state_sent = False
+            self._server_sent = False
+            self._ready: Optional[asyncio.Future] = None
+
+        def _ready_future(self) -> asyncio.Future:
+            if self._ready is None:
+                self._ready = asyncio.get_running_loop().create_future()
+            return self._ready
+
+        def _reset_ready(self, *, keep_server: bool = False) -> None:
+            self._state_sent = False
+            if not keep_server:
+                self._server_sent = False
+            if self._ready is not None and self._ready.done():
+                self._ready = None
+
+        def _check_ready(self) -> None:
+            if self._state_sent and self._server_sent:
+                fut = self._ready_future()
+                if not fut.done():
+                    fut.set_result(True)
+
+        async def wait_ready(self, timeout: float) -> bool:
+            """
+            Espera a que Lavalink tenga ambas mitades del handshake de voz.
+            True si quedó listo dentro de 'timeout'.
+            """
+            fut = self._ready_future()
+            if fut.done():
+                return True
+            try:
+                await asyncio.wait_for(asyncio.shield(fut), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
 
         async def connect(self, *, timeout: float, reconnect: bool,
                         self_deaf: bool = False, self_mute: bool = False) -> None:
             if self.guild is None:
                 return
+            self._reset_ready()
             ws = self.client._get_websocket(self.guild.id)  # type: ignore[attr-defined]
             await ws.voice_state(
                 guild_id=self.guild.id,
@@ -30,6 +69,9 @@ class LavalinkVoiceClient(discord.VoiceProtocol):
             g = getattr(channel, "guild", None)
             if g is None:
                 return
+            # Mover dentro del guild: Discord puede no reenviar VOICE_SERVER
+            if getattr(self._chan_opt, "id", None) != getattr(channel, "id", None):
+                self._reset_ready(keep_server=True)
             ws = self.client._get_websocket(g.id)  # type: ignore[attr-defined]
             await ws.voice_state(
                 guild_id=g.id,
@@ -45,6 +87,8 @@ class LavalinkVoiceClient(discord.VoiceProtocol):
             handler = getattr(self.client, "_ll_voice_update", None)
             if handler:
                 await handler(payload)
+                self._server_sent = True
+                self._check_ready()
 
         async def on_voice_state_update(self, data: GuildVoiceState) -> None:
             user = self.client.user
@@ -54,6 +98,9 @@ class LavalinkVoiceClient(discord.VoiceProtocol):
             handler = getattr(self.client, "_ll_voice_update", None)
             if handler:
                 await handler(payload)
+                if data.get("channel_id") is not None:
+                    self._state_sent = True
+                    self._check_ready()
 
         async def disconnect(self, *, force: bool = False) -> None:
             if self.guild is None:
@@ -74,6 +121,7 @@ class LavalinkVoiceClient(discord.VoiceProtocol):
                 pass
             self._chan_opt = None
             self.guild = None
+            self._reset_ready()
 
         @staticmethod
         def _chan_id(ch: Optional[discord.abc.Connectable]) -> Optional[int]:
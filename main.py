@@ -2,9 +2,18 @@
 from __future__ import annotations
 
 import os
+import re
+import sys
+import json
+import time
+import asyncio
+import hashlib
 import logging
-import importlib
-import pkgutil
+import importlib.util
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+_T_START = time.perf_counter()  # arranque del proceso (para medir hasta READY)
 
 import discord
 from discord.ext import commands
@@ -17,6 +26,142 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__)
 
+# Carpeta de estado (la misma que usan los cogs): hashes del último sync de
+# slash y extensiones descubiertas
+STATE_DIR_ENV = "KOKOMI_STATE_DIR"
+STATE_DIR_DEFAULT = ".kokomi_state"
+SLASH_SYNC_FILENAME = "slash_sync.json"
+EXTENSIONS_CACHE_FILENAME = "extensions.json"
+
+EXTENSIONS_PACKAGE = "comandos"
+# setup(bot) a nivel de módulo: lo que load_extension() necesita
+_SETUP_RE = re.compile(rb"^(?:async[ \t]+)?def[ \t]+setup[ \t]*\(", re.M)
+
+
+def _state_path(name: str) -> Path:
+    return Path(os.getenv(STATE_DIR_ENV) or STATE_DIR_DEFAULT).expanduser().resolve() / name
+
+
+def _load_state_json(name: str) -> Dict[str, Any]:
+    try:
+        data = json.loads(_state_path(name).read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def _save_state_json(name: str, data: Dict[str, Any]) -> None:
+    path = _state_path(name)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, indent=2, sort_keys=True), encoding="utf-8")
+        tmp.replace(path)
+    except Exception as e:
+        log.warning("No se pudo guardar %s: %s", name, e)
+
+
+# -------------- Descubrimiento de extensiones --------------
+def _package_sources(package: str) -> List[Tuple[str, Path]]:
+    """
+    (módulo, archivo .py) del paquete y sus subpaquetes, recorriendo el
+    disco sin importar nada. Ignora módulos y subpaquetes que empiecen con '_'.
+    """
+    spec = importlib.util.find_spec(package)
+    if spec is None or not spec.submodule_search_locations:
+        return []
+    out: List[Tuple[str, Path]] = []
+
+    def _walk(prefix: str, dirs: List[str]) -> None:
+        for d in dirs:
+            try:
+                entries = sorted(os.scandir(d), key=lambda e: e.name)
+            except OSError:
+                continue
+            for e in entries:
+                if e.name.startswith("_"):
+                    continue
+                if e.is_dir():
+                    init = Path(e.path) / "__init__.py"
+                    if init.is_file():
+                        out.append((f"{prefix}.{e.name}", init))
+                        _walk(f"{prefix}.{e.name}", [e.path])
+                elif e.name.endswith(".py"):
+                    out.append((f"{prefix}.{e.name[:-3]}", Path(e.path)))
+
+    _walk(package, list(spec.submodule_search_locations))
+    return out
+
+
+def _discover_extensions(package: str = EXTENSIONS_PACKAGE) -> List[str]:
+    """
+    Módulos del paquete que definen setup(bot). El resultado se cachea en la
+    carpeta de estado con una huella de (ruta, mtime, tamaño): mientras no
+    cambie ningún archivo, no se lee ni se importa nada para descubrir.
+    """
+    sources = _package_sources(package)
+    stamp = []
+    for name, path in sources:
+        try:
+            st = path.stat()
+            stamp.append((name, st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append((name, 0, 0))
+    fingerprint = hashlib.sha1(json.dumps(stamp).encode("utf-8")).hexdigest()
+
+    cached = _load_state_json(EXTENSIONS_CACHE_FILENAME)
+    if cached.get("fingerprint") == fingerprint and isinstance(cached.get("extensions"), list):
+        return [str(n) for n in cached["extensions"]]
+
+    found: List[str] = []
+    for name, path in sources:
+        try:
+            if _SETUP_RE.search(path.read_bytes()):
+                found.append(name)
+        except OSError:
+            continue
+    _save_state_json(EXTENSIONS_CACHE_FILENAME, {"fingerprint": fingerprint, "extensions": found})
+    log.info("Extensiones descubiertas (%d de %d módulos).", len(found), len(sources))
+    return found
+
+
+# -------------- Perfil de imports --------------
+async def _importtime_profile(modules: List[str], *, top: int = 15) -> str:
+    """
+    Importa 'modules' en un proceso nuevo con `python -X importtime` y resume
+    lo más lento (tiempo propio y acumulado), como en frío tras un reinicio.
+    """
+    code = "\n".join(f"import {m}" for m in modules)
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-X", "importtime", "-c", code,
+        cwd=str(Path(__file__).resolve().parent),
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+    )
+    _, err = await asyncio.wait_for(proc.communicate(), timeout=120)
+    rows: List[Tuple[int, int, str]] = []
+    for line in err.decode("utf-8", "replace").splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            # la columna del nombre trae un espacio + 2 por nivel de anidamiento
+            rows.append((int(parts[0]), int(parts[1]), parts[2][1:].rstrip()))
+        except ValueError:
+            continue  # cabecera
+    if not rows:
+        return "No se obtuvo salida de -X importtime."
+    total_ms = sum(r[0] for r in rows) / 1000
+    lines = [f"Imports en frío: {total_ms:.0f} ms en {len(rows)} módulos", "", "propio  acumulado  módulo"]
+    for self_us, cum_us, name in sorted(rows, key=lambda r: r[0], reverse=True)[:max(1, top)]:
+        lines.append(f"{self_us / 1000:6.1f} {cum_us / 1000:9.1f}  {name.strip()}")
+    lines += ["", "Nivel superior (acumulado):"]
+    for self_us, cum_us, name in rows:
+        if not name.startswith(" ") and cum_us >= 1000:
+            lines.append(f"{cum_us / 1000:9.1f} ms  {name}")
+    return "\n".join(lines)
+
 
 def _prefix_callable(bot: commands.Bot, message: discord.Message):
     """
@@ -41,34 +186,34 @@ class KokomiBot(commands.Bot):
         # Atributos accesibles desde cogs (p.ej. music.py)
         self.default_prefix: str = "!"
 
+        # Tiempos de arranque por fase (ms), para !importtime
+        self.boot_times: Dict[str, float] = {}
+
     # ---------- Carga de extensiones ----------
     async def _load_all_extensions(self) -> None:
         """
         Carga todas las extensiones del paquete 'comandos' que tengan `setup(...)`.
         Incluye subpaquetes. Ignora módulos que empiecen con '_'.
-        Requiere 'comandos/__init__.py'.
+        Requiere 'comandos/__init__.py'. El descubrimiento no importa módulos
+        (ver _discover_extensions): solo se importan las extensiones.
         """
-        try:
-            pkg = importlib.import_module("comandos")
-        except ModuleNotFoundError:
+        t0 = time.perf_counter()
+        if importlib.util.find_spec(EXTENSIONS_PACKAGE) is None:
             log.warning("No se encontró el paquete 'comandos'. ¿Existe y tiene __init__.py?")
             return
-
-        to_try: list[str] = []
-        for m in pkgutil.walk_packages(pkg.__path__, prefix=pkg.__name__ + "."):
-            short = m.name.rsplit(".", 1)[-1]
-            if short.startswith("_"):
-                continue
-            to_try.append(m.name)
+        to_try = _discover_extensions(EXTENSIONS_PACKAGE)
+        self.boot_times["descubrimiento"] = (time.perf_counter() - t0) * 1000
 
         if not to_try:
             log.info("No se encontraron módulos en 'comandos'.")
             return
 
         for name in sorted(set(to_try)):
+            t1 = time.perf_counter()
             try:
                 await self.load_extension(name)  # discord.py 2.x: async load
-                log.info("Extensión cargada: %s", name)
+                self.boot_times[name] = (time.perf_counter() - t1) * 1000
+                log.info("Extensión cargada: %s (%.0f ms)", name, self.boot_times[name])
             except commands.NoEntryPointError:
                 # El módulo no define setup(bot) → se ignora en silencio
                 log.debug("Saltando %s (sin entrypoint setup)", name)
@@ -79,48 +224,68 @@ class KokomiBot(commands.Bot):
             except Exception as e:
                 log.exception("Excepción cargando %s: %s", name, e)
 
-    # ---------- Setup asíncrono ----------
-    async def setup_hook(self) -> None:
+    # ---------- Slash commands: sync solo si el árbol cambió ----------
+    def _sync_scope(self) -> Optional[discord.Object]:
+        """Ámbito del sync: el guild de GUILD_ID (desarrollo) o global."""
         guild_id = os.getenv("GUILD_ID")
+        return discord.Object(id=int(guild_id)) if guild_id else None
 
-        # 1) BORRAR en Discord
-        if guild_id:
-            guild = discord.Object(id=int(guild_id))
-            self.tree.clear_commands(guild=guild)     # NO await
-            try:
-                await self.tree.sync(guild=guild)     # push vacío -> borra en ese guild
-                log.info("🧹 Comandos slash eliminados en el guild %s.", guild_id)
-            except Exception as e:
-                log.warning("No se pudieron eliminar los comandos del guild: %s", e)
-        else:
-            self.tree.clear_commands(guild=None)      # global
-            try:
-                await self.tree.sync(guild=None)                # push vacío -> borra globales
-                log.info("🧹 Todos los comandos slash globales eliminados.")
-            except Exception as e:
-                log.warning("No se pudieron eliminar los comandos globales: %s", e)
+    def _tree_hash(self, guild: Optional[discord.Object]) -> str:
+        """Hash estable del payload que tree.sync() enviaría para ese ámbito."""
+        payload = sorted(
+            (cmd.to_dict(self.tree) for cmd in self.tree.get_commands(guild=guild)),
+            key=lambda d: (d.get("type", 1), d.get("name", "")),
+        )
+        blob = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
 
-        # 2) CARGAR extensiones (registran hybrid/global en el árbol)
+    async def sync_tree(self, *, force: bool = False) -> Optional[int]:
+        """
+        Publica el árbol de slash commands solo si su hash difiere del último
+        sync exitoso (guardado en la carpeta de estado, por app y ámbito).
+        Devuelve cuántos comandos se registraron, o None si no hizo falta.
+        """
+        guild = self._sync_scope()
+        if guild is not None:
+            # Los hybrid quedan como *globales* -> cópialos al ámbito del guild
+            # (limpieza local primero: las copias de un reload anterior no se borran solas)
+            self.tree.clear_commands(guild=guild)     # NO await, no toca Discord
+            self.tree.copy_global_to(guild=guild)
+        key = f"{self.application_id}:{guild.id if guild else 'global'}"
+        digest = self._tree_hash(guild)
+        hashes = _load_state_json(SLASH_SYNC_FILENAME)
+        if not force and hashes.get(key) == digest:
+            log.info("Slash commands sin cambios (%s): sync omitido.", key)
+            return None
+        synced = await self.tree.sync(guild=guild)
+        hashes[key] = digest
+        _save_state_json(SLASH_SYNC_FILENAME, hashes)
+        log.info("✅ Slash sync (%s): %d comandos registrados.", key, len(synced))
+        return len(synced)
+
+    # ---------- Setup asíncrono ----------
+    async def setup_hook(self) -> None:
+        t0 = time.perf_counter()
+
+        # 1) CARGAR extensiones (registran hybrid/global en el árbol)
         await self._load_all_extensions()
 
-        # 3) PUBLICAR de nuevo
+        # 2) PUBLICAR si el árbol cambió (sin push intermedio vacío)
+        t1 = time.perf_counter()
         try:
-            if guild_id:
-                guild = discord.Object(id=int(guild_id))
-                # Los hybrid quedan como *globales* -> cópialos al ámbito del guild
-                self.tree.copy_global_to(guild=guild)
-                synced = await self.tree.sync(guild=guild)
-                log.info("✅ Slash sync completado en guild %s: %d comandos registrados.",
-                        guild_id, len(synced))
-            else:
-                synced = await self.tree.sync(guild=None)  # global
-                log.info("✅ Slash sync global: %d comandos registrados.", len(synced))
+            await self.sync_tree()
         except Exception as e:
             log.warning("No se pudo sincronizar comandos: %s", e)
+        self.boot_times["slash sync"] = (time.perf_counter() - t1) * 1000
+        self.boot_times["setup_hook"] = (time.perf_counter() - t0) * 1000
+        log.info("setup_hook listo en %.0f ms", self.boot_times["setup_hook"])
 
     # ---------- Eventos ----------
     async def on_ready(self) -> None:
         log.info("Conectado como %s (%s)", self.user, self.user and self.user.id)
+        if "READY" not in self.boot_times:
+            self.boot_times["READY"] = (time.perf_counter() - _T_START) * 1000
+            log.info("READY a %.0f ms del arranque", self.boot_times["READY"])
         try:
             await self.change_presence(
                 activity=discord.Activity(
@@ -172,12 +337,35 @@ def _register_owner_commands(bot: KokomiBot) -> None:
         await _unload_all_cogs(bot)
         await bot._load_all_extensions()
         try:
-            synced = await bot.tree.sync()
-            log.info("Slash sync (reload): %d comandos", len(synced))
+            await bot.sync_tree()
         except Exception as e:
             log.warning("No se pudo hacer app_commands sync (reload): %s", e)
         await ctx.send("✅ Extensiones recargadas.")
 
+    @bot.command(name="sync", help="Fuerza la publicación de los slash commands (ignora el hash guardado).")
+    @commands.is_owner()
+    async def force_sync(ctx: commands.Context):
+        try:
+            n = await bot.sync_tree(force=True)
+        except Exception as e:
+            await ctx.reply(f"⚠️ No se pudo sincronizar: `{type(e).__name__}`")
+            return
+        await ctx.reply(f"✅ Slash commands publicados: {n}.")
+
+    @bot.command(name="importtime", help="Perfil de imports en frío (-X importtime) y tiempos de arranque.")
+    @commands.is_owner()
+    async def importtime(ctx: commands.Context, top: int = 15):
+        async with ctx.typing():
+            try:
+                report = await _importtime_profile(["main", *bot.extensions.keys()], top=top)
+            except Exception as e:
+                report = f"No se pudo perfilar: {type(e).__name__}: {e}"
+        boot = "\n".join(f"{ms:9.1f} ms  {phase}" for phase, ms in bot.boot_times.items())
+        text = report + ("\n\nArranque de este proceso:\n" + boot if boot else "")
+        if len(text) > 1900:
+            text = text[:1900] + "\n…"
+        await ctx.reply(f"```\n{text}\n```")
+
 
 # -------------- Main --------------
 def main():